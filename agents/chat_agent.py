@@ -1,23 +1,31 @@
 # agents/chat_agent.py
-from utils.chat_utils import init_memory, get_chat_response
-from langchain.memory import ConversationBufferMemory
+import time
+from typing import Iterator
+from utils.chat_utils import init_memory, get_chat_response, stream_chat_response
+from utils.client_utils import get_chat_model
+from utils.memory_utils import SUMMARY_MODEL, bind_summarizer
+from utils.stream_utils import ResponseTiming
+from langchain.memory.chat_memory import BaseChatMemory
 
 class ChatAgent:
     """
     Chat Agent responsible for handling general conversation functionality.
     """
-    def __init__(self, api_key: str, memory: ConversationBufferMemory = None):
+    def __init__(self, api_key: str, memory: BaseChatMemory = None):
         """
         Initialize the ChatAgent.
 
         Args:
             api_key (str): OpenAI API key.
-            memory (ConversationBufferMemory, optional): Existing conversation memory.
+            memory (BaseChatMemory, optional): Existing conversation memory.
                 If not provided, a new memory instance will be created.
         """
         self.api_key = api_key
         # Use the provided memory if available; otherwise, initialize a new memory instance.
         self.memory = memory if memory is not None else init_memory()
+        bind_summarizer(self.memory, get_chat_model(api_key, SUMMARY_MODEL, temperature=0))
+        # Timing of the most recent response
+        self.last_timing = None
 
     def run(self, prompt: str) -> str:
         """
@@ -29,4 +37,22 @@ class ChatAgent:
         Returns:
             str: The generated response from the model.
         """
-        return get_chat_response(prompt, self.memory, self.api_key)
\ No newline at end of file
+        timing = ResponseTiming()
+        reply = get_chat_response(prompt, self.memory, self.api_key)
+        timing.finished_at = timing.first_token_at = time.perf_counter()
+        self.last_timing = timing
+        return reply
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """
+        Generate a response token by token. Memory is updated with the full
+        text once the stream is exhausted.
+
+        Args:
+            prompt (str): The user's input message.
+
+        Yields:
+            str: Response tokens as they are generated.
+        """
+        self.last_timing = ResponseTiming()
+        return stream_chat_response(prompt, self.memory, self.api_key, self.last_timing)
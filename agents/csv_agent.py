@@ -1,5 +1,5 @@
 # agents/csv_agent.py
-from utils.csv_utils import run_csv_agent
+from utils.csv_utils import CsvExecutor, answer_csv_query
 
 class CsvAgent:
     """
@@ -16,10 +16,15 @@ class CsvAgent:
         """
         self.api_key = api_key
         self.df = df
+        # Built on the first query the local path cannot answer, then reused
+        # with its Python namespace for every later one
+        self.executor = None
 
     def run(self, query: str) -> dict:
         """
         Execute the DataFrame Agent to process user queries or visualization requests.
+        Common questions (counts, aggregations, top-k, filters, trends) are answered
+        locally with pandas; everything else goes to the agent.
 
         Args:
             query (str): User's natural language query or visualization requirement.
@@ -28,4 +33,10 @@ class CsvAgent:
             dict: JSON response containing 'answer', 'table', 
                   and optionally visualization types like 'bar', 'line', or 'scatter'.
         """
-        return run_csv_agent(self.api_key, self.df, query)
+        return answer_csv_query(self.api_key, self.df, query, get_executor=self.get_executor)
+
+    def get_executor(self) -> CsvExecutor:
+        """Return the agent executor for this dataset, building it on first use."""
+        if self.executor is None:
+            self.executor = CsvExecutor(self.api_key, self.df)
+        return self.executor
@@ -1,50 +1,143 @@
 # agents/pdf_agent.py
+import time
+from typing import Dict, Iterable, Iterator, Optional
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from langchain_openai import ChatOpenAI
-from utils.pdf_utils import load_pdf_to_retriever
+from langchain.memory.chat_memory import BaseChatMemory
+from utils.client_utils import get_chat_model
+from utils.memory_utils import SUMMARY_MODEL, bind_summarizer, memory_messages
+from utils.corpus_utils import CorpusDocument, PdfCorpus, cite
+from utils.pdf_utils import DEFAULT_EMBEDDING_MODEL
+from utils.stream_utils import ResponseTiming, stream_chain
+from utils.trace_utils import span
 
 class PdfAgent:
     """
     PDF Question-Answering Agent.
-    Loads a PDF document, builds a retriever, and enables conversational retrieval-based QA.
+    Manages a corpus of PDF documents in one index and enables conversational
+    retrieval-based QA over all of them or a selection, with page citations.
     """
-    def __init__(self, api_key: str, memory: ConversationBufferMemory):
+    def __init__(
+        self,
+        api_key: str,
+        memory: BaseChatMemory,
+        corpus: Optional[PdfCorpus] = None,
+        embedding_model: str = DEFAULT_EMBEDDING_MODEL
+    ):
         """
         Initialize the PdfAgent.
 
         Args:
             api_key (str): OpenAI API key.
-            memory (ConversationBufferMemory): Memory for tracking conversation history.
+            memory (BaseChatMemory): Memory for tracking conversation history.
+            corpus (PdfCorpus, optional): Existing corpus to search, e.g. one
+                shared by several agents; a new empty one by default.
+            embedding_model (str): Embedding model of a new corpus: an OpenAI
+                model name, or e.g. "hashed:2048" to embed locally without API
+                calls (see `utils.embedding_utils`). Ignored when `corpus` is given.
         """
         self.api_key = api_key
         self.memory = memory
-        # Initialize the chat model instance
-        self.model = ChatOpenAI(
-            model="gpt-4.1-nano-2025-04-14",
-            openai_api_key=api_key
-        )
+        bind_summarizer(memory, get_chat_model(api_key, SUMMARY_MODEL, temperature=0))
+        # Shared chat model clients; the answering model streams, while question
+        # condensing keeps the plain model so its tokens never reach the user
+        self.model = get_chat_model(api_key, "gpt-4.1-nano-2025-04-14")
+        self.streaming_model = get_chat_model(api_key, "gpt-4.1-nano-2025-04-14", streaming=True)
+        self.corpus = corpus if corpus is not None else PdfCorpus(api_key, embedding_model=embedding_model)
+        self.retriever = None
         self.chain = None
+        # Identifies the searched documents; keys the router's answer cache
+        self.fingerprint = None
+        # Timing and citations of the most recent answer
+        self.last_timing = None
+        self.last_sources = []
+        if self.corpus:
+            self._build_chain()
+            self._refresh_fingerprint()
+
+    @property
+    def documents(self) -> Dict[str, CorpusDocument]:
+        """Documents in the corpus by id, in the order they were added."""
+        return self.corpus.documents
 
-    def load_pdf(self, uploaded_file):
+    def add_pdf(self, uploaded_file, progress=None) -> str:
         """
-        Load a PDF file, split it into chunks, build a FAISS retriever,
-        and create a ConversationalRetrievalChain.
+        Add a PDF to the corpus. Only the new document is embedded and indexed;
+        adding a document the corpus already holds is a no-op, so Streamlit
+        reruns cost nothing.
 
         Args:
             uploaded_file: The PDF file to be processed.
+            progress (Callable, optional): Receives IngestionStats updates while
+                a large PDF is ingested through the pipelined path.
+
+        Returns:
+            str: Id of the document, used by `remove_pdf` and `select_documents`.
         """
-        retriever = load_pdf_to_retriever(
-            uploaded_file=uploaded_file,
-            api_key=self.api_key
-        )
-        # Combine retriever and memory into a conversational retrieval chain
+        doc_id = self.corpus.add(uploaded_file, progress=progress)
+        if self.chain is None:
+            self._build_chain()
+        self._refresh_fingerprint()
+        return doc_id
+
+    def _build_chain(self) -> None:
+        # BM25 + vector fusion, de-duplicated and packed under a token budget;
+        # the retriever follows later additions and removals
+        self.retriever = self.corpus.retriever()
         self.chain = ConversationalRetrievalChain.from_llm(
-            llm=self.model,
-            retriever=retriever,
-            memory=self.memory
+            llm=self.streaming_model,
+            condense_question_llm=self.model,
+            retriever=self.retriever,
+            memory=self.memory,
+            return_source_documents=True
         )
-  
+
+    def load_pdf(self, uploaded_file, progress=None) -> str:
+        """Add a PDF to the corpus; see `add_pdf`."""
+        return self.add_pdf(uploaded_file, progress=progress)
+
+    def prepare_pdf(self, uploaded_file, progress=None) -> None:
+        """
+        Index a PDF into the shared caches without adding it to the corpus, so
+        a later `add_pdf` of the same file is quick. Does not touch the agent's
+        state, so it can run in a background thread; see `utils.job_utils`.
+
+        Args:
+            uploaded_file: The PDF file to be processed.
+            progress (Callable, optional): Receives IngestionStats updates.
+        """
+        self.corpus.prepare(uploaded_file, progress=progress)
+
+    def remove_pdf(self, doc_id: str) -> None:
+        """
+        Remove a document from the corpus without re-indexing the others.
+
+        Args:
+            doc_id (str): Id returned by `add_pdf`.
+        """
+        self.corpus.remove(doc_id)
+        if self.retriever.doc_ids is not None:
+            self.retriever.doc_ids.discard(doc_id)
+        self._refresh_fingerprint()
+
+    def select_documents(self, doc_ids: Optional[Iterable[str]] = None) -> None:
+        """
+        Restrict retrieval to some documents of the corpus.
+
+        Args:
+            doc_ids (Iterable[str], optional): Ids to search; None searches every document.
+        """
+        if self.retriever is not None:
+            self.retriever.doc_ids = None if doc_ids is None else set(doc_ids)
+        self._refresh_fingerprint()
+
+    def _refresh_fingerprint(self) -> None:
+        doc_ids = self.retriever.doc_ids if self.retriever is not None else None
+        self.fingerprint = self.corpus.fingerprint(doc_ids)
+
+    def _check_ready(self) -> None:
+        if self.chain is None or not self.corpus:
+            raise ValueError("Please call add_pdf() before running the retrieval chain.")
+
     def run(self, question: str) -> dict:
         """
         Execute the retrieval chain to generate an answer and return updated conversation history.
@@ -55,16 +148,56 @@ class PdfAgent:
         Returns:
             dict: {
                 "answer": "<response text>",
-                "chat_history": [<HumanMessage>, <AIMessage>, …]
+                "chat_history": [<HumanMessage>, <AIMessage>, …],
+                "sources": [{"doc_id", "source", "page"}, …]
             }
         """
-        if self.chain is None:
-            raise ValueError("Please call load_pdf() before running the retrieval chain.")
+        self._check_ready()
 
         # Pass only the question; the chain internally uses retriever and memory
-        answer = self.chain.run(question)
+        timing = ResponseTiming()
+        with span("pdf.answer"):
+            result = self.chain.invoke({"question": question})
+        timing.finished_at = timing.first_token_at = time.perf_counter()
+        self.last_timing = timing
+        self.last_sources = cite(result.get("source_documents", []))
+
+        # Read the history directly; loading it as chain input would count
+        # this turn's prompt tokens twice
+        history = memory_messages(self.memory)
 
-        # Retrieve the complete chat history from memory
-        history = self.memory.load_memory_variables({}).get("chat_history", [])
+        return {"answer": result["answer"], "chat_history": history, "sources": self.last_sources}
 
-        return {"answer": answer, "chat_history": history}
+    def stream(self, question: str) -> Iterator[str]:
+        """
+        Execute the retrieval chain and yield answer tokens as they are generated.
+        Memory is updated with the full answer, and `last_sources` with its
+        citations, once the stream is exhausted.
+
+        Args:
+            question (str): The user's question related to the PDF content.
+
+        Yields:
+            str: Answer tokens.
+        """
+        self._check_ready()
+
+        self.last_timing = ResponseTiming()
+        self.last_sources = []
+        return self._stream(question)
+
+    def _stream(self, question: str) -> Iterator[str]:
+        outputs = {}
+        yield from stream_chain(self.chain, {"question": question}, "answer", self.last_timing, outputs)
+        self.last_sources = cite(outputs.get("source_documents", []))
+
+    def remember(self, question: str, answer: str) -> None:
+        """
+        Record a question and an answer produced outside the chain (e.g. from
+        the answer cache) in the conversation memory.
+
+        Args:
+            question (str): The user's question.
+            answer (str): The answer shown to the user.
+        """
+        self.memory.save_context({"question": question}, {"answer": answer})
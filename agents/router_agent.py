@@ -1,69 +1,501 @@
 # ai-agent-multitool/agents/router_agent.py
-from typing import Dict, Any, Optional
+import contextvars
+import math
+import os
+import re
+import threading
+import time
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from utils.cache_utils import ANSWER_CACHE, AnswerCache
+from utils.memory_utils import memory_messages
+from utils.trace_utils import record, span
+
+
+PDF_KEYWORDS = [
+    "pdf", "document", "paper", "file", "section", "paragraph", "according to the document"
+]
+CSV_KEYWORDS = [
+    "csv", "table", "dataset", "data", "chart", "plot", "bar", "line", "scatter",
+    "trend"
+]
+
+# Labelled example queries for the second-tier classifier
+EXAMPLE_QUERIES = {
+    "pdf": [
+        "summarize the uploaded report",
+        "what does chapter 3 say about safety",
+        "what are the main conclusions of the author",
+        "find the warranty terms in the manual",
+        "what does the contract say about termination",
+        "explain the methodology described in the study",
+        "who are the authors and what is the abstract about",
+        "quote the passage about installation steps",
+        "what are the requirements listed in the specification",
+        "give me the key points from the introduction",
+        "what is the policy on refunds and returns",
+        "which clause covers liability",
+        "what are the findings in the appendix",
+        "what warnings does the guide mention",
+        "what deadline is stated in the agreement",
+        "how does the text define the term",
+        "what recommendations are made in the whitepaper",
+        "where is the procedure for maintenance described",
+        "what is written on page 12",
+        "what does the handbook say about vacation",
+    ],
+    "csv": [
+        "what is the average revenue by region",
+        "show the top 10 customers by sales",
+        "how many rows have missing values",
+        "plot monthly sales over the year",
+        "which product has the highest price",
+        "compare total units sold per category",
+        "what is the correlation between price and quantity",
+        "count orders per month",
+        "visualize the distribution of ages",
+        "group the records by country and sum the amount",
+        "what is the mean value of the column",
+        "what is the maximum score per team",
+        "filter the rows where status is active",
+        "sort by date and show the latest entries",
+        "what percentage of orders were returned",
+        "what is the total cost per department",
+        "how many unique users are there",
+        "show the minimum and median duration",
+        "which month had the most transactions",
+        "break down the revenue by channel and year",
+    ],
+    "chat": [
+        "hello how are you",
+        "tell me a joke",
+        "what is the capital of france",
+        "help me write an email to my manager",
+        "explain how neural networks work",
+        "translate this sentence into spanish",
+        "what can you do",
+        "give me ideas for a birthday party",
+        "thanks that was helpful",
+        "write a short poem about the sea",
+        "good morning",
+        "recommend a good book to read",
+        "how do i cook rice",
+        "what is the meaning of life",
+        "help me plan a trip to italy",
+        "can you explain recursion",
+        "write a cover letter for a job application",
+        "what should i name my cat",
+        "tell me a fun fact",
+        "who won the world cup in 2018",
+    ],
+}
+
+_STOPWORDS = frozenset(
+    "a an the of to in on for and or is are was were be by with what which who how "
+    "me my i you your it this that do does did can could please from about there any some "
+    "right s t".split()
+)
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Below this cosine similarity the classifier does not trust any label
+MIN_SIMILARITY = 0.03
+# Softmax temperature turning centroid similarities into a confidence;
+# calibrated on the held-out queries of benchmarks/bench_router.py
+CONFIDENCE_TEMPERATURE = 0.05
+
+# A PDF or CSV pick less confident than this runs every loaded tool at once
+# and keeps the best answer; 0 turns fan-out off
+FANOUT_CONFIDENCE = float(os.environ.get("AGENT_ROUTER_FANOUT_CONFIDENCE", "0.5"))
+# Seconds a fan-out waits for its branches; later ones are cancelled or discarded
+FANOUT_DEADLINE = float(os.environ.get("AGENT_ROUTER_FANOUT_DEADLINE", "30"))
+FANOUT_WORKERS = 8
+# Answers that say the tool had nothing to go on lose to any real answer
+_REFUSAL = re.compile(
+    r"\b(i (do not|don'?t) know|not (mentioned|provided|specified|found|available)|no (information|mention|data) "
+    r"(about|on|regarding)|does not (contain|mention|say|include)|(cannot|can'?t|unable to) (find|answer|determine)|"
+    r"agent stopped)\b",
+    re.IGNORECASE
+)
+_VISUAL_KEYS = ("table", "chart", "bar", "line", "scatter")
+
+
+def _compile_keywords(keywords: list) -> re.Pattern:
+    # Longest alternatives first so multi-word phrases win over their parts
+    alternatives = "|".join(re.escape(kw) for kw in sorted(keywords, key=len, reverse=True))
+    return re.compile(r"\b(?:" + alternatives + r")\b", re.IGNORECASE)
+
+
+def _stem(token: str) -> str:
+    # Crude suffix stripping so "orders"/"ordered" and "findings"/"finding" match
+    for suffix in ("ings", "ing", "ies", "es", "ed", "s"):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            return token[: -len(suffix)]
+    return token
+
+
+def _features(text: str) -> Dict[str, float]:
+    tokens = [_stem(t) for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+    counts = Counter(tokens)
+    counts.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    vector = {feature: 1.0 + math.log(count) for feature, count in counts.items()}
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {feature: v / norm for feature, v in vector.items()}
+
+
+def _centroid(examples: list) -> Dict[str, float]:
+    total: Counter = Counter()
+    for example in examples:
+        total.update(_features(example))
+    norm = math.sqrt(sum(v * v for v in total.values())) or 1.0
+    return {feature: v / norm for feature, v in total.items()}
+
+
+# Compiled once per process and shared by every RouterAgent
+_PDF_PATTERN = _compile_keywords(PDF_KEYWORDS)
+_CSV_PATTERN = _compile_keywords(CSV_KEYWORDS)
+_CENTROIDS = {label: _centroid(examples) for label, examples in EXAMPLE_QUERIES.items()}
+# Fan-out branches of every RouterAgent; agents are synchronous, so threads
+_FANOUT_POOL = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="router-fanout")
+# Agents still running a fan-out branch past the deadline, with an event set
+# once the branch finished and its turn was removed from the agent's memory
+_LATE_BRANCHES: "weakref.WeakKeyDictionary[Any, threading.Event]" = weakref.WeakKeyDictionary()
+_late_lock = threading.Lock()
+
+
+def _answer_text(tool: str, output: Any) -> str:
+    if isinstance(output, dict):
+        return str(output.get("answer") or "")
+    return str(output or "")
+
+
+def score_answer(tool: str, output: Any, prior: float) -> float:
+    """
+    Score a fan-out branch's answer with local heuristics only.
+
+    Args:
+        tool (str): "pdf", "csv" or "chat".
+        output (Any): The agent's `run` result.
+        prior (float): Classifier similarity of the query to the tool.
+
+    Returns:
+        float: Higher is better; below 0 for empty answers and refusals.
+    """
+    text = _answer_text(tool, output)
+    visual = tool == "csv" and isinstance(output, dict) and any(key in output for key in _VISUAL_KEYS)
+    if not text.strip() and not visual:
+        return -1.0
+    score = prior
+    if _REFUSAL.search(text):
+        score -= 1.0
+    # Answers grounded in retrieved pages or computed from the data beat free text
+    if tool == "pdf" and isinstance(output, dict) and output.get("sources"):
+        score += 0.25
+    if visual:
+        score += 0.25
+    return score
+
+
+def _forget_turn(agent: Any, question: str) -> None:
+    # Drop the exchange a discarded branch saved, if it is still the latest one
+    messages = getattr(getattr(getattr(agent, "memory", None), "chat_memory", None), "messages", None)
+    if messages and len(messages) >= 2 and messages[-2].content == question:
+        del messages[-2:]
+
+
+def _retire_late_branch(future: Any, agent: Any, question: str) -> None:
+    # Runs once the branch finishes; until then `wait_for_late_branches` blocks on the agent
+    settled = threading.Event()
+    with _late_lock:
+        _LATE_BRANCHES[agent] = settled
+
+    def forget(_):
+        _forget_turn(agent, question)
+        settled.set()
+
+    future.add_done_callback(forget)
+
+
+def wait_for_late_branches(*agents: Any) -> None:
+    """
+    Block until no fan-out branch is still running on any of `agents`.
+
+    Agents and their memories are not thread-safe, and a branch that missed
+    the fan-out deadline keeps running (and writing to its agent's memory)
+    after the turn returned. RouterAgent waits before using an agent again;
+    callers that also use the same agents directly should do the same.
+
+    Args:
+        *agents (Any): Agents to wait for; None entries are ignored.
+    """
+    for agent in agents:
+        if agent is None:
+            continue
+        with _late_lock:
+            settled = _LATE_BRANCHES.get(agent)
+        if settled is not None and not settled.is_set():
+            with span("router.late_branch_wait"):
+                settled.wait()
 
 
 class RouterAgent:
-    def __init__(self, chat_agent: Any, pdf_agent: Optional[Any], csv_agent: Optional[Any]):
-        
+    def __init__(
+        self,
+        chat_agent: Any,
+        pdf_agent: Optional[Any],
+        csv_agent: Optional[Any],
+        answer_cache: Optional[AnswerCache] = ANSWER_CACHE,
+        fanout_confidence: float = FANOUT_CONFIDENCE,
+        fanout_deadline: float = FANOUT_DEADLINE,
+        fanout_chat: bool = False
+    ):
+
         self.chat_agent = chat_agent
         self.pdf_agent = pdf_agent
         self.csv_agent = csv_agent
+        # PDF and CSV answers are reused for repeated questions about the same file
+        self.answer_cache = answer_cache
+        # Low-confidence picks run the loaded tools (and chat, if enabled) concurrently
+        self.fanout_confidence = fanout_confidence
+        self.fanout_deadline = fanout_deadline
+        self.fanout_chat = fanout_chat
 
-        
-        self.pdf_keywords = [
-            "pdf", "document", "paper", "file", "section", "paragraph", "according to the document"
-        ]
-        self.csv_keywords = [
-            "csv", "table", "dataset", "data", "chart", "plot", "bar", "line", "scatter",
-            "trend"
-        ]
 
+        self.pdf_keywords = PDF_KEYWORDS
+        self.csv_keywords = CSV_KEYWORDS
 
-    def _score(self, text: str, keywords: list[str]) -> int:
-        t = (text or "").lower()
-        return sum(1 for kw in keywords if kw in t)
 
-    def route(self, user_query: str, resources: Dict[str, Any]) -> Dict[str, Any]:
+    def _score(self, text: str, pattern: re.Pattern) -> int:
+        return len(set(m.lower() for m in pattern.findall(text or "")))
+
+    def _similarities(self, text: str, labels: list) -> Dict[str, float]:
+        """Cosine similarity of the query to the example centroid of each label."""
+        query = _features(text or "")
+        return {
+            label: sum(weight * _CENTROIDS[label].get(feature, 0.0) for feature, weight in query.items())
+            for label in labels
+        }
+
+    def _classify(self, text: str, labels: list) -> Tuple[str, float]:
+        """
+        Return the label closest to the query by cosine similarity to the example
+        centroids. The confidence is the softmax probability margin of the best
+        label over the runner-up, so a query sharing a single weak feature with
+        one centroid (and none with the others) is not a confident pick.
+        """
+        similarities = sorted(((similarity, label) for label, similarity in self._similarities(text, labels).items()),
+                              reverse=True)
+        best_similarity, best = similarities[0]
+        if best_similarity < MIN_SIMILARITY:
+            # Nothing similar enough: small talk if allowed, else the first resource
+            return ("chat" if "chat" in labels else labels[0]), 0.0
+        # A lone label is weighed against an alternative with no similarity
+        weights = [math.exp(similarity / CONFIDENCE_TEMPERATURE) for similarity, _ in similarities] + [1.0]
+        if len(similarities) > 1:
+            weights.pop()
+        return best, (weights[0] - weights[1]) / sum(weights)
+
+    def select_tool(self, user_query: str, resources: Dict[str, Any]) -> Tuple[str, float]:
+        """
+        Pick a tool in two tiers. Word-boundary keyword matching decides clear
+        cases; ties (including no match while a resource is loaded) go to a
+        local nearest-centroid classifier over EXAMPLE_QUERIES.
+
+        return:
+          (tool, confidence) where confidence is in [0, 1]
+        """
+        has_pdf = bool(resources.get("has_pdf") and resources.get("pdf_loaded"))
+        has_csv = bool(resources.get("has_csv") and resources.get("csv_df") is not None)
+
+        pdf_score = self._score(user_query, _PDF_PATTERN) if has_pdf else 0
+        csv_score = self._score(user_query, _CSV_PATTERN) if has_csv else 0
+
+        if pdf_score != csv_score:
+            tool = "pdf" if pdf_score > csv_score else "csv"
+            margin = abs(pdf_score - csv_score)
+            return tool, 0.5 + 0.5 * margin / (margin + 1.0)
+
+        if not has_pdf and not has_csv:
+            return "chat", 1.0
+
+        # A keyword tie means the query is about the resources, not small talk
+        labels = [] if pdf_score else ["chat"]
+        labels += (["pdf"] if has_pdf else []) + (["csv"] if has_csv else [])
+        return self._classify(user_query, labels)
+
+    def _fanout_tools(self, tool: str, confidence: float, resources: Dict[str, Any]) -> List[str]:
+        """
+        Return the tools to run concurrently for an uncertain pick, or [] to run
+        `tool` alone. Chat picks never fan out, so small talk does not query
+        every loaded resource.
+        """
+        if tool == "chat" or confidence >= self.fanout_confidence:
+            return []
+        tools = []
+        if self.pdf_agent is not None and resources.get("pdf_loaded"):
+            tools.append("pdf")
+        if self.csv_agent is not None and resources.get("csv_df") is not None:
+            tools.append("csv")
+        if self.fanout_chat and self.chat_agent is not None:
+            tools.append("chat")
+        return tools if len(tools) > 1 and tool in tools else []
+
+    def _run_branch(self, tool: str, agent: Any, user_query: str) -> Any:
+        with span("router.branch", tool=tool):
+            return agent.run(user_query)
+
+    def _fan_out(self, user_query: str, tools: List[str], resources: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run `tools` concurrently under the fan-out deadline and keep the best
+        answer by `score_answer`, so the turn takes about as long as the
+        slowest branch rather than the sum. Branches still queued at the
+        deadline are cancelled; running ones cannot be interrupted, so their
+        results are dropped and the turn they save to memory is removed once
+        they finish, and the next use of their agent waits for that (see
+        `wait_for_late_branches`). Losing branches' turns are removed at once.
+        """
+        agents = {"pdf": self.pdf_agent, "csv": self.csv_agent, "chat": self.chat_agent}
+        wait_for_late_branches(*(agents[tool] for tool in tools))
+        # Decided before the branches add this turn to their memories
+        fingerprints = {
+            tool: self._resource_fingerprint(tool, resources) if self.answer_cache is not None else None
+            for tool in tools
+        }
+        with span("router.fanout", tools=",".join(tools)) as fanout_span:
+            futures = {
+                _FANOUT_POOL.submit(contextvars.copy_context().run, self._run_branch, tool, agents[tool], user_query): tool
+                for tool in tools
+            }
+            start = time.perf_counter()
+            done, late = wait(futures, timeout=self.fanout_deadline)
+            for future in late:
+                if not future.cancel():
+                    _retire_late_branch(future, agents[futures[future]], user_query)
+            failed = [future for future in done if future.exception() is not None]
+            outputs = {futures[future]: future.result() for future in done if future.exception() is None}
+            priors = self._similarities(user_query, tools)
+            scores = {tool: score_answer(tool, output, priors[tool]) for tool, output in outputs.items()}
+            ranked = sorted(scores, key=scores.get, reverse=True)
+            fanout = {
+                "tools": tools,
+                "answered": ranked,
+                "failed": [futures[future] for future in failed],
+                "late": [futures[future] for future in late],
+                "scores": {tool: round(score, 3) for tool, score in scores.items()},
+                "wait_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+            record(fanout_branches=len(tools), fanout_late=len(late))
+            if fanout_span is not None:
+                fanout_span.attrs.update(winner=ranked[0] if ranked else None, late=len(late))
+
+        if not ranked:
+            if failed:
+                raise failed[0].exception()
+            return {
+                "tool": "chat",
+                "output": f"No tool answered within {self.fanout_deadline:g}s. Please try again or rephrase the question.",
+                "fanout": fanout,
+            }
+        tool = ranked[0]
+        for loser in ranked[1:]:
+            _forget_turn(agents[loser], user_query)
+        resource = fingerprints[tool]
+        if resource:
+            answer = outputs[tool]["answer"] if tool == "pdf" else outputs[tool]
+            self.answer_cache.put(tool, resource, user_query, answer, _features(user_query))
+        return {
+            "tool": tool,
+            "output": outputs[tool],
+            "fanout": fanout,
+            # Other usable answers, best first, for callers that show them too
+            "alternatives": [{"tool": t, "output": outputs[t]} for t in ranked[1:] if scores[t] >= 0],
+        }
+
+    def _resource_fingerprint(self, tool: str, resources: Dict[str, Any]) -> Optional[str]:
+        if tool == "pdf" and self.pdf_agent is not None:
+            memory = getattr(self.pdf_agent, "memory", None)
+            # The chain condenses follow-ups with the session's history, so
+            # only a conversation's first question is answered process-wide
+            if memory is not None and memory_messages(memory):
+                return None
+            return getattr(self.pdf_agent, "fingerprint", None)
+        if tool == "csv" and self.csv_agent is not None:
+            return resources.get("csv_fingerprint")
+        # Chat replies depend on the conversation, not on a resource
+        return None
+
+    def _cache_stream(self, tokens: Iterator[str], tool: str, resource: str, query: str, vector) -> Iterator[str]:
+        parts = []
+        for token in tokens:
+            parts.append(token)
+            yield token
+        # Only a fully consumed stream is a complete answer
+        self.answer_cache.put(tool, resource, query, "".join(parts), vector)
+
+    def route(self, user_query: str, resources: Dict[str, Any], stream: bool = False) -> Dict[str, Any]:
         """
-    
+
+        stream: when True, chat and pdf outputs are token iterators
+                (see ChatAgent.stream / PdfAgent.stream) instead of final values
         resources:
           - has_pdf: bool
           - has_csv: bool
-          - pdf_loaded: bool         
+          - pdf_loaded: bool
           - csv_df: Optional[DataFrame]
+          - csv_fingerprint: Optional[str], content hash of the CSV, enables answer caching
         return:
-          {"tool": "chat"|"pdf"|"csv", "output": Any}
+          {"tool": "chat"|"pdf"|"csv", "output": Any}, plus "cached": True when
+          the answer came from the answer cache. When the pick is uncertain and
+          several tools are loaded they run concurrently (see `_fan_out`): the
+          output is then never streamed, and "fanout" (branch outcomes and
+          scores) and "alternatives" ([{"tool", "output"}]) are added
         """
 
-        pdf_score = self._score(user_query, self.pdf_keywords)
-        csv_score = self._score(user_query, self.csv_keywords)
-
+        with span("router.select") as select_span:
+            tool, confidence = self.select_tool(user_query, resources)
+            if select_span is not None:
+                select_span.attrs.update(tool=tool, confidence=round(confidence, 3))
+        # A late branch of an earlier fan-out may still be using the agent
+        wait_for_late_branches({"pdf": self.pdf_agent, "csv": self.csv_agent, "chat": self.chat_agent}[tool])
 
-        if not resources.get("has_pdf") or not resources.get("pdf_loaded"):
-            pdf_score = 0
-        if not resources.get("has_csv") or resources.get("csv_df") is None:
-            csv_score = 0
-
-
-        if pdf_score == 0 and csv_score == 0:
-            tool = "chat"
-        elif pdf_score >= csv_score:
-            tool = "pdf"
-        else:
-            tool = "csv"
+        resource = self._resource_fingerprint(tool, resources) if self.answer_cache is not None else None
+        vector = _features(user_query) if resource else None
+        if resource:
+            with span("router.cache_lookup"):
+                cached = self.answer_cache.get(tool, resource, user_query, vector)
+            if cached is not None:
+                if tool == "pdf":
+                    # Keep follow-up questions grounded in the conversation
+                    self.pdf_agent.remember(user_query, cached)
+                    return {"tool": "pdf", "output": {"answer": cached}, "cached": True}
+                return {"tool": tool, "output": cached, "cached": True}
 
+        fanout_tools = self._fanout_tools(tool, confidence, resources)
+        if fanout_tools:
+            return self._fan_out(user_query, fanout_tools, resources)
 
         if tool == "pdf" and self.pdf_agent is not None:
+            if stream:
+                tokens = self.pdf_agent.stream(user_query)
+                if resource:
+                    tokens = self._cache_stream(tokens, "pdf", resource, user_query, vector)
+                return {"tool": "pdf", "output": tokens, "streamed": True}
             result = self.pdf_agent.run(user_query)
+            if resource:
+                self.answer_cache.put("pdf", resource, user_query, result["answer"], vector)
             return {"tool": "pdf", "output": result}
 
         if tool == "csv" and self.csv_agent is not None:
             result = self.csv_agent.run(user_query)
+            if resource:
+                self.answer_cache.put("csv", resource, user_query, result, vector)
             return {"tool": "csv", "output": result}
 
-   
+
         if self.chat_agent is None:
-            
+
             return {"tool": "chat", "output": "No available tools. Please provide an API key or upload resources."}
+        if stream:
+            return {"tool": "chat", "output": self.chat_agent.stream(user_query), "streamed": True}
         reply = self.chat_agent.run(user_query)
         return {"tool": "chat", "output": reply}
@@ -0,0 +1,346 @@
+# ai-agent-multitool/batch_eval.py
+"""
+Run a set of questions against PDFs and CSVs, concurrently, and stream the
+answers to a JSONL file.
+
+Each input line is a JSON object:
+
+    {"id": "q1", "query": "What is the warranty period?", "tool": "pdf",
+     "pdf": "manual.pdf", "expected": "two years"}
+
+    query     the question ("question" is accepted too)
+    tool      "route" (default, the smart router), "pdf", "csv" or "chat"
+    pdf       PDF path, or list of paths, to search; defaults to --pdf
+    csv       CSV path; defaults to --csv
+    expected  optional text the answer should contain (case-insensitive)
+    id        optional; defaults to the line number
+
+Relative paths are resolved against the input file's directory. Every PDF and
+CSV is loaded once before the first question: the PDFs go into one shared
+corpus index and each question searches only its own documents. Questions
+are independent, each starting with an empty conversation; only the CSV
+agents keep their Python namespace, per worker thread.
+
+Questions run on a bounded pool of threads. Every upstream request passes
+through a client-side token bucket (--rpm, --tpm), a 429 pauses all workers
+for the server's Retry-After, and questions that still hit 429 are retried
+with exponential backoff. One output line is written per question as soon
+as it finishes; throughput, error rate and latency histograms are printed
+at the end.
+
+Usage:
+    OPENAI_API_KEY=sk-... python batch_eval.py questions.jsonl [--pdf a.pdf ...] [--csv data.csv]
+        [--output results.jsonl] [--concurrency 8] [--rpm 500] [--tpm 200000]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional
+
+from agents.chat_agent import ChatAgent
+from agents.csv_agent import CsvAgent
+from agents.pdf_agent import PdfAgent
+from agents.router_agent import RouterAgent
+from utils.batch_utils import (
+    DEFAULT_MAX_ATTEMPTS,
+    RateLimiter,
+    call_with_retry,
+    latency_histogram,
+    percentile,
+)
+from utils.cache_utils import ANSWER_CACHE, fingerprint_bytes
+from utils.chat_utils import init_memory
+from utils.client_utils import set_request_limiter
+from utils.corpus_utils import PdfCorpus
+from utils.csv_utils import load_csv
+from utils.server_utils import NamedUpload
+
+TOOLS = ("route", "pdf", "csv", "chat")
+
+
+def read_questions(path: str, default_pdfs: List[str], default_csv: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the questions of a JSONL file with their resource paths resolved.
+
+    Args:
+        path (str): JSONL file, one question per line.
+        default_pdfs (list[str]): PDFs for lines without a "pdf" field.
+        default_csv (str, optional): CSV for lines without a "csv" field.
+
+    Yields:
+        dict: {"id", "query", "tool", "pdfs", "csv", "expected"}.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+
+    def resolve(value: str) -> str:
+        return os.path.normpath(os.path.join(base, value))
+
+    with open(path, encoding="utf-8") as lines:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            query = item.get("query") or item.get("question")
+            tool = item.get("tool", "route")
+            if not query or tool not in TOOLS:
+                raise ValueError(f"{path}:{number}: need a query and a tool in {TOOLS}.")
+            pdfs = item.get("pdf")
+            pdfs = [pdfs] if isinstance(pdfs, str) else pdfs
+            yield {
+                "id": item.get("id", number),
+                "query": query,
+                "tool": tool,
+                "pdfs": [resolve(p) for p in pdfs] if pdfs is not None else default_pdfs,
+                "csv": resolve(item["csv"]) if item.get("csv") else default_csv,
+                "expected": item.get("expected"),
+            }
+
+
+class BatchRunner:
+    """
+    Answers questions from several threads over resources loaded once: one
+    PDF corpus and one frame per CSV, shared by per-thread agents.
+    """
+    def __init__(self, api_key: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS, answer_cache: bool = False):
+        """
+        Initialize the runner.
+
+        Args:
+            api_key (str): OpenAI API key.
+            max_attempts (int): Attempts per question and per ingested file when rate limited.
+            answer_cache (bool): Let the router reuse cached answers; off by
+                default so every question is actually answered.
+        """
+        self.api_key = api_key
+        self.max_attempts = max_attempts
+        self.answer_cache = ANSWER_CACHE if answer_cache else None
+        self.corpus = PdfCorpus(api_key)
+        self.doc_ids: Dict[str, str] = {}
+        self.frames: Dict[str, Any] = {}
+        self._local = threading.local()
+
+    def load(self, pdfs: List[str], csvs: List[str], pool: ThreadPoolExecutor) -> None:
+        """Load every PDF into the corpus and parse every CSV, each once, on the pool."""
+        def add_pdf(path: str) -> None:
+            with open(path, "rb") as f:
+                upload = NamedUpload(f.read(), os.path.basename(path))
+            self.doc_ids[path] = call_with_retry(lambda: self.corpus.add(upload), self.max_attempts)
+
+        def add_csv(path: str) -> None:
+            with open(path, "rb") as f:
+                upload = NamedUpload(f.read(), os.path.basename(path))
+            fingerprint = fingerprint_bytes(upload.getvalue())
+            self.frames[path] = (load_csv(upload, fingerprint=fingerprint), fingerprint)
+
+        jobs = [pool.submit(add_pdf, p) for p in pdfs] + [pool.submit(add_csv, p) for p in csvs]
+        for job in jobs:
+            job.result()
+
+    def _agents(self) -> Dict[str, Any]:
+        agents = getattr(self._local, "agents", None)
+        if agents is None:
+            pdf_memory = init_memory(memory_key="chat_history", output_key="answer")
+            agents = self._local.agents = {
+                "chat": ChatAgent(self.api_key, init_memory()),
+                "pdf": PdfAgent(self.api_key, pdf_memory, corpus=self.corpus) if self.corpus else None,
+                "router": RouterAgent(chat_agent=None, pdf_agent=None, csv_agent=None, answer_cache=self.answer_cache),
+                # One per CSV, keeping its agent executor between questions
+                "csv": {},
+            }
+        return agents
+
+    def answer(self, question: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Answer one question with fresh conversations.
+
+        Returns:
+            dict: {"tool", "answer", "sources", "cached"}.
+        """
+        agents = self._agents()
+        chat_agent, pdf_agent, router = agents["chat"], agents["pdf"], agents["router"]
+        chat_agent.memory.clear()
+        has_pdf = bool(question["pdfs"]) and pdf_agent is not None
+        if has_pdf:
+            pdf_agent.memory.clear()
+            pdf_agent.select_documents(self.doc_ids[path] for path in question["pdfs"])
+        df, fingerprint = self.frames.get(question["csv"], (None, None))
+        csv_agent = None
+        if df is not None:
+            csv_agent = agents["csv"].get(question["csv"])
+            if csv_agent is None:
+                csv_agent = agents["csv"][question["csv"]] = CsvAgent(self.api_key, df)
+
+        tool = question["tool"]
+        if tool == "pdf" and not has_pdf or tool == "csv" and csv_agent is None:
+            raise ValueError(f"No {tool.upper()} given for this question.")
+        if tool == "route":
+            router.chat_agent = chat_agent
+            router.pdf_agent = pdf_agent if has_pdf else None
+            router.csv_agent = csv_agent
+            result = router.route(question["query"], {
+                "has_pdf": has_pdf,
+                "pdf_loaded": has_pdf,
+                "has_csv": csv_agent is not None,
+                "csv_df": df,
+                "csv_fingerprint": fingerprint,
+            })
+            tool, output, cached = result["tool"], result["output"], bool(result.get("cached"))
+        else:
+            agent = {"pdf": pdf_agent, "csv": csv_agent, "chat": chat_agent}[tool]
+            output, cached = agent.run(question["query"]), False
+
+        if tool == "pdf":
+            return {"tool": tool, "answer": output["answer"], "sources": output.get("sources", []), "cached": cached}
+        if tool == "csv":
+            return {"tool": tool, "answer": output.get("answer", ""), "sources": [], "cached": cached}
+        return {"tool": tool, "answer": output, "sources": [], "cached": cached}
+
+    def run_one(self, question: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer a question with retries on 429 and return its output record."""
+        retries = []
+        record = {"id": question["id"], "query": question["query"], "requested_tool": question["tool"]}
+        start = time.perf_counter()
+        try:
+            record.update(call_with_retry(lambda: self.answer(question), self.max_attempts, retries.append))
+            record["error"] = None
+        except Exception as exc:
+            record.update(tool=None, answer=None, sources=[], cached=False, error=f"{type(exc).__name__}: {exc}")
+        record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        record["retries"] = len(retries)
+        if question["expected"] is not None:
+            record["expected"] = question["expected"]
+            record["match"] = str(question["expected"]).lower() in str(record["answer"] or "").lower()
+        return record
+
+
+def summarize(records: List[Dict[str, Any]], seconds: float, limiter: RateLimiter) -> Dict[str, Any]:
+    """
+    Aggregate output records into throughput, error rate and latency statistics.
+
+    Args:
+        records (list[dict]): Records returned by `BatchRunner.run_one`.
+        seconds (float): Wall-clock time of the run.
+        limiter (RateLimiter): The limiter the run used.
+
+    Returns:
+        dict: Totals, latency percentiles and histogram, overall and per tool.
+    """
+    def latency(group: List[Dict[str, Any]]) -> Dict[str, Any]:
+        values = [r["latency_ms"] for r in group]
+        return {
+            "p50_ms": percentile(values, 0.5),
+            "p90_ms": percentile(values, 0.9),
+            "p99_ms": percentile(values, 0.99),
+            "max_ms": max(values, default=float("nan")),
+            "histogram": latency_histogram(values),
+        }
+
+    ok = [r for r in records if r["error"] is None]
+    matched = [r for r in records if "match" in r]
+    by_tool: Dict[str, List[Dict[str, Any]]] = {}
+    for record in ok:
+        by_tool.setdefault(record["tool"], []).append(record)
+    return {
+        "questions": len(records),
+        "ok": len(ok),
+        "errors": len(records) - len(ok),
+        "error_rate": (len(records) - len(ok)) / len(records) if records else 0.0,
+        "matched": sum(r["match"] for r in matched),
+        "with_expected": len(matched),
+        "seconds": round(seconds, 2),
+        "questions_per_sec": len(records) / seconds if seconds else 0.0,
+        "retries": sum(r["retries"] for r in records),
+        "rate_limited": limiter.rate_limited,
+        "throttled_sec": round(limiter.waited, 2),
+        "latency": latency(ok),
+        "tools": {tool: {"count": len(group), **latency(group)} for tool, group in sorted(by_tool.items())},
+    }
+
+
+def print_summary(summary: Dict[str, Any], out=sys.stdout) -> None:
+    """Print a summary from `summarize` with text histograms."""
+    print(f"{summary['questions']} questions in {summary['seconds']:.1f}s "
+          f"({summary['questions_per_sec']:.2f}/s), {summary['errors']} errors "
+          f"({summary['error_rate']:.1%})", file=out)
+    if summary["with_expected"]:
+        print(f"expected text found in {summary['matched']}/{summary['with_expected']} answers", file=out)
+    print(f"429 responses: {summary['rate_limited']}, question retries: {summary['retries']}, "
+          f"client-side throttling: {summary['throttled_sec']:.1f}s", file=out)
+    for name, stats in [("all", summary["latency"])] + list(summary["tools"].items()):
+        count = f" ({stats['count']})" if "count" in stats else ""
+        print(f"\n{name}{count}: p50 {stats['p50_ms']:.0f} ms, p90 {stats['p90_ms']:.0f} ms, "
+              f"p99 {stats['p99_ms']:.0f} ms, max {stats['max_ms']:.0f} ms", file=out)
+        peak = max((b["count"] for b in stats["histogram"]), default=0)
+        for bucket in stats["histogram"]:
+            label = f"<= {bucket['le_ms']} ms" if bucket["le_ms"] is not None else "slower"
+            bar = "#" * (round(40 * bucket["count"] / peak) if peak else 0)
+            print(f"  {label:>12} {bucket['count']:>6} {bar}", file=out)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="JSONL file of questions.")
+    parser.add_argument("--pdf", nargs="*", default=[], help="PDFs for questions that name none.")
+    parser.add_argument("--csv", help="CSV for questions that name none.")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file the answers are written to.")
+    parser.add_argument("--summary", help="Also write the summary as JSON to this file.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Questions answered at once.")
+    parser.add_argument("--rpm", type=float, help="Client-side limit of upstream requests per minute.")
+    parser.add_argument("--tpm", type=float, help="Client-side limit of prompt tokens per minute.")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="Attempts per question when rate limited.")
+    parser.add_argument("--answer-cache", action="store_true", help="Let the router reuse cached answers.")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"))
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("No OpenAI API key: pass --api-key or set OPENAI_API_KEY.")
+
+    default_pdfs = [os.path.abspath(p) for p in args.pdf]
+    default_csv = os.path.abspath(args.csv) if args.csv else None
+    questions = list(read_questions(args.questions, default_pdfs, default_csv))
+    pdfs = sorted({p for q in questions for p in q["pdfs"]})
+    csvs = sorted({q["csv"] for q in questions if q["csv"]})
+
+    limiter = RateLimiter(args.rpm, args.tpm)
+    set_request_limiter(limiter)
+    runner = BatchRunner(args.api_key, args.max_attempts, args.answer_cache)
+    records = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool, open(args.output, "w", encoding="utf-8") as out:
+        start = time.perf_counter()
+        runner.load(pdfs, csvs, pool)
+        print(f"loaded {len(pdfs)} PDFs ({runner.corpus.chunks} chunks) and {len(csvs)} CSVs "
+              f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        start = time.perf_counter()
+        pending = set()
+        remaining = iter(questions)
+        while True:
+            # Keep a bounded window in flight so results stream out in completion order
+            for question in remaining:
+                pending.add(pool.submit(runner.run_one, question))
+                if len(pending) >= 2 * args.concurrency:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for job in done:
+                record = job.result()
+                records.append(record)
+                out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+        seconds = time.perf_counter() - start
+    set_request_limiter(None)
+
+    summary = summarize(records, seconds, limiter)
+    print_summary(summary)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/bench_charts.py
+"""
+Model-emitted chart data (the `bar`/`line`/`scatter` formats, every point
+written into the JSON answer) against chart specs computed locally
+(`{"chart": {...}}`, see utils/chart_utils.py).
+
+For each chart and series size it reports:
+  - output tokens the model has to generate, and the generation time that
+    implies at --tokens-per-sec (typical for gpt-4-turbo);
+  - JSON parse time of the model output;
+  - render time of the Streamlit script (computing the series from the
+    DataFrame, for specs) and the bytes of the chart element sent to the
+    browser, which drive the browser's drawing time.
+
+No API calls are made: both outputs are what a perfectly formatted model
+reply would be, which the point format often fails to be for large charts.
+
+Usage:
+    python -m benchmarks.bench_charts [--sizes 100 1000 10000 100000] [--tokens-per-sec 60]
+"""
+import argparse
+import json
+import time
+
+from benchmarks.datasets import synthetic_orders
+
+# Run by AppTest: draws st.session_state["chart"] and records the time it took
+RENDER_SCRIPT = """
+import time
+import streamlit as st
+from utils.plot_utils import plot_chart, plot_line, plot_scatter
+
+kind, payload, df = st.session_state["chart"]
+start = time.perf_counter()
+if kind == "chart":
+    plot_chart(df, payload)
+elif kind == "line":
+    plot_line(payload)
+else:
+    plot_scatter(payload)
+st.session_state["seconds"] = time.perf_counter() - start
+"""
+
+
+def count_output_tokens(text: str) -> int:
+    try:
+        import tiktoken
+
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    except Exception:
+        # Offline: roughly four characters per token for JSON numbers
+        return len(text) // 4
+
+
+def render(kind: str, payload, df) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_string(RENDER_SCRIPT, default_timeout=120)
+    app.session_state["chart"] = (kind, payload, df)
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    chart_bytes = sum(element.proto.ByteSize() for element in app.main.children.values()
+                      if getattr(element, "type", "") in ("arrow_vega_lite_chart", "vega_lite_chart"))
+    return {"seconds": app.session_state["seconds"], "bytes": chart_bytes}
+
+
+def cases(size: int):
+    """(name, DataFrame, legacy output, spec output) per chart for a series of `size` points."""
+    df = synthetic_orders(size, seed=size)
+    df["revenue"] = df["revenue"].astype(float)
+    series = df.sort_values("order_id")
+    yield (
+        "line",
+        df,
+        {"line": {"columns": [str(i) for i in series["order_id"]], "data": series["revenue"].round(2).tolist()}},
+        {"chart": {"type": "line", "x": "order_id", "y": "revenue"}},
+    )
+    yield (
+        "scatter",
+        df,
+        {"scatter": {"columns": ["units", "revenue"], "data": df[["units", "revenue"]].round(2).values.tolist()}},
+        {"chart": {"type": "scatter", "x": "units", "y": "revenue"}},
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0, help="Model output rate for the estimate.")
+    args = parser.parse_args()
+
+    # The first script run pays for Streamlit and Altair imports
+    warm_up = synthetic_orders(10)
+    render("chart", {"type": "line", "x": "order_id", "y": "revenue"}, warm_up)
+    print(f"{'chart':<8} {'points':>7} {'format':<7} {'out tokens':>10} {'gen (s)':>8} "
+          f"{'parse (ms)':>10} {'render (ms)':>11} {'sent (KB)':>9}")
+    for size in args.sizes:
+        for name, df, legacy, spec in cases(size):
+            for label, output in (("points", legacy), ("spec", spec)):
+                text = json.dumps(output)
+                tokens = count_output_tokens(text)
+                start = time.perf_counter()
+                parsed = json.loads(text)
+                parse_ms = (time.perf_counter() - start) * 1000
+                kind = "chart" if "chart" in parsed else name
+                rendered = render(kind, parsed[kind], df)
+                print(f"{name:<8} {size:>7} {label:<7} {tokens:>10} {tokens / args.tokens_per_sec:>8.1f} "
+                      f"{parse_ms:>10.2f} {rendered['seconds'] * 1000:>11.1f} {rendered['bytes'] / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
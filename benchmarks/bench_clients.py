@@ -0,0 +1,78 @@
+# benchmarks/bench_clients.py
+"""
+Compare per-call overhead of constructing a new OpenAI client for every call
+(the previous behaviour) against the shared pooled clients from
+utils.client_utils, using a local stub server instead of the real API.
+
+Usage:
+    python -m benchmarks.bench_clients --calls 200 --latency 0.005
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.stub_openai import StubOpenAI
+
+CHAT_MODEL = "gpt-4-turbo"
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+
+def _timed(fn, calls: int) -> list:
+    durations = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _report(name: str, durations: list, connections: int) -> None:
+    print(
+        f"{name:<22} mean={statistics.mean(durations) * 1000:7.2f} ms  "
+        f"p50={statistics.median(durations) * 1000:7.2f} ms  "
+        f"connections={connections}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub server latency per request in seconds.")
+    parser.add_argument("--skip-embeddings", action="store_true",
+                        help="Only benchmark chat; embedding calls need tiktoken encodings available locally.")
+    args = parser.parse_args()
+
+    with StubOpenAI(latency=args.latency) as stub:
+        # Clients created below read the endpoint from the environment
+        os.environ["OPENAI_API_BASE"] = stub.base_url
+        from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+        from utils.client_utils import get_chat_model, get_embeddings
+
+        cases = [
+            ("chat / per-call", lambda: ChatOpenAI(model=CHAT_MODEL, openai_api_key="sk-bench").invoke("hi")),
+            ("chat / pooled", lambda: get_chat_model("sk-bench", CHAT_MODEL).invoke("hi")),
+        ]
+        if not args.skip_embeddings:
+            cases += [
+                ("embed / per-call", lambda: OpenAIEmbeddings(model=EMBEDDING_MODEL, openai_api_key="sk-bench").embed_query("hi")),
+                ("embed / pooled", lambda: get_embeddings("sk-bench", EMBEDDING_MODEL).embed_query("hi")),
+            ]
+
+        results = {}
+        for name, fn in cases:
+            fn()  # warm-up: imports, first connection
+            stub.reset_counts()
+            durations = _timed(fn, args.calls)
+            results[name] = durations
+            _report(name, durations, stub.counts["connections"])
+
+        for kind in ("chat", "embed"):
+            fresh, pooled = results.get(f"{kind} / per-call"), results.get(f"{kind} / pooled")
+            if fresh and pooled:
+                saved = statistics.mean(fresh) - statistics.mean(pooled)
+                print(f"{kind}: pooled clients save {saved * 1000:.2f} ms per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# benchmarks/bench_csv_executor.py
+"""
+Per-query latency and agent steps of the CsvAgent executor: a fresh
+`create_pandas_dataframe_agent` per query (the previous behaviour) against
+the long-lived CsvExecutor, which keeps its Python namespace between queries,
+lists the frames it derived in the prompt and stops once valid JSON is out.
+
+The question set comes in pairs: a question, then a follow-up on the same
+intermediate result (the same grouping shown as a chart or a table).
+
+By default the agent talks to the local OpenAI stand-in, with a scripted
+model that answers the way GPT models typically run this agent: compute an
+intermediate result, print the JSON result, then restate it as the final
+answer, skipping the first step when the prompt says the result already
+exists. Step counts are therefore illustrative of the mechanism; pass
+--live to measure the real model instead.
+
+Usage:
+    python -m benchmarks.bench_csv_executor [--latency 0.3]
+    OPENAI_API_KEY=sk-... python -m benchmarks.bench_csv_executor --live
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import time
+
+from benchmarks.bench_csv_profile import UsageCounter
+from benchmarks.datasets import synthetic_orders
+from benchmarks.stub_openai import StubOpenAI, install_offline_encoding
+
+# (question, variable, code computing it, expression of the JSON result)
+QUESTIONS = [
+    ("Which region has the highest average revenue per order?",
+     "region_revenue", "df.groupby('region')['revenue'].mean()",
+     "{'answer': f'{region_revenue.idxmax()} ({region_revenue.max():.2f})'}"),
+    ("Show the average revenue per order by region as a bar chart.",
+     "region_revenue", "df.groupby('region')['revenue'].mean()",
+     "{'bar': {'columns': list(region_revenue.index), 'data': [round(v, 2) for v in region_revenue]}}"),
+    ("What share of orders used a discount, by channel?",
+     "discount_share", "df.groupby('channel')['discount'].mean()",
+     "{'answer': ', '.join(f'{k}: {v:.1%}' for k, v in discount_share.items())}"),
+    ("Put the discount share per channel in a table.",
+     "discount_share", "df.groupby('channel')['discount'].mean()",
+     "{'table': {'columns': ['channel', 'share'], 'data': [[k, round(v, 3)] for k, v in discount_share.items()]}}"),
+    ("Which category grew the most between the first and last quarter?",
+     "quarterly", "df.groupby([df['order_date'].dt.quarter, 'category'])['revenue'].sum().unstack()",
+     "{'answer': str((quarterly.iloc[-1] - quarterly.iloc[0]).idxmax())}"),
+    ("Plot quarterly revenue of the toys category as a line chart.",
+     "quarterly", "df.groupby([df['order_date'].dt.quarter, 'category'])['revenue'].sum().unstack()",
+     "{'line': {'columns': [f'Q{q}' for q in quarterly.index], 'data': [round(v, 2) for v in quarterly['toys']]}}"),
+]
+
+
+def scripted_model(messages: list) -> str:
+    """ReAct replies for QUESTIONS, driven by the prompt and the scratchpad so far."""
+    text = " ".join(str(m.get("content", "")) for m in messages)
+    question = next((q for q in QUESTIONS if q[0] in text), None)
+    if question is None:
+        return 'Final Answer: {"answer": "stub"}'
+    _, variable, code, result = question
+    scratchpad = text.split("Begin!", 1)[-1]
+    observations = re.findall(r"Observation: (.*?)(?=\nThought:|$)", scratchpad, re.S)
+    if observations and observations[-1].strip().startswith("{"):
+        return f"Thought: I now know the final answer\nFinal Answer: {observations[-1].strip()}"
+    if not observations and f"- {variable}:" not in text:
+        return (f"Thought: I need the intermediate result first.\nAction: python_repl_ast\n"
+                f"Action Input: {variable} = {code}\nprint({variable})")
+    return (f"Thought: I can format the result now.\nAction: python_repl_ast\n"
+            f"Action Input: import json\nprint(json.dumps({result}))")
+
+
+def run_fresh(api_key: str, df, question: str, usage: UsageCounter) -> dict:
+    """The previous run_csv_agent: a new DataFrame agent for every query."""
+    from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
+
+    from utils.client_utils import get_chat_model
+    from utils.csv_utils import PROFILE_TEMPLATE, PROMPT_TEMPLATE, get_dataset_profile
+
+    agent = create_pandas_dataframe_agent(
+        llm=get_chat_model(api_key, "gpt-4-turbo", temperature=0),
+        df=df,
+        agent_executor_kwargs={"handle_parsing_errors": True},
+        return_intermediate_steps=True
+    )
+    prompt = PROFILE_TEMPLATE.format(profile=get_dataset_profile(df)) + PROMPT_TEMPLATE + question
+    response = agent.invoke({"input": prompt}, config={"callbacks": [usage]})
+    return json.loads(response["output"])
+
+
+def measure(runner) -> dict:
+    seconds, calls, errors = [], [], 0
+    for question, *_ in QUESTIONS:
+        usage = UsageCounter()
+        start = time.perf_counter()
+        try:
+            runner(question, usage)
+        except Exception:
+            errors += 1
+        seconds.append(time.perf_counter() - start)
+        calls.append(usage.calls)
+    return {"seconds": statistics.mean(seconds), "llm_calls": statistics.mean(calls),
+            "total_calls": sum(calls), "errors": errors}
+
+
+def run(api_key: str) -> None:
+    from utils.csv_utils import CsvExecutor
+
+    df = synthetic_orders()
+    executor = CsvExecutor(api_key, df)
+    executor.executor.verbose = False
+    results = {
+        "fresh agent": measure(lambda q, usage: run_fresh(api_key, df, q, usage)),
+        "persistent": measure(lambda q, usage: executor.run(q, callbacks=[usage])),
+    }
+    print(f"{'executor':<12} {'sec/q':>7} {'llm calls/q':>12} {'llm calls':>10} {'errors':>7}")
+    for name, r in results.items():
+        print(f"{name:<12} {r['seconds']:>7.2f} {r['llm_calls']:>12.2f} {r['total_calls']:>10} {r['errors']:>7}")
+    base, new = results["fresh agent"], results["persistent"]
+    print(f"agent steps saved per query: {base['llm_calls'] - new['llm_calls']:.2f}, "
+          f"latency {(new['seconds'] - base['seconds']) / base['seconds']:+.0%}")
+    print(f"variables kept by the persistent executor: {', '.join(executor.derived_objects()) or 'none'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="Use the real OpenAI API instead of the stub.")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub latency per LLM call in seconds.")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"))
+    args = parser.parse_args()
+
+    if args.live:
+        if not args.api_key:
+            parser.error("--live needs an OpenAI API key (--api-key or OPENAI_API_KEY)")
+        run(args.api_key)
+        return
+    with StubOpenAI(latency=args.latency, responder=scripted_model) as stub:
+        # Read at import time by the utils modules
+        os.environ["OPENAI_API_BASE"] = stub.base_url
+        if install_offline_encoding():
+            print("tiktoken encodings unavailable; using a byte-level stand-in")
+        run("sk-bench")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_csv_profile.py
+"""
+Measure how the precomputed dataset profile changes CsvAgent cost: LLM calls
+(agent steps) and tokens per query on a fixed question set, with and without
+the profile in the prompt. Needs a real OpenAI API key, since the number of
+agent steps depends on the model's behaviour.
+
+Usage:
+    OPENAI_API_KEY=sk-... python -m benchmarks.bench_csv_profile [--csv data.csv]
+"""
+import argparse
+import os
+import statistics
+import time
+
+import pandas as pd
+from langchain_core.callbacks import BaseCallbackHandler
+
+from benchmarks.datasets import synthetic_orders
+from utils.csv_utils import run_csv_agent
+from utils.memory_utils import count_tokens
+
+QUESTIONS = [
+    "Which region has the highest average revenue per order?",
+    "What share of orders used a discount, by channel?",
+    "Is there a correlation between units and revenue?",
+    "Which product category grew the most between the first and last quarter?",
+    "List the three customers with the most orders and their total revenue.",
+    "What is the median delivery time in days for each region?",
+]
+
+
+class UsageCounter(BaseCallbackHandler):
+    """
+    Count LLM calls and tokens. Agents stream their LLM calls, which leaves
+    usage out of the response, so tokens are counted locally with tiktoken.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self.calls += 1
+        self.tokens += sum(count_tokens(str(m.content)) for batch in messages for m in batch)
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        self.tokens += sum(count_tokens(g.text) for batch in response.generations for g in batch)
+
+
+def run(df: pd.DataFrame, api_key: str, include_profile: bool) -> dict:
+    calls, tokens, seconds, errors = [], [], [], 0
+    for question in QUESTIONS:
+        start = time.perf_counter()
+        usage = UsageCounter()
+        try:
+            run_csv_agent(api_key, df, question, include_profile=include_profile, callbacks=[usage])
+        except Exception:
+            errors += 1
+        seconds.append(time.perf_counter() - start)
+        calls.append(usage.calls)
+        tokens.append(usage.tokens)
+    return {
+        "llm_calls": statistics.mean(calls),
+        "tokens": statistics.mean(tokens),
+        "seconds": statistics.mean(seconds),
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", help="CSV file to use instead of the synthetic orders dataset.")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"))
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("an OpenAI API key is required (--api-key or OPENAI_API_KEY)")
+
+    df = pd.read_csv(args.csv) if args.csv else synthetic_orders()
+    results = {
+        "without profile": run(df, args.api_key, include_profile=False),
+        "with profile": run(df, args.api_key, include_profile=True),
+    }
+    print(f"{'variant':<16} {'llm calls/q':>12} {'tokens/q':>10} {'sec/q':>8} {'errors':>7}")
+    for name, r in results.items():
+        print(f"{name:<16} {r['llm_calls']:>12.2f} {r['tokens']:>10.0f} {r['seconds']:>8.2f} {r['errors']:>7}")
+    base, new = results["without profile"], results["with profile"]
+    if base["llm_calls"]:
+        print(f"agent steps saved per query: {base['llm_calls'] - new['llm_calls']:.2f}")
+    if base["tokens"]:
+        print(f"token change per query: {(new['tokens'] - base['tokens']) / base['tokens']:+.1%}")
+
+
+if __name__ == "__main__":
+    main()
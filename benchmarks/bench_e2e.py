@@ -0,0 +1,265 @@
+# benchmarks/bench_e2e.py
+"""
+End-to-end benchmark of the agents against a local OpenAI stand-in.
+
+Drives ChatAgent.run, PdfAgent.load_pdf/run, CsvAgent.run and
+RouterAgent.route with generated PDFs and CSVs of increasing size, and
+reports ingestion throughput, per-query latency percentiles, peak RSS and the
+number of upstream requests. Nothing leaves the machine, so results are
+reproducible and the suite can run headless in CI.
+
+Usage:
+    python -m benchmarks.bench_e2e [--pdf-pages 10 50 200] [--csv-rows 1000 100000]
+                                   [--queries 20] [--latency 0.02] [--tokens-per-sec 500]
+                                   [--output results.json] [--baseline previous.json]
+
+With --baseline, latency/throughput metrics are compared against an earlier
+--output file and the process exits with status 1 if any regresses by more
+than --tolerance.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.datasets import synthetic_orders_csv, synthetic_pdf
+from benchmarks.stub_openai import StubOpenAI, install_offline_encoding
+
+API_KEY = "sk-bench"
+
+CHAT_PROMPTS = [
+    "hello, how are you today?",
+    "give me three ideas for a team offsite",
+    "explain what a vector database is",
+    "write a two line poem about rain",
+]
+PDF_QUESTIONS = [
+    "what does the document say about warranty?",
+    "summarize the safety section",
+    "which procedure covers maintenance?",
+    "what are the refund requirements in the policy?",
+]
+# A mix of questions the local planner answers and ones that need the agent
+CSV_QUESTIONS = [
+    "how many rows are there?",
+    "what is the average revenue by region?",
+    "top 5 customer by revenue",
+    "plot revenue by month",
+    "which channel has the best retention of discount customers?",
+]
+ROUTER_QUERIES = PDF_QUESTIONS + CSV_QUESTIONS + CHAT_PROMPTS
+
+
+class NamedBytes(io.BytesIO):
+    """In-memory stand-in for a Streamlit UploadedFile."""
+    def __init__(self, content: bytes, name: str):
+        super().__init__(content)
+        self.name = name
+
+
+def peak_rss_mb() -> dict:
+    """Peak resident set size of this process and of its reaped children, in MiB."""
+    scale = 1024 if sys.platform != "darwin" else 1024 * 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+def percentiles(durations: list) -> dict:
+    ordered = sorted(durations)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+    }
+
+
+def time_queries(fn, queries: list, repeat: int) -> list:
+    durations = []
+    for i in range(repeat):
+        query = queries[i % len(queries)]
+        start = time.perf_counter()
+        fn(query)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def upstream(stub: StubOpenAI) -> dict:
+    return {"chat": stub.counts["chat"], "embeddings": stub.counts["embeddings"],
+            "embedded_inputs": stub.counts["embedded_inputs"], "connections": stub.counts["connections"]}
+
+
+def run_suite(stub: StubOpenAI, pdf_pages: list, csv_rows: list, queries: int) -> dict:
+    from langchain.memory import ConversationBufferMemory
+    from agents.chat_agent import ChatAgent
+    from agents.csv_agent import CsvAgent
+    from agents.pdf_agent import PdfAgent
+    from agents.router_agent import RouterAgent
+    from utils.cache_utils import fingerprint_bytes
+    from utils.chat_utils import init_memory
+    from utils.csv_utils import load_csv
+
+    results = {"chat": {}, "pdf": {}, "csv": {}, "router": {}}
+
+    stub.reset_counts()
+    chat_agent = ChatAgent(API_KEY, init_memory())
+    results["chat"] = {**percentiles(time_queries(chat_agent.run, CHAT_PROMPTS, queries)), "upstream": upstream(stub)}
+
+    pdf_agent = None
+    for pages in pdf_pages:
+        content = synthetic_pdf(pages, seed=pages)
+        stub.reset_counts()
+        pdf_agent = PdfAgent(API_KEY, ConversationBufferMemory(memory_key="chat_history", output_key="answer",
+                                                               return_messages=True))
+        start = time.perf_counter()
+        pdf_agent.load_pdf(NamedBytes(content, f"bench-{pages}.pdf"))
+        seconds = time.perf_counter() - start
+        chunks = pdf_agent.chain.retriever.vectorstore.index.ntotal
+        ingest_upstream = upstream(stub)
+        stub.reset_counts()
+        latency = percentiles(time_queries(pdf_agent.run, PDF_QUESTIONS, queries))
+        results["pdf"][str(pages)] = {
+            "ingest_seconds": seconds,
+            "pages_per_sec": pages / seconds,
+            "chunks": chunks,
+            "chunks_per_sec": chunks / seconds,
+            "ingest_upstream": ingest_upstream,
+            "query": latency,
+            "upstream": upstream(stub),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    df = csv_fingerprint = None
+    for rows in csv_rows:
+        content = synthetic_orders_csv(rows, seed=rows)
+        stub.reset_counts()
+        start = time.perf_counter()
+        df = load_csv(NamedBytes(content, f"bench-{rows}.csv"))
+        seconds = time.perf_counter() - start
+        csv_fingerprint = fingerprint_bytes(content)
+        csv_agent = CsvAgent(API_KEY, df)
+        latency = percentiles(time_queries(csv_agent.run, CSV_QUESTIONS, queries))
+        results["csv"][str(rows)] = {
+            "load_seconds": seconds,
+            "rows_per_sec": rows / seconds,
+            "query": latency,
+            "upstream": upstream(stub),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    stub.reset_counts()
+    # No answer cache: every query pays for the selected tool
+    router = RouterAgent(chat_agent, pdf_agent, CsvAgent(API_KEY, df) if df is not None else None, answer_cache=None)
+    resources = {"has_pdf": pdf_agent is not None, "pdf_loaded": pdf_agent is not None,
+                 "has_csv": df is not None, "csv_df": df, "csv_fingerprint": csv_fingerprint}
+    latency = percentiles(time_queries(lambda q: router.route(q, resources), ROUTER_QUERIES, queries))
+    results["router"] = {**latency, "upstream": upstream(stub)}
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """Flatten nested results into {"pdf.50.query.p95_ms": value} form."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Return (metric, baseline, current, change) for metrics that got worse beyond `tolerance`."""
+    regressions = []
+    now, before = flatten(current), flatten(baseline)
+    for name, value in now.items():
+        old = before.get(name)
+        if not old or not isinstance(value, (int, float)):
+            continue
+        # Lower is better for latencies and times, higher for throughput
+        if name.endswith("_ms") or name.endswith("_seconds"):
+            change = (value - old) / old
+        elif name.endswith("_per_sec"):
+            change = (old - value) / old
+        else:
+            continue
+        if change > tolerance:
+            regressions.append((name, old, value, change))
+    return regressions
+
+
+def print_report(results: dict) -> None:
+    chat = results["chat"]
+    print(f"chat       p50={chat['p50_ms']:8.1f} ms  p95={chat['p95_ms']:8.1f} ms  p99={chat['p99_ms']:8.1f} ms  "
+          f"chat calls={chat['upstream']['chat']}")
+    for pages, r in results["pdf"].items():
+        q = r["query"]
+        print(f"pdf {pages:>5}p  ingest {r['ingest_seconds']:6.2f}s  {r['pages_per_sec']:7.1f} pages/s  "
+              f"{r['chunks_per_sec']:7.1f} chunks/s  embed calls={r['ingest_upstream']['embeddings']}  "
+              f"| query p50={q['p50_ms']:7.1f} p95={q['p95_ms']:7.1f} p99={q['p99_ms']:7.1f} ms  "
+              f"calls={r['upstream']['chat'] + r['upstream']['embeddings']}  rss={r['peak_rss_mb']['self']:.0f} MiB")
+    for rows, r in results["csv"].items():
+        q = r["query"]
+        print(f"csv {rows:>8}r  load {r['load_seconds']:6.2f}s  {r['rows_per_sec']:10.0f} rows/s  "
+              f"| query p50={q['p50_ms']:7.1f} p95={q['p95_ms']:7.1f} p99={q['p99_ms']:7.1f} ms  "
+              f"calls={r['upstream']['chat']}  rss={r['peak_rss_mb']['self']:.0f} MiB")
+    router = results["router"]
+    print(f"router     p50={router['p50_ms']:8.1f} ms  p95={router['p95_ms']:8.1f} ms  p99={router['p99_ms']:8.1f} ms  "
+          f"calls={router['upstream']['chat'] + router['upstream']['embeddings']}")
+    rss = results["peak_rss_mb"]
+    print(f"peak RSS: {rss['self']:.0f} MiB (children {rss['children']:.0f} MiB)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-pages", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--csv-rows", type=int, nargs="+", default=[1_000, 100_000])
+    parser.add_argument("--queries", type=int, default=20, help="Timed queries per workload.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub latency per request in seconds.")
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0, help="Stub generation speed.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir, \
+            StubOpenAI(latency=args.latency, tokens_per_sec=args.tokens_per_sec or None) as stub:
+        # Read at import time by the utils modules: start from cold caches
+        # and send every client to the stub
+        os.environ["AGENT_CACHE_DIR"] = cache_dir
+        os.environ["OPENAI_API_BASE"] = stub.base_url
+        if install_offline_encoding():
+            print("tiktoken encodings unavailable; using a byte-level stand-in")
+        results = run_suite(stub, args.pdf_pages, args.csv_rows, args.queries)
+
+    results["config"] = vars(args)
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.3f} -> {new:.3f} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
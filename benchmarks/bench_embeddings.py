@@ -0,0 +1,164 @@
+# benchmarks/bench_embeddings.py
+"""
+Local hashed n-gram embeddings ("hashed:<dim>", see utils/embedding_utils.py)
+against the remote OpenAI embeddings:
+  - ingestion: wall time and chunks/s of `load_pdf_to_vectorstore` on a
+    synthetic PDF, each backend with an empty cache, so every chunk is
+    embedded (parsing and splitting are included and identical for both);
+  - embedding alone: passages/s of `embed_documents` on the recall corpus,
+    and the median time to embed one question;
+  - recall@k: passages of a synthetic corpus with a large vocabulary are
+    embedded, and each query (a few words of one passage, one of them
+    misspelled, plus filler words) should retrieve its passage.
+
+Offline, the remote backend is the local OpenAI stand-in with --latency per
+request; its vectors are hashes of the whole text, so its recall is not
+reported. Without tiktoken encodings the client sends byte-level token ids,
+about four times as many as real BPE, which inflates the remote client's
+own CPU time. With --live, the real API is used (OPENAI_API_KEY, billed) and
+both recalls are meaningful. The queries share wording with their passage:
+this measures lexical recall, not paraphrase matching.
+
+Usage:
+    python -m benchmarks.bench_embeddings [--pages 200] [--latency 0.3] [--passages 2000] [--local hashed:2048 hashed:4096] [--live]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_e2e import NamedBytes
+from benchmarks.datasets import synthetic_pdf
+from benchmarks.stub_openai import StubOpenAI, install_offline_encoding
+
+REMOTE_MODEL = "text-embedding-ada-002"
+COMMON_WORDS = 200
+FILLER = "what does the document say about the".split()
+_SYLLABLES = [c + v for c in "bdfgklmnprstvz" for v in "aeiou"]
+
+
+def pseudo_words(count: int, rng: random.Random) -> list:
+    """Distinct pronounceable words of two to four syllables."""
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + word[i + 1:]
+
+
+def recall_set(passages: int, queries: int, seed: int = 0):
+    """Passages with Zipf-distributed words, and (query, passage index) pairs."""
+    rng = random.Random(seed)
+    vocabulary = pseudo_words(5000, rng)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    texts = [" ".join(rng.choices(vocabulary, weights, k=150)) for _ in range(passages)]
+    # The most frequent words play the part of stop words and are never asked for
+    common = set(vocabulary[:COMMON_WORDS])
+    asked = []
+    for _ in range(queries):
+        target = rng.randrange(passages)
+        words = rng.sample(sorted(set(texts[target].split()) - common), 6)
+        words[0] = misspell(words[0], rng)
+        asked.append((" ".join(FILLER[:rng.randint(3, len(FILLER))] + words), target))
+    return texts, asked
+
+
+def embed_and_recall(embeddings, texts: list, asked: list, recall: bool, ks=(1, 5)) -> dict:
+    """Passages embedded per second and, if `recall`, the share of queries finding their passage in the top k."""
+    import numpy as np
+
+    start = time.perf_counter()
+    matrix = np.array(embeddings.embed_documents(texts), dtype=np.float32)
+    result = {"embed_rate": len(texts) / (time.perf_counter() - start), "recall": None}
+    if not recall:
+        return result
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    hits = {k: 0 for k in ks}
+    for query, target in asked:
+        scores = matrix @ np.array(embeddings.embed_query(query), dtype=np.float32)
+        rank = int((scores > scores[target]).sum())
+        for k in ks:
+            hits[k] += rank < k
+    result["recall"] = {k: hits[k] / len(asked) for k in ks}
+    return result
+
+
+def ingest(content: bytes, model: str, api_key: str) -> dict:
+    from utils.pdf_utils import load_pdf_to_vectorstore
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        faiss_db = load_pdf_to_vectorstore(
+            NamedBytes(content, "bench.pdf"), api_key, embedding_model=model, cache_dir=cache_dir
+        )
+        seconds = time.perf_counter() - start
+    return {"seconds": seconds, "chunks": faiss_db.index.ntotal, "dim": faiss_db.index.d}
+
+
+def query_ms(embeddings, asked: list) -> float:
+    times = []
+    for query, _ in asked[:20]:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def run(args, api_key: str, remote_recall: bool) -> None:
+    from utils.embedding_utils import get_embedding_backend
+
+    content = synthetic_pdf(args.pages, seed=3)
+    texts, asked = recall_set(args.passages, args.queries)
+    backends = {REMOTE_MODEL: "remote", **{model: "local" for model in args.local}}
+    # Imports, client setup and the first connection are not ingestion
+    for model in backends:
+        get_embedding_backend(api_key, model).embed_query("warm up")
+
+    print(f"{args.pages}-page PDF; recall over {len(texts)} passages, {len(asked)} queries")
+    print(f"{'backend':<8} {'model':<24} {'dim':>5} {'chunks':>7} {'ingest (s)':>11} {'chunks/s':>9} "
+          f"{'embed/s':>8} {'query (ms)':>11} {'recall@1':>9} {'recall@5':>9}")
+    results = {}
+    for model, kind in backends.items():
+        embeddings = get_embedding_backend(api_key, model)
+        r = results[model] = ingest(content, model, api_key)
+        r["query_ms"] = query_ms(embeddings, asked)
+        r.update(embed_and_recall(embeddings, texts, asked, recall=kind == "local" or remote_recall))
+        shown = [f"{r['recall'][k]:>9.0%}" if r["recall"] else f"{'n/a':>9}" for k in (1, 5)]
+        print(f"{kind:<8} {model:<24} {r['dim']:>5} {r['chunks']:>7} {r['seconds']:>11.2f} "
+              f"{r['chunks'] / r['seconds']:>9.0f} {r['embed_rate']:>8.0f} {r['query_ms']:>11.2f} {' '.join(shown)}")
+
+    remote = results[REMOTE_MODEL]
+    for model in args.local:
+        print(f"{model}: ingestion {remote['seconds'] / results[model]['seconds']:.1f}x faster, "
+              f"query embedding {remote['query_ms'] / results[model]['query_ms']:.0f}x faster than {REMOTE_MODEL}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200, help="Pages of the ingested PDF.")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub latency per embeddings request in seconds.")
+    parser.add_argument("--passages", type=int, default=2000, help="Passages of the recall corpus.")
+    parser.add_argument("--queries", type=int, default=200, help="Recall queries.")
+    parser.add_argument("--local", nargs="+", default=["hashed:2048", "hashed:4096"], help="Local model strings.")
+    parser.add_argument("--live", action="store_true", help="Use the real OpenAI API (OPENAI_API_KEY).")
+    args = parser.parse_args()
+
+    if args.live:
+        run(args, os.environ["OPENAI_API_KEY"], remote_recall=True)
+        return
+    with StubOpenAI(latency=args.latency) as stub:
+        # Read at import time by the utils modules
+        os.environ["OPENAI_API_BASE"] = stub.base_url
+        if install_offline_encoding():
+            print("tiktoken encodings unavailable; using a byte-level stand-in")
+        run(args, "sk-bench", remote_recall=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/bench_index.py
+"""
+Recall@k, query latency, memory and build time of the FAISS index types in
+utils.index_utils, on synthetic clustered unit vectors shaped like text
+embeddings. Exact flat search provides the ground truth. Runs offline.
+
+Usage:
+    python -m benchmarks.bench_index [--sizes 5000 20000] [--dim 1536] [--k 4]
+                                     [--types flat fp16 hnsw ivf ivfsq8 ivfpq]
+"""
+import argparse
+import statistics
+import time
+
+import faiss
+import numpy as np
+
+from utils.index_utils import INDEX_TYPES, build_index, choose_index_type, index_bytes
+
+
+def synthetic_embeddings(n: int, dim: int, clusters: int = 200, latent_dim: int = 64, seed: int = 0) -> np.ndarray:
+    """
+    Unit vectors drawn around random topic centers in a `latent_dim`-dimensional
+    subspace plus a little isotropic noise. Text embeddings have a low intrinsic
+    dimension too; fully isotropic noise makes every neighbour equidistant.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, latent_dim))
+    latent = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, latent_dim))
+    projection = rng.standard_normal((latent_dim, dim)) / np.sqrt(latent_dim)
+    vectors = (latent @ projection + 0.05 * rng.standard_normal((n, dim))).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    """Perturbed copies of stored vectors, so each query has close but inexact neighbours."""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), count)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype("float32") / np.sqrt(vectors.shape[1])
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype("float32")
+
+
+def evaluate(index: faiss.Index, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    latencies, hits = [], 0
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(ids[0]) & set(truth[i]))
+    latencies.sort()
+    return {
+        "recall": hits / (len(queries) * k),
+        "p50_us": statistics.median(latencies) * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99) - 1] * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5_000, 20_000])
+    parser.add_argument("--dim", type=int, default=1536, help="Vector dimension (text-embedding-ada-002: 1536).")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4, help="Neighbours per query (LangChain retriever default: 4).")
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads used for search.")
+    args = parser.parse_args()
+
+    print(f"{'chunks':>8} {'index':<6} {'recall@' + str(args.k):>9} {'p50 (us)':>9} {'p99 (us)':>9} "
+          f"{'MiB':>8} {'vs flat':>8} {'build (s)':>9}")
+    for n in args.sizes:
+        vectors = synthetic_embeddings(n, args.dim)
+        queries = make_queries(vectors, args.queries)
+        exact = build_index(vectors, "flat")
+        _, truth = exact.search(queries, args.k)
+        flat_bytes = index_bytes(exact)
+        for index_type in args.types:
+            resolved = choose_index_type(n, index_type)
+            start = time.perf_counter()
+            index = build_index(vectors, resolved)
+            build_seconds = time.perf_counter() - start
+            faiss.omp_set_num_threads(args.threads)
+            result = evaluate(index, queries, truth, args.k)
+            faiss.omp_set_num_threads(faiss.omp_get_max_threads())
+            size = index_bytes(index)
+            label = resolved if resolved == index_type else f"{index_type}->{resolved}"
+            print(f"{n:>8} {label:<6} {result['recall']:>9.3f} {result['p50_us']:>9.1f} {result['p99_us']:>9.1f} "
+                  f"{size / 2 ** 20:>8.1f} {size / flat_bytes:>8.2f} {build_seconds:>9.2f}")
+        print(f"{n:>8} auto = {choose_index_type(n)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# benchmarks/bench_retrieval.py
+"""
+Compare the default FAISS retriever (`as_retriever()`, k=4) with the hybrid
+BM25 + vector retriever on a fixed question set: prompt context tokens,
+retrieval latency, query-embedding API calls, and whether the chunk holding
+an asked-for part number made it into the context. The hybrid retriever is
+measured with and without its context token budget, separating the savings
+of overlap removal and keyword-only lookups from those of the budget.
+
+The PDF is synthetic prose with a parts catalogue sprinkled over its pages;
+half of the questions ask about a part number, half are free-text. The
+stub's embeddings are hash-based, so vector search here carries no meaning:
+the "found" column measures exact-term grounding only.
+
+Usage:
+    python -m benchmarks.bench_retrieval [--pages 50] [--latency 0.05] [--k 4] [--context-tokens 1500]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_e2e import NamedBytes
+from benchmarks.datasets import make_pdf, synthetic_text
+from benchmarks.stub_openai import StubOpenAI, install_offline_encoding
+
+API_KEY = "sk-bench"
+PARTS = 40
+PROSE_QUESTIONS = [
+    "what does the document say about warranty?",
+    "summarize the safety section",
+    "which procedure covers maintenance?",
+    "what are the refund requirements in the policy?",
+    "how is battery inspection scheduled?",
+    "explain the license update process",
+]
+PART_QUESTIONS = [
+    "what is the rated torque of part {part}?",
+    "which supplier makes {part}?",
+    "give me the spec for {part}",
+]
+
+
+def part_number(i: int) -> str:
+    return f"AX-{2000 + 37 * i}"
+
+
+def catalogue_pdf(pages: int, seed: int = 0) -> bytes:
+    """Synthetic prose where every part number appears in exactly one sentence."""
+    rng = random.Random(seed)
+    texts = [synthetic_text(400, rng) for _ in range(pages)]
+    for i in range(PARTS):
+        page = rng.randrange(pages)
+        texts[page] += (f" Part {part_number(i)} has a rated torque of {10 + i} Nm"
+                        f" and is made by supplier {rng.choice('ABCDEFGH')}.")
+    return make_pdf(texts)
+
+
+def questions(seed: int = 1) -> list:
+    """Fixed question set: (question, part number or None)."""
+    rng = random.Random(seed)
+    asked = []
+    for template in PART_QUESTIONS * 2:
+        part = part_number(rng.randrange(PARTS))
+        asked.append((template.format(part=part), part))
+    return asked + [(question, None) for question in PROSE_QUESTIONS]
+
+
+def measure(retriever, stub: StubOpenAI, asked: list) -> dict:
+    from utils.memory_utils import count_tokens
+
+    stub.reset_counts()
+    latencies, tokens, found = [], [], 0
+    for question, part in asked:
+        start = time.perf_counter()
+        docs = retriever.invoke(question)
+        latencies.append(time.perf_counter() - start)
+        context = "\n\n".join(doc.page_content for doc in docs)
+        tokens.append(count_tokens(context))
+        found += part is not None and part in context
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "context_tokens": statistics.mean(tokens),
+        "embedding_calls": stub.counts["embeddings"],
+        "found": found,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency per request in seconds.")
+    parser.add_argument("--k", type=int, default=4, help="Chunks per query for both retrievers.")
+    parser.add_argument("--context-tokens", type=int, default=None,
+                        help="Token budget of the budgeted hybrid retriever (default: DEFAULT_CONTEXT_TOKENS).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir, StubOpenAI(latency=args.latency) as stub:
+        os.environ["AGENT_CACHE_DIR"] = cache_dir
+        os.environ["OPENAI_API_BASE"] = stub.base_url
+        if install_offline_encoding():
+            print("tiktoken encodings unavailable; token counts are bytes (~4x real BPE counts)")
+        from utils.pdf_utils import get_shared_retriever, get_shared_vectorstore
+        from utils.retrieval_utils import DEFAULT_CONTEXT_TOKENS, get_retrieval_stats
+        args.context_tokens = args.context_tokens or DEFAULT_CONTEXT_TOKENS
+
+        upload = NamedBytes(catalogue_pdf(args.pages), "catalogue.pdf")
+        baseline = get_shared_vectorstore(upload, API_KEY).as_retriever(search_kwargs={"k": args.k})
+        unbudgeted = get_shared_retriever(upload, API_KEY, k=args.k, max_context_tokens=10 ** 9)
+        hybrid = get_shared_retriever(upload, API_KEY, k=args.k, max_context_tokens=args.context_tokens)
+        asked = questions()
+        parts_asked = sum(part is not None for _, part in asked)
+
+        print(f"{len(asked)} questions ({parts_asked} part-number lookups), "
+              f"{baseline.vectorstore.index.ntotal} chunks, stub latency {args.latency * 1000:.0f} ms")
+        print(f"{'retriever':<10} {'p50 (ms)':>9} {'mean (ms)':>10} {'ctx tokens':>11} {'embed calls':>12} "
+              f"{'found':>7}")
+        results = {}
+        for name, retriever in (("baseline", baseline), ("hybrid", unbudgeted), ("budgeted", hybrid)):
+            r = results[name] = measure(retriever, stub, asked)
+            print(f"{name:<10} {r['p50_ms']:>9.1f} {r['mean_ms']:>10.1f} {r['context_tokens']:>11.0f} "
+                  f"{r['embedding_calls']:>12} {r['found']:>4}/{parts_asked}")
+
+    for name in ("hybrid", "budgeted"):
+        saved = 1 - results[name]["context_tokens"] / results["baseline"]["context_tokens"]
+        print(f"{name}: context tokens -{saved:.0%} vs baseline")
+    print(f"retrievals {get_retrieval_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# benchmarks/bench_router.py
+"""
+Routing accuracy and latency of RouterAgent.select_tool, compared with the
+previous substring keyword scorer. Both a PDF and a CSV are treated as loaded.
+Runs fully offline.
+
+Accuracy is reported on two labelled sets. LABELLED_QUERIES are close to the
+classifier's EXAMPLE_QUERIES, so they are in-sample. HELD_OUT_QUERIES were
+written without looking at the examples and use other wording; they are the
+number to trust. For the held-out PDF/CSV picks, accuracy is broken down
+by confidence below and above the fan-out threshold, to check that
+confidence is calibrated. The share of AMBIGUOUS_QUERIES that would fan out
+is also reported. Those queries could be answered from either file.
+
+Usage:
+    python -m benchmarks.bench_router [--repeat 200]
+"""
+import argparse
+import statistics
+import time
+
+from agents.router_agent import CSV_KEYWORDS, FANOUT_CONFIDENCE, PDF_KEYWORDS, RouterAgent
+
+LABELLED_QUERIES = [
+    ("what does the document say about refunds", "pdf"),
+    ("summarize section 4 of the pdf", "pdf"),
+    ("according to the document, who approves budget changes", "pdf"),
+    ("what are the safety warnings in the manual", "pdf"),
+    ("list the key findings of the report", "pdf"),
+    ("what is the notice period in the contract", "pdf"),
+    ("explain the conclusion of the paper", "pdf"),
+    ("which paragraph mentions data retention", "pdf"),
+    ("what does the author recommend for installation", "pdf"),
+    ("give me a summary of the introduction chapter", "pdf"),
+    ("barely any details on pricing in the policy, right?", "pdf"),
+    ("what warranty is described for the product", "pdf"),
+    ("plot revenue by month", "csv"),
+    ("show a bar chart of sales per region", "csv"),
+    ("what is the average order value", "csv"),
+    ("top 5 customers by revenue", "csv"),
+    ("how many rows are in the dataset", "csv"),
+    ("scatter price against quantity", "csv"),
+    ("which category sold the most units", "csv"),
+    ("what is the trend of signups over time", "csv"),
+    ("count orders per country", "csv"),
+    ("sum the amount grouped by channel", "csv"),
+    ("what is the median delivery time per region", "csv"),
+    ("compare total revenue between 2022 and 2023", "csv"),
+    ("hi there", "chat"),
+    ("tell me something funny", "chat"),
+    ("what is the capital of japan", "chat"),
+    ("write a haiku about autumn", "chat"),
+    ("how do I make pancakes", "chat"),
+    ("thank you!", "chat"),
+    ("can you help me draft a cover letter", "chat"),
+    ("please update me on how you work", "chat"),
+    ("explain quantum computing simply", "chat"),
+    ("what should I name my dog", "chat"),
+]
+
+# Written independently of EXAMPLE_QUERIES
+HELD_OUT_QUERIES = [
+    ("what obligations does the supplier have under the agreement", "pdf"),
+    ("what does the report conclude about customer churn", "pdf"),
+    ("where does the manual describe resetting the device", "pdf"),
+    ("what are the eligibility criteria in the grant guidelines", "pdf"),
+    ("who signed the memorandum", "pdf"),
+    ("what penalties apply for late delivery according to the terms", "pdf"),
+    ("what is the scope of the audit described in the report", "pdf"),
+    ("explain the risk factors listed in the prospectus", "pdf"),
+    ("how is confidential information defined", "pdf"),
+    ("what does the employee handbook say about remote work", "pdf"),
+    ("summarize the executive summary", "pdf"),
+    ("what background does the study give on the problem", "pdf"),
+    ("what troubleshooting steps are recommended", "pdf"),
+    ("what are the payment terms in the invoice conditions", "pdf"),
+    ("which store had the lowest profit margin", "csv"),
+    ("average salary per department", "csv"),
+    ("how many customers signed up each week", "csv"),
+    ("list the 3 most expensive items", "csv"),
+    ("what share of tickets were resolved within a day", "csv"),
+    ("total quantity shipped per warehouse", "csv"),
+    ("standard deviation of the response time", "csv"),
+    ("which employee closed the most deals last quarter", "csv"),
+    ("distribution of order sizes", "csv"),
+    ("number of distinct cities in the records", "csv"),
+    ("rank the suppliers by total spend", "csv"),
+    ("how did weekly active users change across months", "csv"),
+    ("what is the highest temperature recorded", "csv"),
+    ("percentage of null values in each column", "csv"),
+    ("graph the number of signups per day", "csv"),
+    ("good evening", "chat"),
+    ("what's a good name for a startup", "chat"),
+    ("write a limerick about a cat", "chat"),
+    ("how far is the moon", "chat"),
+    ("suggest a weekend workout routine", "chat"),
+    ("what is photosynthesis", "chat"),
+    ("can you proofread my message", "chat"),
+    ("tell me about the roman empire", "chat"),
+    ("i need motivation to study", "chat"),
+    ("what's the difference between a virus and bacteria", "chat"),
+    ("recommend a movie for tonight", "chat"),
+    ("how do i tie a tie", "chat"),
+]
+# Answerable from either a PDF or a CSV; these should fan out
+AMBIGUOUS_QUERIES = [
+    "list the employees with salary above 5000",
+    "what was total revenue in 2023?",
+    "summarize the main findings",
+    "what are the key numbers",
+    "list all products",
+    "what is our return rate",
+    "how much did we spend on marketing",
+    "what is the price of the premium plan",
+]
+
+RESOURCES = {"has_pdf": True, "has_csv": True, "pdf_loaded": True, "csv_df": object()}
+
+
+def legacy_select(query: str) -> str:
+    """The previous router: substring keyword counts, ties to PDF."""
+    text = query.lower()
+    pdf_score = sum(1 for kw in PDF_KEYWORDS if kw in text)
+    csv_score = sum(1 for kw in CSV_KEYWORDS if kw in text)
+    if pdf_score == 0 and csv_score == 0:
+        return "chat"
+    return "pdf" if pdf_score >= csv_score else "csv"
+
+
+def evaluate(select, queries: list, repeat: int) -> dict:
+    correct = sum(1 for query, label in queries if select(query) == label)
+    timings = []
+    for _ in range(repeat):
+        for query, _ in queries:
+            start = time.perf_counter()
+            select(query)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "accuracy": correct / len(queries),
+        "p50_us": statistics.median(timings) * 1e6,
+        "p99_us": timings[int(len(timings) * 0.99) - 1] * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    router = RouterAgent(chat_agent=None, pdf_agent=None, csv_agent=None)
+    routers = {
+        "legacy substring": legacy_select,
+        "two-tier router": lambda q: router.select_tool(q, RESOURCES)[0],
+    }
+    print(f"{'router':<18} {'queries':<9} {'accuracy':>9} {'p50 (us)':>9} {'p99 (us)':>9}")
+    for name, select in routers.items():
+        for label, queries in (("in-sample", LABELLED_QUERIES), ("held-out", HELD_OUT_QUERIES)):
+            r = evaluate(select, queries, args.repeat)
+            print(f"{name:<18} {label:<9} {r['accuracy']:>9.1%} {r['p50_us']:>9.1f} {r['p99_us']:>9.1f}")
+
+    picks = [(router.select_tool(q, RESOURCES), label) for q, label in HELD_OUT_QUERIES]
+    for name, keep in (("below", lambda c: c < FANOUT_CONFIDENCE), ("at/above", lambda c: c >= FANOUT_CONFIDENCE)):
+        bucket = [tool == label for (tool, confidence), label in picks if tool != "chat" and keep(confidence)]
+        accuracy = f"{sum(bucket) / len(bucket):.0%}" if bucket else "-"
+        print(f"held-out PDF/CSV picks with confidence {name} {FANOUT_CONFIDENCE:g}: {len(bucket)}, accuracy {accuracy}")
+    ambiguous = [router.select_tool(q, RESOURCES) for q in AMBIGUOUS_QUERIES]
+    fanned = sum(tool != "chat" and confidence < FANOUT_CONFIDENCE for tool, confidence in ambiguous)
+    print(f"ambiguous queries that fan out: {fanned}/{len(ambiguous)}")
+
+    misses = [(q, label, tool) for ((tool, _), label), (q, _) in zip(picks, HELD_OUT_QUERIES) if tool != label]
+    for query, label, got in misses:
+        print(f"  held-out miss: {query!r} expected {label}, got {got}")
+
+
+if __name__ == "__main__":
+    main()
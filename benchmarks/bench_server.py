@@ -0,0 +1,139 @@
+# benchmarks/bench_server.py
+"""
+Throughput of the HTTP API (server.py) against a local OpenAI stand-in.
+
+Every simulated client owns a session with a PDF and a CSV uploaded, then
+sends a fixed mix of chat, PDF, CSV and smart-route requests back to back.
+Requests within a session are serialized by the server, so concurrency
+comes from the number of clients. Concurrency 1 is what one Streamlit
+session gets; higher levels show how far the worker pools overlap upstream
+calls, and past the admission limits, how many requests are turned away
+with 503 instead of queueing without bound.
+
+The answer cache is disabled so every request pays for its upstream calls.
+
+Usage:
+    python -m benchmarks.bench_server [--clients 1 8 32 128] [--requests 8]
+                                      [--workers 32] [--queue 64] [--latency 0.1]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.bench_e2e import percentiles
+from benchmarks.datasets import synthetic_orders_csv, synthetic_pdf
+from benchmarks.stub_openai import StubOpenAI, install_offline_encoding
+
+API_KEY = "sk-bench"
+# (path, JSON body) pairs cycled through by every client
+WORKLOAD = [
+    ("chat", {"message": "give me three ideas for a team offsite"}),
+    ("pdf/query", {"question": "what does the document say about warranty?"}),
+    ("csv/query", {"query": "which channel has the best retention of discount customers?"}),
+    ("route", {"query": "summarize the safety section of the document"}),
+    ("csv/query", {"query": "what is the average revenue by region?"}),
+]
+
+
+async def upload(http, url: str, data: bytes) -> None:
+    # Uploads are setup, not measured: back off when ingestion is saturated
+    while True:
+        async with http.post(url, data=data) as response:
+            if response.status != 503:
+                response.raise_for_status()
+                return
+            retry_after = float(response.headers.get("Retry-After", 1))
+        await asyncio.sleep(min(retry_after, 1.0))
+
+
+async def open_session(http, base: str, pdf: bytes, csv: bytes) -> str:
+    async with http.post(f"{base}/sessions", json={}) as response:
+        session_id = (await response.json())["session_id"]
+    await upload(http, f"{base}/sessions/{session_id}/pdfs?name=bench.pdf", pdf)
+    await upload(http, f"{base}/sessions/{session_id}/csv?name=bench.csv", csv)
+    return session_id
+
+
+async def client(http, base: str, session_id: str, requests: int, latencies: list, statuses: dict) -> None:
+    for i in range(requests):
+        path, body = WORKLOAD[i % len(WORKLOAD)]
+        start = time.perf_counter()
+        async with http.post(f"{base}/sessions/{session_id}/{path}", json=body) as response:
+            await response.read()
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        if response.status == 200:
+            latencies.append(time.perf_counter() - start)
+
+
+async def run_level(base: str, clients: int, requests: int, pdf: bytes, csv: bytes) -> dict:
+    import aiohttp
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as http:
+        session_ids = await asyncio.gather(*(open_session(http, base, pdf, csv) for _ in range(clients)))
+        latencies, statuses = [], {}
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http, base, sid, requests, latencies, statuses) for sid in session_ids))
+        seconds = time.perf_counter() - start
+        for sid in session_ids:
+            async with http.delete(f"{base}/sessions/{sid}"):
+                pass
+    return {"seconds": seconds, "ok": statuses.get(200, 0), "rejected": statuses.get(503, 0),
+            "errors": sum(n for status, n in statuses.items() if status not in (200, 503)),
+            "latency": percentiles(latencies) if latencies else None}
+
+
+async def run(args, stub: StubOpenAI) -> None:
+    from aiohttp import web
+    from server import AgentService, create_app
+
+    service = AgentService(api_key=API_KEY, query_workers=args.workers)
+    service.query_admission.max_queue = args.queue
+    runner = web.AppRunner(create_app(service))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+
+    pdf = synthetic_pdf(10, seed=1)
+    csv = synthetic_orders_csv(5_000, seed=1)
+    print(f"{'clients':>7} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'ok':>6} {'503':>6} {'errors':>6} "
+          f"{'upstream':>9}")
+    baseline = None
+    try:
+        for clients in args.clients:
+            stub.reset_counts()
+            result = await run_level(base, clients, args.requests, pdf, csv)
+            throughput = result["ok"] / result["seconds"]
+            baseline = baseline or throughput
+            latency = result["latency"] or {"p50_ms": float("nan"), "p95_ms": float("nan")}
+            print(f"{clients:>7} {throughput:>8.1f} {latency['p50_ms']:>9.0f} {latency['p95_ms']:>9.0f} "
+                  f"{result['ok']:>6} {result['rejected']:>6} {result['errors']:>6} "
+                  f"{stub.counts['chat'] + stub.counts['embeddings']:>9}  x{throughput / baseline:.1f}")
+    finally:
+        await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--requests", type=int, default=8, help="Requests per client.")
+    parser.add_argument("--workers", type=int, default=32, help="Query worker threads (and admission slots).")
+    parser.add_argument("--queue", type=int, default=64, help="Queries allowed to wait for a slot.")
+    parser.add_argument("--latency", type=float, default=0.1, help="Stub latency per request in seconds.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir, StubOpenAI(latency=args.latency) as stub:
+        # Read at import time by the utils modules
+        os.environ["AGENT_CACHE_DIR"] = cache_dir
+        os.environ["OPENAI_API_BASE"] = stub.base_url
+        os.environ["AGENT_ANSWER_TTL"] = "0"
+        if install_offline_encoding():
+            print("tiktoken encodings unavailable; using a byte-level stand-in")
+        asyncio.run(run(args, stub))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/datasets.py
+"""
+Deterministic synthetic inputs for the benchmarks: multi-page PDFs built
+without any PDF library, and an orders dataset for the CSV paths.
+"""
+import random
+
+import numpy as np
+import pandas as pd
+
+_VOCABULARY = (
+    "system user report safety warranty contract policy section install "
+    "maintenance revenue customer region product order delivery support "
+    "requirement procedure device battery network storage license update "
+    "payment refund schedule inspection quality component manual review"
+).split()
+
+
+def synthetic_text(words: int, rng: random.Random) -> str:
+    """Return `words` pseudo-random words grouped into sentences."""
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(8, 20))
+        sentence = " ".join(rng.choice(_VOCABULARY) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        words -= length
+    return " ".join(sentences)
+
+
+def make_pdf(pages: list) -> bytes:
+    """
+    Build a minimal PDF with one page of Helvetica text per entry of `pages`.
+
+    Args:
+        pages (list[str]): Text of each page.
+
+    Returns:
+        bytes: The PDF file content.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font = 3 + 2 * len(pages)
+    for i, text in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        )
+        lines = [text[j:j + 90].replace("(", "").replace(")", "") for j in range(0, len(text), 90)]
+        body = "BT /F1 9 Tf 40 760 Td 11 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+
+def synthetic_pdf(pages: int, words_per_page: int = 400, seed: int = 0) -> bytes:
+    """Generate a `pages`-page PDF of pseudo-random prose."""
+    rng = random.Random(seed)
+    return make_pdf([synthetic_text(words_per_page, rng) for _ in range(pages)])
+
+
+def synthetic_orders(rows: int = 5000, seed: int = 0) -> pd.DataFrame:
+    """Generate an orders dataset with dates, categories, numbers and flags."""
+    rng = np.random.default_rng(seed)
+    order_date = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D")
+    units = rng.integers(1, 20, rows)
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "order_date": order_date,
+        "customer": rng.choice([f"C{i:03d}" for i in range(200)], rows),
+        "region": rng.choice(["North", "South", "East", "West"], rows),
+        "channel": rng.choice(["web", "store", "partner"], rows),
+        "category": rng.choice(["tools", "garden", "kitchen", "toys"], rows),
+        "units": units,
+        "revenue": np.round(units * rng.uniform(5, 50, rows), 2),
+        "discount": rng.random(rows) < 0.3,
+        "delivery_days": rng.integers(1, 15, rows),
+    })
+
+
+def synthetic_orders_csv(rows: int, seed: int = 0) -> bytes:
+    """Return the orders dataset serialized as CSV bytes."""
+    return synthetic_orders(rows, seed).to_csv(index=False).encode("utf-8")
@@ -0,0 +1,122 @@
+# benchmarks/profile_startup.py
+"""
+Cold-start and warm-rerun wall time of the Streamlit app, per mode.
+
+Every mode is profiled in a fresh Python process with Streamlit's AppTest:
+the first run of main.py pays for importing whatever that mode needs (the
+cold start a user sees on a new server process), later reruns show what
+every widget interaction costs. An API key is filled in so the agents are
+constructed, but no request is sent.
+
+The slowest top-level imports of each cold run come from `python -X
+importtime`, along with which heavy packages the mode pulled in. A trivial
+Streamlit script is profiled first as the floor.
+
+Usage:
+    python -m benchmarks.profile_startup [--modes Chat "PDF QA"] [--reruns 5] [--imports 5]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+MODES = ["Smart Agent", "Chat", "PDF QA", "CSV QA"]
+HEAVY_PACKAGES = [
+    "langchain", "langchain_community", "langchain_experimental", "langchain_openai",
+    "openai", "tiktoken", "faiss", "pypdf", "pyarrow",
+]
+MARKER = "--- script run ---"
+BASELINE_SCRIPT = "import streamlit as st\nst.title('baseline')\n"
+
+# Run in a fresh interpreter: argv = script, mode, reruns
+RUNNER = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+
+script, mode, reruns = sys.argv[1], sys.argv[2], int(sys.argv[3])
+app = AppTest.from_file(script, default_timeout=300)
+app.session_state["mode"] = mode
+app.session_state["api_key"] = "sk-profile"
+loaded = set(sys.modules)
+print(%r, file=sys.stderr, flush=True)
+start = time.perf_counter()
+app.run()
+cold = time.perf_counter() - start
+warm = []
+for _ in range(reruns):
+    start = time.perf_counter()
+    app.run()
+    warm.append(time.perf_counter() - start)
+new = {name.split(".")[0] for name in set(sys.modules) - loaded}
+print(json.dumps({
+    "cold": cold,
+    "warm": sorted(warm)[len(warm) // 2] if warm else None,
+    "errors": [str(e.value) for e in app.exception],
+    "packages": sorted(new),
+}))
+""" % MARKER
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def top_imports(stderr: str, count: int) -> list:
+    """Slowest imports made directly by the script, (seconds, module), from -X importtime output."""
+    imports = []
+    for line in stderr.split(MARKER, 1)[-1].splitlines():
+        match = _IMPORT_LINE.match(line)
+        # Unindented entries are the script's own import statements
+        if match and not match.group(3):
+            imports.append((int(match.group(2)) / 1e6, match.group(4)))
+    return sorted(imports, reverse=True)[:count]
+
+
+def profile(script: str, mode: str, reruns: int, importtime: bool) -> dict:
+    """Profile one mode of `script` in a fresh process."""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", RUNNER, script, mode, str(reruns)]
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(script) or ".")
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr[-2000:])
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["imports"] = top_imports(completed.stderr, 20) if importtime else []
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--script", default="main.py", help="Streamlit script to profile.")
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--reruns", type=int, default=5, help="Warm reruns per mode (median reported).")
+    parser.add_argument("--imports", type=int, default=5, help="Slowest imports listed per mode.")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+    script = os.path.abspath(args.script)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write(BASELINE_SCRIPT)
+    try:
+        results = {"(streamlit only)": profile(f.name, MODES[0], args.reruns, importtime=False)}
+    finally:
+        os.unlink(f.name)
+    for mode in args.modes:
+        results[mode] = profile(script, mode, args.reruns, importtime=args.imports > 0)
+
+    print(f"{'mode':<18} {'cold (s)':>9} {'warm (ms)':>10}  heavy packages loaded")
+    for mode, result in results.items():
+        heavy = ", ".join(p for p in HEAVY_PACKAGES if p in result["packages"]) or "-"
+        print(f"{mode:<18} {result['cold']:>9.2f} {result['warm'] * 1000:>10.1f}  {heavy}")
+        if result["errors"]:
+            print(f"  errors: {result['errors']}")
+    if args.imports:
+        for mode in args.modes:
+            slowest = ", ".join(f"{name} {seconds:.2f}s" for seconds, name in results[mode]["imports"][:args.imports])
+            print(f"slowest imports, {mode}: {slowest or '-'}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# benchmarks/stub_openai.py
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_REPLY = "This is a stub answer generated locally for benchmarking."
+
+
+def default_responder(messages: List[dict]) -> str:
+    """Return a canned reply; ReAct-style agent prompts get a valid final answer."""
+    text = " ".join(str(m.get("content", "")) for m in messages)
+    if "Final Answer" in text:
+        return 'Final Answer: {"answer": "stub"}'
+    return DEFAULT_REPLY
+
+
+def stub_embedding(text: str, dim: int) -> List[float]:
+    """Deterministic unit vector derived from the text hash."""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    raw = [(digest[i % len(digest)] - 127.5) / 127.5 for i in range(dim)]
+    norm = sum(v * v for v in raw) ** 0.5 or 1.0
+    return [v / norm for v in raw]
+
+
+def install_offline_encoding(encoding_name: str = "cl100k_base") -> bool:
+    """
+    Make tiktoken usable without network access. tiktoken downloads its BPE
+    files on first use; when that fails, register a byte-level encoding under
+    `encoding_name` so clients that count or split tokens keep working against
+    the stub (with token counts of one per byte).
+
+    Returns:
+        bool: True if the fallback encoding was installed.
+    """
+    import tiktoken
+    import tiktoken.registry
+
+    try:
+        tiktoken.get_encoding(encoding_name)
+        return False
+    except Exception:
+        pass
+    tiktoken.registry.ENCODINGS[encoding_name] = tiktoken.Encoding(
+        name=encoding_name,
+        pat_str=r"\S+|\s+",
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={"<|endoftext|>": 256},
+    )
+    return True
+
+
+class StubOpenAI:
+    """
+    Local stand-in for the OpenAI chat-completions and embeddings endpoints.
+
+    Latency is applied before every response; when `tokens_per_sec` is set,
+    streamed completions emit one word per 1/tokens_per_sec seconds. With
+    `requests_per_minute`, requests over that rate get 429 with Retry-After,
+    like the real API. Request and TCP connection counts are recorded so
+    callers can see how many upstream calls and handshakes a workload caused.
+    """
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        tokens_per_sec: Optional[float] = None,
+        embedding_dim: int = 256,
+        responder: Callable[[List[dict]], str] = default_responder,
+        requests_per_minute: Optional[float] = None
+    ):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.embedding_dim = embedding_dim
+        self.responder = responder
+        self.counts: Dict[str, int] = {
+            "connections": 0, "chat": 0, "embeddings": 0, "embedded_inputs": 0, "rate_limited": 0
+        }
+        self._counts_lock = threading.Lock()
+        self.requests_per_minute = requests_per_minute
+        # Token bucket holding one second's worth of requests
+        self._allowance = (requests_per_minute or 0) / 60.0
+        self._allowance_at = time.monotonic()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def bump(self, name: str, amount: int = 1) -> None:
+        with self._counts_lock:
+            self.counts[name] += amount
+
+    def admit(self) -> float:
+        """Take one request from the rate limit; returns 0, or the seconds to wait if over it."""
+        if not self.requests_per_minute:
+            return 0.0
+        rate = self.requests_per_minute / 60.0
+        with self._counts_lock:
+            now = time.monotonic()
+            self._allowance = min(max(rate, 1.0), self._allowance + (now - self._allowance_at) * rate)
+            self._allowance_at = now
+            if self._allowance >= 1.0:
+                self._allowance -= 1.0
+                return 0.0
+            self.counts["rate_limited"] += 1
+            return (1.0 - self._allowance) / rate
+
+    def reset_counts(self) -> None:
+        with self._counts_lock:
+            for name in self.counts:
+                self.counts[name] = 0
+
+    def start(self) -> "StubOpenAI":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubOpenAI":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Buffer headers and body into one write so delayed ACKs don't skew timings
+            wbufsize = 64 * 1024
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def setup(self) -> None:
+                super().setup()
+                stub.bump("connections")
+
+            def _send_json(self, payload: dict, status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_chunk(self, data: str) -> None:
+                payload = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                wait = stub.admit()
+                if wait:
+                    self._send_json(
+                        {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                        status=429,
+                        headers={"Retry-After": str(max(1, round(wait))), "Retry-After-Ms": str(int(wait * 1000))}
+                    )
+                    return
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if self.path.endswith("/embeddings"):
+                    self._embeddings(body)
+                elif self.path.endswith("/chat/completions"):
+                    self._chat(body)
+                else:
+                    self._send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+            def _embeddings(self, body: dict) -> None:
+                inputs = body.get("input", [])
+                if not isinstance(inputs, list):
+                    inputs = [inputs]
+                stub.bump("embeddings")
+                stub.bump("embedded_inputs", len(inputs))
+                data = [
+                    {"object": "embedding", "index": i, "embedding": stub_embedding(str(text), stub.embedding_dim)}
+                    for i, text in enumerate(inputs)
+                ]
+                self._send_json({
+                    "object": "list",
+                    "model": body.get("model", "stub"),
+                    "data": data,
+                    "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+                })
+
+            def _chat(self, body: dict) -> None:
+                stub.bump("chat")
+                reply = stub.responder(body.get("messages", []))
+                model = body.get("model", "stub")
+                if not body.get("stream"):
+                    if stub.tokens_per_sec:
+                        time.sleep(len(reply.split()) / stub.tokens_per_sec)
+                    self._send_json({
+                        "id": "stub",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": len(reply.split()), "total_tokens": len(reply.split())},
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                words = reply.split(" ")
+                for i, word in enumerate(words):
+                    if stub.tokens_per_sec:
+                        time.sleep(1.0 / stub.tokens_per_sec)
+                    delta = {"role": "assistant", "content": word if i == 0 else " " + word}
+                    self._send_chunk(json.dumps({
+                        "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                    }))
+                self._send_chunk(json.dumps({
+                    "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                }))
+                self._send_chunk("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
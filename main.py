@@ -1,12 +1,26 @@
 # ai-agent-multitool/main.py
+from contextlib import nullcontext
+from typing import TYPE_CHECKING
+import sys
 import streamlit as st
-import pandas as pd
-from langchain.memory import ConversationBufferMemory
-from agents.chat_agent import ChatAgent
-from agents.pdf_agent import PdfAgent
-from agents.csv_agent import CsvAgent
-from agents.router_agent import RouterAgent  
-from utils.plot_utils import plot_bar, plot_line, plot_scatter
+from utils.trace_utils import DEFAULT_TRACE_FILE, export_jsonl, span, start_trace
+
+# Agents, their toolkits and pandas are imported where a mode first needs them,
+# so a cold start only pays for the selected mode; once imported they stay in
+# sys.modules for every later rerun. Track with benchmarks/profile_startup.py.
+if TYPE_CHECKING:
+    import pandas as pd
+    from langchain.memory.chat_memory import BaseChatMemory
+    from agents.csv_agent import CsvAgent
+    from agents.pdf_agent import PdfAgent
+
+# Traces kept per session for the sidebar panel and download
+MAX_SESSION_TRACES = 50
+# Seconds the script waits for a new ingestion job before leaving it to the
+# background, so cached and small files are ready without an extra rerun
+INGESTION_INLINE_SECONDS = 0.25
+# Seconds between sidebar progress refreshes while uploads are ingested
+INGESTION_POLL_SECONDS = 1.0
 
 
 def render_history(messages: list[dict]):
@@ -17,24 +31,279 @@ def render_history(messages: list[dict]):
         st.chat_message(role).write(content)
 
 
+def render_stream(tokens, agent, prefix: str = "") -> str:
+    """
+    Render a token stream into an assistant message as it arrives and return
+    the full text. Time-to-first-token and total time are shown under the
+    message and appended to `st.session_state["response_timings"]`.
+    """
+    with st.chat_message("assistant"):
+        if prefix:
+            st.markdown(prefix)
+        with span("render.stream"):
+            text = st.write_stream(tokens)
+        timing = getattr(agent, "last_timing", None)
+        if timing is not None and timing.total_time is not None:
+            st.caption(f"First token {timing.time_to_first_token:.2f}s · total {timing.total_time:.2f}s")
+            st.session_state.setdefault("response_timings", []).append(timing.as_dict())
+    return text
+
+
+def turn_trace(name: str, **attrs):
+    """Trace the block when tracing is switched on in the sidebar; otherwise a no-op."""
+    if st.session_state.get("tracing"):
+        return start_trace(name, **attrs)
+    return nullcontext()
+
+
+def keep_trace(trace):
+    """
+    Keep a finished trace for the sidebar panel and append it to DEFAULT_TRACE_FILE
+    if one is configured. Traces without any recorded stage are dropped.
+    """
+    if trace is None or len(trace.spans) < 2:
+        return
+    traces = st.session_state.setdefault("traces", [])
+    traces.append(trace)
+    del traces[:-MAX_SESSION_TRACES]
+    if DEFAULT_TRACE_FILE:
+        export_jsonl([trace], DEFAULT_TRACE_FILE)
+
+
+def render_trace_panel():
+    """Show the spans of the latest trace in a collapsible sidebar panel with a JSONL download."""
+    traces = st.session_state.get("traces")
+    if not st.session_state.get("tracing") or not traces:
+        return
+    trace = traces[-1]
+    records = trace.records()
+    depth = {}
+    for record in records:
+        depth[record["span_id"]] = depth.get(record["parent_id"], -1) + 1
+    rows = [
+        {
+            "stage": "  " * depth[r["span_id"]] + r["name"],
+            "ms": round(r["duration_ms"] or 0.0, 1),
+            **{k: v for k, v in r.items() if k not in ("trace_id", "span_id", "parent_id", "name", "offset_ms", "duration_ms", "attrs")},
+        }
+        for r in records
+    ]
+    import pandas as pd
+
+    with st.sidebar.expander(f"Trace: {trace.name} ({records[0]['duration_ms'] or 0:.0f} ms)"):
+        st.dataframe(pd.DataFrame(rows).fillna(""), hide_index=True, use_container_width=True)
+        totals = trace.totals()
+        if totals:
+            st.caption(" · ".join(f"{name} {value:g}" for name, value in sorted(totals.items())))
+        st.download_button(
+            "Download traces (JSONL)",
+            data="".join(t.to_jsonl() for t in traces),
+            file_name="traces.jsonl",
+            mime="application/jsonl"
+        )
+
+
+def render_memory_metrics(label: str, memory: "BaseChatMemory"):
+    """Show the prompt tokens spent on conversation history per turn in the sidebar."""
+    tokens = getattr(memory, "prompt_tokens_per_turn", None)
+    if tokens:
+        st.sidebar.caption(f"{label} prompt tokens (history + input), last turn: {tokens[-1]}")
+        st.sidebar.line_chart(tokens, height=120)
+
+
+def upload_fingerprint(uploaded_file) -> str:
+    """
+    Return the content hash of an upload, computed once per uploaded file
+    rather than on every rerun.
+    """
+    cache = st.session_state.setdefault("upload_fingerprints", {})
+    file_id = getattr(uploaded_file, "file_id", None) or f"{uploaded_file.name}:{uploaded_file.size}"
+    if file_id not in cache:
+        from utils.cache_utils import fingerprint_bytes, read_upload_bytes
+
+        cache[file_id] = fingerprint_bytes(read_upload_bytes(uploaded_file))
+    return cache[file_id]
+
+
+def preview_frame(df):
+    """Show the first PREVIEW_ROWS rows instead of shipping the whole frame to the browser."""
+    from utils.csv_utils import PREVIEW_ROWS
+
+    st.dataframe(df.head(PREVIEW_ROWS), use_container_width=True)
+    if len(df) > PREVIEW_ROWS:
+        st.caption(f"Showing the first {PREVIEW_ROWS:,} of {len(df):,} rows.")
+
+
+def get_pdf_agent(state_key: str, api_key: str, memory: "BaseChatMemory", uploaded_files: list) -> tuple:
+    """
+    Return the session's PdfAgent for `state_key`, reusing it across reruns,
+    with its corpus synced to the current uploads, and the ingestion jobs
+    still running. New PDFs are indexed by background jobs shared with every
+    session uploading the same file; each is added to the corpus (copying its
+    vectors from the shared index) on the first rerun after its job finished.
+    Removed uploads are deleted from the index. A new agent is only created
+    when the API key or memory changes.
+    """
+    from agents.pdf_agent import PdfAgent
+    from utils.job_utils import INGESTION_JOBS
+
+    agent = st.session_state.get(state_key)
+    if agent is None or agent.api_key != api_key or agent.memory is not memory:
+        agent = PdfAgent(api_key, memory)
+        st.session_state[state_key] = agent
+    uploads = {upload_fingerprint(f): f for f in uploaded_files}
+    for doc_id in [doc_id for doc_id in agent.documents if doc_id not in uploads]:
+        agent.remove_pdf(doc_id)
+    pending = []
+    for doc_id, uploaded_file in uploads.items():
+        if doc_id in agent.documents:
+            continue
+        job = INGESTION_JOBS.submit(
+            ("pdf", doc_id),
+            lambda progress, f=uploaded_file: agent.prepare_pdf(f, progress=progress),
+            kind="pdf",
+            source=uploaded_file.name
+        )
+        if not job.wait(INGESTION_INLINE_SECONDS):
+            pending.append(job)
+        elif job.error is not None:
+            st.sidebar.error(f"Could not index {job.source}: {job.error}")
+        else:
+            with turn_trace("pdf_ingest", source=uploaded_file.name) as trace:
+                agent.add_pdf(uploaded_file)
+            keep_trace(trace)
+    return agent, pending
+
+
+def get_csv_frame(uploaded_file) -> tuple:
+    """
+    Return the DataFrame of a CSV upload, or None while a background job
+    (shared with every session uploading the same file) is still parsing it,
+    and the jobs still running.
+    """
+    from utils.csv_utils import load_csv
+    from utils.job_utils import INGESTION_JOBS
+
+    fingerprint = upload_fingerprint(uploaded_file)
+    job = INGESTION_JOBS.submit(
+        ("csv", fingerprint),
+        lambda progress: load_csv(uploaded_file, fingerprint=fingerprint),
+        kind="csv",
+        source=uploaded_file.name
+    )
+    if not job.wait(INGESTION_INLINE_SECONDS):
+        return None, [job]
+    if job.error is not None:
+        st.sidebar.error(f"Could not load {job.source}: {job.error}")
+        return None, []
+    # Served from FRAME_REGISTRY (or the Feather cache) the job just filled
+    return load_csv(uploaded_file, fingerprint=fingerprint), []
+
+
+@st.experimental_fragment(run_every=INGESTION_POLL_SECONDS)
+def render_ingestion_progress(jobs: list):
+    """Show the progress of background ingestion jobs, rerunning the app once they have all finished."""
+    if all(job.done for job in jobs):
+        st.rerun()
+    for job in jobs:
+        stats = job.stats
+        if stats is not None and stats.total_pages:
+            st.progress(
+                min(stats.progress, 1.0),
+                text=f"{job.source}: {stats.pages}/{stats.total_pages} pages · "
+                     f"{stats.pages_per_sec:.1f} pages/s · {stats.chunks_per_sec:.1f} chunks/s"
+            )
+        else:
+            verb = "Indexing" if job.kind == "pdf" else "Loading"
+            st.caption(f"{verb} {job.source} ({job.state}, {job.elapsed:.0f}s)...")
+
+
+def take_questions(queue_key: str, question, ready: bool) -> list:
+    """
+    Queue `question` and, once `ready`, return every queued question oldest
+    first. While uploads are still being ingested nothing is returned and the
+    questions wait in `st.session_state[queue_key]`.
+    """
+    queue = st.session_state.setdefault(queue_key, [])
+    if question:
+        queue.append(question)
+    if not ready:
+        if queue:
+            st.caption(f"{len(queue)} question(s) queued; they will be answered once indexing finishes.")
+        return []
+    questions = list(queue)
+    queue.clear()
+    return questions
+
+
+def get_csv_agent(state_key: str, api_key: str, df: "pd.DataFrame") -> "CsvAgent":
+    """
+    Return the session's CsvAgent for `state_key`, reusing it (and the agent
+    executor it keeps, with its Python namespace) across reruns and queries.
+    A new agent is only created when the API key or dataset changes.
+    """
+    from agents.csv_agent import CsvAgent
+
+    agent = st.session_state.get(state_key)
+    if agent is None or agent.api_key != api_key or agent.df is not df:
+        agent = CsvAgent(api_key, df)
+        st.session_state[state_key] = agent
+    return agent
+
+
+def session_memory(state_key: str, **kwargs) -> "BaseChatMemory":
+    """
+    Return the session's conversation memory for `state_key`, created (and
+    the LangChain modules behind it imported) the first time a mode uses it.
+    """
+    if state_key not in st.session_state:
+        from utils.chat_utils import init_memory
+
+        st.session_state[state_key] = init_memory(**kwargs)
+    return st.session_state[state_key]
+
+
+def select_pdf_documents(agent: "PdfAgent", key: str):
+    """Let the user restrict PDF answers to some of the uploaded documents."""
+    if len(agent.documents) < 2:
+        agent.select_documents(None)
+        return
+    names = {doc_id: document.source for doc_id, document in agent.documents.items()}
+    selected = st.sidebar.multiselect("Search in", options=list(names), default=list(names),
+                                      format_func=names.get, key=key)
+    agent.select_documents(None if len(selected) == len(names) else selected)
+
+
+def with_citations(text: str, agent) -> str:
+    """Show the pages the last PDF answer was grounded in and return the text to keep in history."""
+    sources = getattr(agent, "last_sources", None)
+    if not sources:
+        return text
+    from utils.corpus_utils import format_citations
+
+    citation = format_citations(sources)
+    st.caption(f"Sources: {citation}")
+    return f"{text}\n\n*Sources: {citation}*"
+
+
 st.set_page_config(page_title="Multi-Tool AI Agent", layout="wide")
 st.title("🤖 Multi-Tool AI Agent")
 
 
 st.sidebar.header("Settings")
-api_key = st.sidebar.text_input("OpenAI API Key", type="password")
-mode = st.sidebar.radio("Mode", ["Smart Agent", "Chat", "PDF QA", "CSV QA"])
+api_key = st.sidebar.text_input("OpenAI API Key", type="password", key="api_key")
+mode = st.sidebar.radio("Mode", ["Smart Agent", "Chat", "PDF QA", "CSV QA"], key="mode")
+st.sidebar.toggle("Trace requests", key="tracing", help="Record per-stage timings, tokens and API calls.")
 
 
 if mode == "Smart Agent":
 
     st.sidebar.subheader("Resources (Optional)")
-    uploaded_pdf = st.sidebar.file_uploader("Upload PDF", type="pdf")
+    uploaded_pdfs = st.sidebar.file_uploader("Upload PDFs", type="pdf", accept_multiple_files=True)
     uploaded_csv = st.sidebar.file_uploader("Upload CSV", type="csv")
 
 
-    if "chat_mem" not in st.session_state:
-        st.session_state["chat_mem"] = ConversationBufferMemory(return_messages=True)
+    if "chat_messages" not in st.session_state:
         st.session_state["chat_messages"] = [
             {"role": "assistant", "content": "Hi, I'm your AI assistant. How can I help you?"}
         ]
@@ -46,58 +315,81 @@ if mode == "Smart Agent":
 
 
     df = None
+    pending = []
     if uploaded_csv is not None:
-        df = pd.read_csv(uploaded_csv)
-        st.dataframe(df, use_container_width=True)
-
-
-    if "smart_pdf_memory" not in st.session_state:
-        st.session_state["smart_pdf_memory"] = ConversationBufferMemory(
-            return_messages=True, memory_key="chat_history", output_key="answer"
-        )
+        df, pending = get_csv_frame(uploaded_csv)
+        if df is not None:
+            preview_frame(df)
 
 
     chat_agent = None
     pdf_agent = None
     csv_agent = None
     if api_key:
-        chat_agent = ChatAgent(api_key, st.session_state["chat_mem"])
-        if uploaded_pdf is not None:
-            pdf_agent = PdfAgent(api_key, st.session_state["smart_pdf_memory"])
-            pdf_agent.load_pdf(uploaded_pdf)
+        from agents.chat_agent import ChatAgent
+
+        chat_agent = ChatAgent(api_key, session_memory("chat_mem"))
+        if uploaded_pdfs:
+            pdf_memory = session_memory("smart_pdf_memory", memory_key="chat_history", output_key="answer")
+            pdf_agent, pdf_pending = get_pdf_agent("smart_pdf_agent", api_key, pdf_memory, uploaded_pdfs)
+            pending += pdf_pending
+            select_pdf_documents(pdf_agent, "smart_pdf_selection")
         if df is not None:
-            csv_agent = CsvAgent(api_key, df)
+            csv_agent = get_csv_agent("smart_csv_agent", api_key, df)
 
 
-    render_history(st.session_state["smart_messages"])
+    if pending:
+        with st.sidebar:
+            render_ingestion_progress(pending)
 
 
-    user_query = st.chat_input("Describe your task or ask a question (the agent will pick a tool).")
-    if user_query:
-        if not api_key:
-            st.warning("Please enter your OpenAI API Key.")
-        else:
-
-            st.session_state["smart_messages"].append({"role": "user", "content": user_query})
+    render_history(st.session_state["smart_messages"])
 
-            st.chat_message("user").write(user_query)
 
-            router = RouterAgent(chat_agent=chat_agent, pdf_agent=pdf_agent, csv_agent=csv_agent)
+    user_query = st.chat_input("Describe your task or ask a question (the agent will pick a tool).")
+    if user_query and not api_key:
+        st.warning("Please enter your OpenAI API Key.")
+    elif user_query:
+        st.session_state["smart_messages"].append({"role": "user", "content": user_query})
+        st.chat_message("user").write(user_query)
+
+    # Questions asked while uploads are ingested wait until every upload is ready
+    for user_query in take_questions("smart_queue", user_query if api_key else None, ready=bool(api_key) and not pending):
+        with turn_trace("smart_agent", query=user_query) as trace:
+            # The router holds only compiled patterns, so keep one per session
+            if "smart_router" not in st.session_state:
+                from agents.router_agent import RouterAgent
+
+                st.session_state["smart_router"] = RouterAgent(chat_agent=None, pdf_agent=None, csv_agent=None)
+            router = st.session_state["smart_router"]
+            router.chat_agent, router.pdf_agent, router.csv_agent = chat_agent, pdf_agent, csv_agent
             resources = {
-                "has_pdf": uploaded_pdf is not None,
+                "has_pdf": bool(uploaded_pdfs),
                 "has_csv": uploaded_csv is not None,
-                "pdf_loaded": pdf_agent is not None,
+                "pdf_loaded": pdf_agent is not None and pdf_agent.fingerprint is not None,
                 "csv_df": df,
+                "csv_fingerprint": upload_fingerprint(uploaded_csv) if uploaded_csv is not None else None,
             }
 
             with st.spinner("Selecting tool and generating response..."):
-                result = router.route(user_query, resources)
+                result = router.route(user_query, resources, stream=True)
 
             tool = result.get("tool", "chat")
             output = result.get("output", "")
-            badge = f"**Selected tool:** `{tool.upper()}`\n\n"
+            badge = f"**Selected tool:** `{tool.upper()}`"
+            if result.get("fanout"):
+                badge += f" · *best of {len(result['fanout']['answered'])} tools*"
+            badge += " · *cached*\n\n" if result.get("cached") else "\n\n"
+
+            if result.get("streamed"):
+                streaming_agent = pdf_agent if tool == "pdf" else chat_agent
+                text = render_stream(output, streaming_agent, prefix=badge)
+                assistant_text = badge + (text or "(No answer)")
+                if tool == "pdf":
+                    assistant_text = with_citations(assistant_text, pdf_agent)
+                st.session_state["smart_messages"].append({"role": "assistant", "content": assistant_text})
 
-            if tool == "chat":
+            elif tool == "chat":
                 assistant_text = badge + (output or "")
                 st.session_state["smart_messages"].append({"role": "assistant", "content": assistant_text})
                 st.chat_message("assistant").write(assistant_text)
@@ -105,8 +397,10 @@ if mode == "Smart Agent":
             elif tool == "pdf":
                 ans = output.get("answer", "") if isinstance(output, dict) else ""
                 assistant_text = badge + (ans or "(No answer)")
-                st.session_state["smart_messages"].append({"role": "assistant", "content": assistant_text})
                 st.chat_message("assistant").write(assistant_text)
+                if result.get("fanout"):
+                    assistant_text = with_citations(assistant_text, pdf_agent)
+                st.session_state["smart_messages"].append({"role": "assistant", "content": assistant_text})
 
             elif tool == "csv":
                 ans = output.get("answer", "") if isinstance(output, dict) else ""
@@ -115,21 +409,44 @@ if mode == "Smart Agent":
                 st.chat_message("assistant").write(assistant_text)
 
                 if isinstance(output, dict):
-                    if "table" in output:
-                        df_table = pd.DataFrame(output["table"]["data"], columns=output["table"]["columns"])
-                        st.table(df_table)
-                    if "bar" in output:
-                        plot_bar(output["bar"])
-                    if "line" in output:
-                        plot_line(output["line"])
-                    if "scatter" in output:
-                        plot_scatter(output["scatter"])
-
+                    import pandas as pd
+                    from utils.plot_utils import plot_bar, plot_chart, plot_line, plot_scatter
+
+                    with span("render.chart"):
+                        if "table" in output:
+                            df_table = pd.DataFrame(output["table"]["data"], columns=output["table"]["columns"])
+                            st.table(df_table)
+                        if "bar" in output:
+                            plot_bar(output["bar"])
+                        if "line" in output:
+                            plot_line(output["line"])
+                        if "scatter" in output:
+                            plot_scatter(output["scatter"])
+                        if "chart" in output:
+                            plot_chart(df, output["chart"])
+
+            for alternative in result.get("alternatives", []):
+                alternative_output = alternative["output"]
+                text = alternative_output.get("answer", "") if isinstance(alternative_output, dict) else alternative_output
+                with st.expander(f"Also answered by `{alternative['tool'].upper()}`"):
+                    st.markdown(text or "(Table or chart result)")
+        keep_trace(trace)
+
+    render_memory_metrics("Chat", st.session_state.get("chat_mem"))
+    render_memory_metrics("PDF", st.session_state.get("smart_pdf_memory"))
+    # Cache counters only exist once an agent has imported the cache module
+    cache_utils = sys.modules.get("utils.cache_utils")
+    cache_stats = cache_utils.get_cache_stats() if cache_utils else None
+    answer_lookups = cache_stats["answer_hits"] + cache_stats["answer_near_hits"] + cache_stats["answer_misses"] if cache_stats else 0
+    if answer_lookups:
+        st.sidebar.caption(
+            f"Answer cache: {cache_stats['answer_hits']} exact / {cache_stats['answer_near_hits']} near-duplicate "
+            f"hits of {answer_lookups} lookups"
+        )
 
 
 elif mode == "Chat":
-    if "chat_mem" not in st.session_state:
-        st.session_state["chat_mem"] = ConversationBufferMemory(return_messages=True)
+    if "chat_messages" not in st.session_state:
         st.session_state["chat_messages"] = [
             {"role": "assistant", "content": "Hi, I'm your AI assistant. How can I help you?"}
         ]
@@ -141,51 +458,63 @@ elif mode == "Chat":
         if not api_key:
             st.warning("Please enter your OpenAI API Key.")
         else:
-            agent = ChatAgent(api_key, st.session_state["chat_mem"])
-            st.session_state["chat_messages"].append({"role": "user", "content": user_input})
-            st.chat_message("user").write(user_input)
-            with st.spinner("Thinking..."):
-                reply = agent.run(user_input)
-            st.session_state["chat_messages"].append({"role": "assistant", "content": reply})
-            st.chat_message("assistant").write(reply)
+            with turn_trace("chat", query=user_input) as trace:
+                from agents.chat_agent import ChatAgent
+
+                agent = ChatAgent(api_key, session_memory("chat_mem"))
+                st.session_state["chat_messages"].append({"role": "user", "content": user_input})
+                st.chat_message("user").write(user_input)
+                reply = render_stream(agent.stream(user_input), agent)
+                st.session_state["chat_messages"].append({"role": "assistant", "content": reply})
+            keep_trace(trace)
+
+    render_memory_metrics("Chat", st.session_state.get("chat_mem"))
 
 
 elif mode == "PDF QA":
 
     st.sidebar.subheader("PDF")
-    uploaded_file = st.sidebar.file_uploader("Upload PDF file", type="pdf")
+    uploaded_files = st.sidebar.file_uploader("Upload PDF files", type="pdf", accept_multiple_files=True)
 
-    if "memory" not in st.session_state:
-        st.session_state["memory"] = ConversationBufferMemory(
-            return_messages=True, memory_key="chat_history", output_key="answer"
-        )
     if "pdf_messages" not in st.session_state:
         st.session_state["pdf_messages"] = [
-            {"role": "assistant", "content": "Upload a PDF on the left and ask a question about it."}
+            {"role": "assistant", "content": "Upload one or more PDFs on the left and ask a question about them."}
         ]
 
 
     render_history(st.session_state["pdf_messages"])
 
 
-    question = st.chat_input("Enter your question about the uploaded PDF") if uploaded_file else None
-
-    if uploaded_file and question:
-        if not api_key:
-            st.warning("Please enter your OpenAI API Key.")
-        else:
-            agent = PdfAgent(api_key, st.session_state["memory"])
-            agent.load_pdf(uploaded_file)
-
-            st.session_state["pdf_messages"].append({"role": "user", "content": question})
-            st.chat_message("user").write(question)
-
-            with st.spinner("Generating answer..."):
-                result = agent.run(question)
-
-            answer = result.get("answer", "")
+    agent = None
+    pending = []
+    if uploaded_files and api_key:
+        memory = session_memory("memory", memory_key="chat_history", output_key="answer")
+        agent, pending = get_pdf_agent("pdf_agent", api_key, memory, uploaded_files)
+        select_pdf_documents(agent, "pdf_selection")
+    if pending:
+        with st.sidebar:
+            render_ingestion_progress(pending)
+
+    question = st.chat_input("Enter your question about the uploaded PDFs") if uploaded_files else None
+
+    if question and not api_key:
+        st.warning("Please enter your OpenAI API Key.")
+    elif question:
+        st.session_state["pdf_messages"].append({"role": "user", "content": question})
+        st.chat_message("user").write(question)
+
+    # Questions asked while PDFs are indexed wait until every upload is searchable
+    for question in take_questions("pdf_queue", question if api_key else None, ready=agent is not None and not pending):
+        if agent.fingerprint is None:
+            st.warning("Select at least one document to search.")
+            continue
+        with turn_trace("pdf_qa", query=question) as trace:
+            answer = render_stream(agent.stream(question), agent)
+            answer = with_citations(answer, agent)
             st.session_state["pdf_messages"].append({"role": "assistant", "content": answer})
-            st.chat_message("assistant").write(answer)
+        keep_trace(trace)
+
+    render_memory_metrics("PDF", st.session_state.get("memory"))
 
 
 elif mode == "CSV QA":
@@ -199,38 +528,61 @@ elif mode == "CSV QA":
         ]
 
     df = None
+    pending = []
     if csv_file:
-        df = pd.read_csv(csv_file)
-        st.dataframe(df, use_container_width=True)
+        df, pending = get_csv_frame(csv_file)
+        if df is not None:
+            preview_frame(df)
+    if pending:
+        with st.sidebar:
+            render_ingestion_progress(pending)
 
     render_history(st.session_state["csv_messages"])
 
-    query = st.chat_input("Enter query or visualization request") if df is not None else None
+    query = st.chat_input("Enter query or visualization request") if csv_file else None
 
-    if df is not None and query:
-        if not api_key:
-            st.warning("Please enter your OpenAI API Key.")
-        else:
-            st.session_state["csv_messages"].append({"role": "user", "content": query})
-            st.chat_message("user").write(query)
+    if query and not api_key:
+        st.warning("Please enter your OpenAI API Key.")
+    elif query:
+        st.session_state["csv_messages"].append({"role": "user", "content": query})
+        st.chat_message("user").write(query)
 
+    # Questions asked while the CSV is parsed wait until its DataFrame is ready
+    for query in take_questions("csv_queue", query if api_key else None, ready=bool(api_key) and df is not None):
+        with turn_trace("csv_qa", query=query) as trace:
             with st.spinner("Generating response..."):
-                agent = CsvAgent(api_key, df)
+                agent = get_csv_agent("csv_agent", api_key, df)
                 output = agent.run(query)
 
-        
             if isinstance(output, dict) and "answer" in output:
                 answer_text = output["answer"]
                 st.session_state["csv_messages"].append({"role": "assistant", "content": answer_text})
                 st.chat_message("assistant").write(answer_text)
 
-          
-            if isinstance(output, dict) and "table" in output:
-                df_table = pd.DataFrame(output["table"]["data"], columns=output["table"]["columns"])
-                st.table(df_table)
-            if isinstance(output, dict) and "bar" in output:
-                plot_bar(output["bar"])
-            if isinstance(output, dict) and "line" in output:
-                plot_line(output["line"])
-            if isinstance(output, dict) and "scatter" in output:
-                plot_scatter(output["scatter"])
+            import pandas as pd
+            from utils.plot_utils import plot_bar, plot_chart, plot_line, plot_scatter
+
+            with span("render.chart"):
+                if isinstance(output, dict) and "table" in output:
+                    df_table = pd.DataFrame(output["table"]["data"], columns=output["table"]["columns"])
+                    st.table(df_table)
+                if isinstance(output, dict) and "bar" in output:
+                    plot_bar(output["bar"])
+                if isinstance(output, dict) and "line" in output:
+                    plot_line(output["line"])
+                if isinstance(output, dict) and "scatter" in output:
+                    plot_scatter(output["scatter"])
+                if isinstance(output, dict) and "chart" in output:
+                    plot_chart(df, output["chart"])
+        keep_trace(trace)
+
+    # Path stats only exist once a CSV upload has imported the CSV toolkit
+    csv_utils = sys.modules.get("utils.csv_utils")
+    for path, entry in (csv_utils.get_csv_path_stats() if csv_utils else {}).items():
+        if entry["queries"]:
+            st.sidebar.caption(
+                f"CSV {path} path: {entry['hit_rate']:.0%} of queries, {entry['mean_seconds']:.2f}s avg"
+            )
+
+
+render_trace_panel()
@@ -0,0 +1,357 @@
+# ai-agent-multitool/server.py
+"""
+Headless HTTP API for the agents, next to the Streamlit app.
+
+Each client creates a session, which keeps its conversation memories, PDF
+corpus and CSV frame server-side, then calls the JSON endpoints:
+
+    POST   /sessions                           {"api_key"?} -> {"session_id"}
+    DELETE /sessions/{id}
+    POST   /sessions/{id}/chat                 {"message"} -> {"reply"}
+    POST   /sessions/{id}/pdfs                 PDF body or multipart "file" -> {"doc_id", "chunks"}
+    DELETE /sessions/{id}/pdfs/{doc_id}
+    POST   /sessions/{id}/pdf/query            {"question", "doc_ids"?} -> {"answer", "sources"}
+    POST   /sessions/{id}/csv                  CSV body or multipart "file" -> {"rows", "columns"}
+    POST   /sessions/{id}/csv/query            {"query"} -> CsvAgent output, plus "chart_data" for a chart
+    POST   /sessions/{id}/route                {"query"} -> {"tool", "output", "cached"[, "fanout"]}
+    GET    /health, GET /stats
+
+The agents are synchronous, so requests run in two thread pools: ingestion
+(PDF parsing and indexing, CSV parsing) in a pool sized to the CPUs, and
+queries, which mostly wait on the OpenAI API, in a larger one where those
+calls overlap. Each pool sits behind an admission controller; requests that
+cannot get a slot in time are answered 503 with Retry-After.
+
+Usage:
+    OPENAI_API_KEY=sk-... python server.py [--host 127.0.0.1] [--port 8080]
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+from aiohttp import web
+from pyarrow import ArrowInvalid
+
+from agents.chat_agent import ChatAgent
+from agents.csv_agent import CsvAgent
+from agents.pdf_agent import PdfAgent
+from agents.router_agent import RouterAgent, wait_for_late_branches
+from utils.cache_utils import fingerprint_bytes
+from utils.chart_utils import chart_payload
+from utils.chat_utils import init_memory
+from utils.csv_utils import load_csv
+from utils.server_utils import (
+    DEFAULT_MAX_INGESTS,
+    DEFAULT_MAX_QUERIES,
+    AdmissionController,
+    NamedUpload,
+    Overloaded,
+    Session,
+    SessionStore,
+)
+
+MAX_UPLOAD_BYTES = int(os.environ.get("AGENT_API_MAX_UPLOAD_MB", "200")) * 2 ** 20
+
+_dumps = functools.partial(json.dumps, default=str)
+
+
+def json_response(payload: Any, status: int = 200, **kwargs) -> web.Response:
+    # Agent outputs may hold numpy scalars or timestamps
+    return web.json_response(payload, status=status, dumps=_dumps, **kwargs)
+
+
+def error(status: int, message: str, **kwargs) -> web.Response:
+    return json_response({"error": message}, status=status, **kwargs)
+
+
+@web.middleware
+async def error_middleware(request: web.Request, handler) -> web.StreamResponse:
+    try:
+        return await handler(request)
+    except Overloaded as exc:
+        return error(503, str(exc), headers={"Retry-After": str(int(exc.retry_after))})
+    except ValueError as exc:
+        # Agents raise ValueError for calls made in the wrong state
+        return error(409, str(exc))
+
+
+async def read_json(request: web.Request, *required: str) -> Dict[str, Any]:
+    try:
+        body = await request.json() if request.can_read_body else {}
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text=_dumps({"error": "Body is not valid JSON."}), content_type="application/json")
+    missing = [name for name in required if not body.get(name)]
+    if missing:
+        raise web.HTTPBadRequest(text=_dumps({"error": f"Missing fields: {', '.join(missing)}."}),
+                                 content_type="application/json")
+    return body
+
+
+async def read_upload(request: web.Request, default_name: str) -> NamedUpload:
+    """Read an upload sent as the raw body (name in ?name=) or as multipart field "file"."""
+    if request.content_type.startswith("multipart/"):
+        reader = await request.multipart()
+        async for part in reader:
+            if part.name == "file":
+                return NamedUpload(await part.read(), part.filename or default_name)
+        raise web.HTTPBadRequest(text=_dumps({"error": "Multipart body has no 'file' field."}),
+                                 content_type="application/json")
+    content = await request.read()
+    if not content:
+        raise web.HTTPBadRequest(text=_dumps({"error": "Empty upload."}), content_type="application/json")
+    return NamedUpload(content, request.query.get("name", default_name))
+
+
+class AgentService:
+    """Session store, worker pools and admission control behind the HTTP handlers."""
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        query_workers: int = DEFAULT_MAX_QUERIES,
+        ingest_workers: int = DEFAULT_MAX_INGESTS
+    ):
+        """
+        Initialize the service.
+
+        Args:
+            api_key (str, optional): OpenAI API key for sessions that do not bring their own.
+            query_workers (int): Queries (LLM-bound) running at once.
+            ingest_workers (int): Uploads (CPU-bound parsing and indexing) running at once.
+        """
+        self.api_key = api_key
+        self.sessions = SessionStore()
+        self.query_pool = ThreadPoolExecutor(max_workers=query_workers, thread_name_prefix="agent-query")
+        self.ingest_pool = ThreadPoolExecutor(max_workers=ingest_workers, thread_name_prefix="agent-ingest")
+        self.query_admission = AdmissionController(query_workers)
+        self.ingest_admission = AdmissionController(ingest_workers)
+
+    def close(self) -> None:
+        self.query_pool.shutdown(wait=False, cancel_futures=True)
+        self.ingest_pool.shutdown(wait=False, cancel_futures=True)
+
+    def session(self, request: web.Request) -> Session:
+        session = self.sessions.get(request.match_info["session_id"])
+        if session is None:
+            raise web.HTTPNotFound(text=_dumps({"error": "Unknown or expired session."}),
+                                   content_type="application/json")
+        return session
+
+    async def run(self, session: Session, ingest: bool, fn: Callable, *args) -> Any:
+        """Run `fn(*args)` for a session in the matching pool, one request per session at a time."""
+        admission, pool = (self.ingest_admission, self.ingest_pool) if ingest else (self.query_admission, self.query_pool)
+        async with session.lock:
+            async with admission.admit():
+                return await asyncio.get_running_loop().run_in_executor(pool, functools.partial(settled_call, session, fn, *args))
+
+
+def settled_call(session: Session, fn: Callable, *args) -> Any:
+    # A routed fan-out can leave a branch running on the session's agents after its request returned
+    wait_for_late_branches(*(session.state.get(key) for key in ("chat_agent", "pdf_agent", "csv_agent")))
+    return fn(*args)
+
+
+def chat_agent(session: Session) -> ChatAgent:
+    agent = session.state.get("chat_agent")
+    if agent is None:
+        agent = session.state["chat_agent"] = ChatAgent(session.api_key, init_memory())
+    return agent
+
+
+def pdf_agent(session: Session) -> PdfAgent:
+    agent = session.state.get("pdf_agent")
+    if agent is None:
+        memory = init_memory(memory_key="chat_history", output_key="answer")
+        agent = session.state["pdf_agent"] = PdfAgent(session.api_key, memory)
+    return agent
+
+
+def add_session_pdf(session: Session, upload: NamedUpload) -> Dict[str, Any]:
+    agent = pdf_agent(session)
+    doc_id = agent.add_pdf(upload)
+    return {"doc_id": doc_id, "source": upload.name, "chunks": len(agent.documents[doc_id].chunk_ids)}
+
+
+def load_session_csv(session: Session, upload: NamedUpload) -> Tuple[int, list]:
+    fingerprint = fingerprint_bytes(upload.getvalue())
+    try:
+        df = load_csv(upload, fingerprint=fingerprint)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError, ArrowInvalid) as exc:
+        # ValueErrors too, but a bad upload rather than a call in the wrong state
+        raise web.HTTPBadRequest(text=_dumps({"error": f"Could not parse the CSV: {exc}"}),
+                                 content_type="application/json")
+    session.state.update(csv_df=df, csv_fingerprint=fingerprint, csv_agent=CsvAgent(session.api_key, df))
+    return len(df), [str(c) for c in df.columns]
+
+
+def query_pdf(session: Session, question: str, doc_ids: Optional[list]) -> Dict[str, Any]:
+    agent = pdf_agent(session)
+    if not agent.documents:
+        raise ValueError("Upload a PDF before querying it.")
+    agent.select_documents(doc_ids)
+    if agent.fingerprint is None:
+        raise ValueError("None of the given doc_ids is in the session's corpus.")
+    result = agent.run(question)
+    return {"answer": result["answer"], "sources": result["sources"]}
+
+
+def with_chart_data(session: Session, output: Any) -> Any:
+    """Add the computed series of a chart spec, so clients need not hold the dataset."""
+    if not isinstance(output, dict) or "chart" not in output:
+        return output
+    try:
+        # Copy: the output may be the answer cache's own object
+        return {**output, "chart_data": chart_payload(session.state["csv_df"], output["chart"])}
+    except (KeyError, TypeError, ValueError) as exc:
+        return {**output, "chart_error": str(exc)}
+
+
+def query_csv(session: Session, query: str) -> Any:
+    return with_chart_data(session, session.state["csv_agent"].run(query))
+
+
+def route_query(session: Session, query: str) -> Dict[str, Any]:
+    router = session.state.get("router")
+    if router is None:
+        router = session.state["router"] = RouterAgent(chat_agent=None, pdf_agent=None, csv_agent=None)
+    agent = session.state.get("pdf_agent")
+    has_pdf = agent is not None and agent.fingerprint is not None
+    router.chat_agent = chat_agent(session)
+    router.pdf_agent = agent if has_pdf else None
+    router.csv_agent = session.state.get("csv_agent")
+    if has_pdf:
+        agent.select_documents(None)
+    resources = {
+        "has_pdf": has_pdf,
+        "pdf_loaded": has_pdf,
+        "has_csv": router.csv_agent is not None,
+        "csv_df": session.state.get("csv_df"),
+        "csv_fingerprint": session.state.get("csv_fingerprint"),
+    }
+    result = router.route(query, resources)
+    output = result["output"]
+    if result["tool"] == "pdf":
+        # Chat history holds message objects; clients keep their own transcript
+        output = {"answer": output["answer"], "sources": output.get("sources", [])}
+    elif result["tool"] == "csv":
+        output = with_chart_data(session, output)
+    response = {"tool": result["tool"], "output": output, "cached": bool(result.get("cached"))}
+    if "fanout" in result:
+        # Which tools ran concurrently for an ambiguous query, and how each fared
+        response["fanout"] = result["fanout"]
+    return response
+
+
+def create_app(service: Optional[AgentService] = None) -> web.Application:
+    """
+    Build the aiohttp application.
+
+    Args:
+        service (AgentService, optional): Service to serve; defaults to one
+            using OPENAI_API_KEY and the AGENT_API_* settings.
+
+    Returns:
+        web.Application: The application, ready for `web.run_app` or an AppRunner.
+    """
+    service = service or AgentService(api_key=os.environ.get("OPENAI_API_KEY"))
+    routes = web.RouteTableDef()
+
+    @routes.get("/health")
+    async def health(request: web.Request) -> web.Response:
+        return json_response({"status": "ok"})
+
+    @routes.get("/stats")
+    async def stats(request: web.Request) -> web.Response:
+        return json_response({
+            "sessions": len(service.sessions),
+            "query": service.query_admission.stats(),
+            "ingest": service.ingest_admission.stats(),
+        })
+
+    @routes.post("/sessions")
+    async def create_session(request: web.Request) -> web.Response:
+        body = await read_json(request)
+        api_key = body.get("api_key") or request.headers.get("X-OpenAI-Key") or service.api_key
+        if not api_key:
+            return error(400, "No OpenAI API key: send one or start the server with OPENAI_API_KEY.")
+        return json_response({"session_id": service.sessions.create(api_key).session_id}, status=201)
+
+    @routes.delete("/sessions/{session_id}")
+    async def delete_session(request: web.Request) -> web.Response:
+        if not service.sessions.delete(request.match_info["session_id"]):
+            return error(404, "Unknown or expired session.")
+        return web.Response(status=204)
+
+    @routes.post("/sessions/{session_id}/chat")
+    async def chat(request: web.Request) -> web.Response:
+        session = service.session(request)
+        body = await read_json(request, "message")
+        reply = await service.run(session, False, lambda: chat_agent(session).run(body["message"]))
+        return json_response({"reply": reply})
+
+    @routes.post("/sessions/{session_id}/pdfs")
+    async def add_pdf(request: web.Request) -> web.Response:
+        session = service.session(request)
+        upload = await read_upload(request, "document.pdf")
+        return json_response(await service.run(session, True, add_session_pdf, session, upload), status=201)
+
+    @routes.delete("/sessions/{session_id}/pdfs/{doc_id}")
+    async def remove_pdf(request: web.Request) -> web.Response:
+        session = service.session(request)
+        doc_id = request.match_info["doc_id"]
+        if doc_id not in pdf_agent(session).documents:
+            return error(404, "Unknown document.")
+        await service.run(session, True, pdf_agent(session).remove_pdf, doc_id)
+        return web.Response(status=204)
+
+    @routes.post("/sessions/{session_id}/pdf/query")
+    async def pdf_query(request: web.Request) -> web.Response:
+        session = service.session(request)
+        body = await read_json(request, "question")
+        return json_response(await service.run(session, False, query_pdf, session, body["question"], body.get("doc_ids")))
+
+    @routes.post("/sessions/{session_id}/csv")
+    async def add_csv(request: web.Request) -> web.Response:
+        session = service.session(request)
+        upload = await read_upload(request, "data.csv")
+        rows, columns = await service.run(session, True, load_session_csv, session, upload)
+        return json_response({"rows": rows, "columns": columns}, status=201)
+
+    @routes.post("/sessions/{session_id}/csv/query")
+    async def csv_query(request: web.Request) -> web.Response:
+        session = service.session(request)
+        body = await read_json(request, "query")
+        if session.state.get("csv_agent") is None:
+            return error(409, "Upload a CSV before querying it.")
+        return json_response(await service.run(session, False, query_csv, session, body["query"]))
+
+    @routes.post("/sessions/{session_id}/route")
+    async def route(request: web.Request) -> web.Response:
+        session = service.session(request)
+        body = await read_json(request, "query")
+        return json_response(await service.run(session, False, route_query, session, body["query"]))
+
+    async def shutdown(app: web.Application) -> None:
+        service.close()
+
+    app = web.Application(middlewares=[error_middleware], client_max_size=MAX_UPLOAD_BYTES)
+    app.add_routes(routes)
+    app.on_cleanup.append(shutdown)
+    app["service"] = service
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.environ.get("AGENT_API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("AGENT_API_PORT", "8080")))
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# tests/test_answer_cache.py
+"""A negated question is never a near-duplicate of the question it negates."""
+import pytest
+
+from agents.router_agent import _features
+from utils.cache_utils import AnswerCache, _cosine
+
+QUESTION = (
+    "what does the warranty section of the installation manual say about replacing "
+    "the heating element after the first year of ownership"
+)
+
+
+@pytest.mark.parametrize("negated", [
+    QUESTION.replace("say about replacing", "say about not replacing"),
+    QUESTION.replace("what does the", "what doesn't the"),
+    QUESTION.replace("say about replacing", "say about never replacing"),
+])
+def test_negation_blocks_near_duplicate_hit(negated):
+    # Worded closely enough that only the salient terms tell them apart
+    assert _cosine(_features(QUESTION), _features(negated)) >= 0.9
+    cache = AnswerCache()
+    cache.put("pdf", "doc", QUESTION, "Replace it yourself.", _features(QUESTION))
+    assert cache.get("pdf", "doc", negated, _features(negated)) is None
+
+
+def test_rewording_still_hits():
+    reworded = QUESTION.replace("what does", "so what does")
+    cache = AnswerCache()
+    cache.put("pdf", "doc", QUESTION, "Replace it yourself.", _features(QUESTION))
+    assert cache.get("pdf", "doc", reworded, _features(reworded)) == "Replace it yourself."
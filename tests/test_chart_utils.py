@@ -0,0 +1,36 @@
+# tests/test_chart_utils.py
+"""Charts of large datasets stay within the point budget, whatever the x column holds."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.chart_utils import compute_chart
+
+ROWS = 5000
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "sku": [f"sku-{i:05d}" for i in range(ROWS)],
+        "units": rng.random(ROWS),
+        "price": rng.normal(size=ROWS),
+        "margin": rng.normal(size=ROWS),
+        "region": rng.choice(["north", "south", "east", "west"], ROWS),
+    })
+
+
+@pytest.mark.filterwarnings("ignore:Could not infer format")
+def test_line_over_text_categories_is_downsampled(df):
+    chart = compute_chart(df, {"type": "line", "x": "sku", "y": "units"}, max_points=500)
+    assert chart["downsampled"]
+    assert len(chart["data"]) <= 500
+
+
+@pytest.mark.parametrize("color", [None, "region"])
+def test_binned_scatter_stays_within_max_points(df, color):
+    chart = compute_chart(df, {"type": "scatter", "x": "price", "y": "margin", "color": color}, max_points=1000)
+    assert chart["size"] == "count"
+    assert len(chart["data"]) <= 1000
+    assert chart["data"]["count"].sum() == ROWS
@@ -0,0 +1,64 @@
+# tests/test_csv_local.py
+"""
+The local CSV planner answers only questions it can answer exactly: every
+column and value the question names must be part of the plan, otherwise
+the question goes to the agent (None) rather than getting a broader answer.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.csv_utils import answer_locally, optimize_dtypes
+
+ROWS = 200
+
+
+@pytest.fixture(params=["object", "category"])
+def df(request):
+    rng = np.random.default_rng(1)
+    frame = pd.DataFrame({
+        "product": rng.choice(list("ABCDE"), ROWS),
+        "region": rng.choice(["North", "South", "East", "West"], ROWS),
+        "price": np.round(rng.uniform(5, 100, ROWS), 2),
+        "quantity": rng.integers(1, 10, ROWS),
+    })
+    return optimize_dtypes(frame) if request.param == "category" else frame
+
+
+def answered_number(result) -> float:
+    return float(result["answer"].rsplit(" is ", 1)[1].rstrip(".").replace(",", ""))
+
+
+@pytest.mark.parametrize("query, rows, how", [
+    ("average price for region West", lambda df: df["region"] == "West", "mean"),
+    ("median price in the East region", lambda df: df["region"] == "East", "median"),
+    ("sum of price for product B", lambda df: df["product"] == "B", "sum"),
+    ("average price where region is West", lambda df: df["region"] == "West", "mean"),
+    ("total price where quantity > 5 and region = West", lambda df: (df["quantity"] > 5) & (df["region"] == "West"), "sum"),
+])
+def test_filters_are_applied(df, query, rows, how):
+    expected = df.loc[rows(df), "price"].agg(how)
+    assert answered_number(answer_locally(df, query)) == pytest.approx(expected, rel=1e-3)
+
+
+def test_filter_and_group_by(df):
+    result = answer_locally(df, "sum of price by region for product A")
+    expected = df[df["product"] == "A"].groupby("region", observed=True)["price"].sum()
+    assert dict(zip(result["bar"]["columns"], result["bar"]["data"])) == pytest.approx(expected.to_dict())
+
+
+@pytest.mark.parametrize("query", [
+    "average price excluding region East",
+    "average price of the 10 most expensive rows",
+    "average price where quantity > 5 or region = West",
+    "average price where region = Atlantis",
+    "average price and quantity",
+])
+def test_unsupported_qualifiers_go_to_the_agent(df, query):
+    assert answer_locally(df, query) is None
+
+
+def test_plain_questions_stay_local(df):
+    assert answer_locally(df, "how many rows are there?") == {"answer": f"The dataset has {ROWS:,} rows."}
+    assert answered_number(answer_locally(df, "average price")) == pytest.approx(df["price"].mean(), rel=1e-3)
+    assert answer_locally(df, "which region is the best performer") is None
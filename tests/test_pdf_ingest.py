@@ -0,0 +1,41 @@
+# tests/test_pdf_ingest.py
+"""
+Concurrent PDF ingestions must each index their own document. PDFs used to
+be written to a shared temp.pdf, so parallel uploads could read each other's
+file. Runs offline with the local hashed embeddings.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from helpers import NamedBytes, make_pdf
+from utils.pdf_utils import load_pdf_to_vectorstore
+
+MARKERS = ["alphamarker", "betamarker"]
+
+
+def marked_pdf(marker: str, pages: int = 3) -> bytes:
+    return make_pdf([f"Page {page} of the {marker} document. " + f"{marker} " * 40 for page in range(pages)])
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_concurrent_ingestions_index_their_own_pdf(tmp_path, pipelined):
+    # Two uploads of each PDF, as separate file objects like separate sessions
+    uploads = [NamedBytes(marked_pdf(marker), f"{marker}.pdf") for marker in MARKERS * 2]
+
+    def ingest(upload):
+        return load_pdf_to_vectorstore(
+            upload, "sk-test", embedding_model="hashed:256", cache_dir=str(tmp_path), pipelined=pipelined
+        )
+
+    with ThreadPoolExecutor(max_workers=len(uploads)) as pool:
+        stores = list(pool.map(ingest, uploads))
+
+    for upload, store in zip(uploads, stores):
+        own = upload.name[:-len(".pdf")]
+        docs = list(store.docstore._dict.values())
+        assert docs
+        for doc in docs:
+            assert own in doc.page_content
+            assert not any(other in doc.page_content for other in MARKERS if other != own)
+            assert doc.metadata["source"] == upload.name
@@ -0,0 +1,51 @@
+# tests/test_router_fanout.py
+"""
+A fan-out branch that misses the deadline keeps running on the session's
+agent. The next turn must not use that agent (or its memory) until the late
+branch finished and its discarded exchange was removed from the history.
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+from agents.router_agent import RouterAgent
+
+
+class FakeAgent:
+    """Answers after `delay` seconds and saves the exchange, like the real agents."""
+    def __init__(self, answer: str, delay: float = 0.0):
+        self.answer = answer
+        self.delay = delay
+        self.memory = SimpleNamespace(chat_memory=SimpleNamespace(messages=[]))
+        self.running = threading.Lock()
+        self.overlapped = False
+
+    def run(self, question: str) -> dict:
+        if not self.running.acquire(blocking=False):
+            self.overlapped = True
+            self.running.acquire()
+        try:
+            time.sleep(self.delay)
+            self.memory.chat_memory.messages += [
+                SimpleNamespace(content=question), SimpleNamespace(content=self.answer)
+            ]
+            return {"answer": self.answer, "sources": ["p. 1"]}
+        finally:
+            self.running.release()
+
+
+def test_next_turn_waits_for_late_branch():
+    pdf = FakeAgent("From the document.", delay=0.5)
+    csv = FakeAgent("From the data.")
+    # Every pdf or csv pick fans out; the pdf branch always misses the deadline
+    router = RouterAgent(None, pdf, csv, answer_cache=None, fanout_confidence=1.1, fanout_deadline=0.1)
+    resources = {"has_pdf": True, "pdf_loaded": True, "has_csv": True, "csv_df": object()}
+
+    first = router.route("what does the report say about revenue", resources)
+    assert first["fanout"]["late"] == ["pdf"]
+    assert first["output"]["answer"] == "From the data."
+
+    router.route("and what about costs", resources)
+    assert not pdf.overlapped
+    questions = [message.content for message in pdf.memory.chat_memory.messages[::2]]
+    assert "what does the report say about revenue" not in questions
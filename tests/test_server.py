@@ -0,0 +1,37 @@
+# tests/test_server.py
+"""
+HTTP status codes of the API: a malformed CSV upload is the client's error
+(400), a query in the wrong session state is a conflict (409).
+"""
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from server import create_app
+
+MALFORMED_CSVS = [
+    b"a,b\n1,2\n3,4,5,6\n",
+    b"\xff\xfe\xfa,\x00\x81\n\x9f",
+    b'"a,b\n1,2',
+]
+
+
+async def post_statuses(requests: list) -> list:
+    statuses = []
+    async with TestClient(TestServer(create_app())) as client:
+        response = await client.post("/sessions", json={"api_key": "sk-test"})
+        session_id = (await response.json())["session_id"]
+        for path, kwargs in requests:
+            response = await client.post(f"/sessions/{session_id}{path}", **kwargs)
+            statuses.append(response.status)
+    return statuses
+
+
+@pytest.mark.parametrize("content", MALFORMED_CSVS)
+def test_malformed_csv_is_a_bad_request(content):
+    assert asyncio.run(post_statuses([("/csv?name=bad.csv", {"data": content})])) == [400]
+
+
+def test_query_before_upload_is_a_conflict():
+    assert asyncio.run(post_statuses([("/pdf/query", {"json": {"question": "what is this about"}})])) == [409]
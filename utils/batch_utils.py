@@ -0,0 +1,198 @@
+# utils/batch_utils.py
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from tenacity import RetryCallState, Retrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+# Rough request-body bytes per prompt token, for the tokens-per-minute budget
+BYTES_PER_TOKEN = 4
+DEFAULT_MAX_ATTEMPTS = 6
+# Latency histogram bucket edges in milliseconds (powers of two)
+HISTOGRAM_EDGES_MS = [2 ** i for i in range(4, 17)]
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second refill a bucket of
+    `capacity`, and `acquire` blocks until enough tokens are available.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Initialize a full bucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float, optional): Burst size; defaults to one second of tokens.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """
+        Take `amount` tokens, waiting for them if needed. Amounts above the
+        capacity are capped so a single large request cannot block forever.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = max(self._paused_until - now, (amount - self._tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller for `seconds`, e.g. after the server answered 429, and drain the bucket."""
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = self._paused_until
+
+
+class RateLimiter:
+    """
+    Client-side view of the OpenAI rate limits: requests-per-minute and
+    tokens-per-minute buckets that every upstream request passes through (see
+    `utils.client_utils.set_request_limiter`), paused whenever the server
+    answers 429 anyway.
+    """
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        """
+        Initialize the limiter.
+
+        Args:
+            requests_per_minute (float, optional): Upstream requests allowed per minute.
+            tokens_per_minute (float, optional): Prompt tokens allowed per minute,
+                estimated from the request body size.
+        """
+        self.requests = TokenBucket(requests_per_minute / 60.0) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute / 60.0) if tokens_per_minute else None
+        self.waited = 0.0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, request: Any = None) -> None:
+        """Block until `request` (an httpx.Request, or None) fits both budgets."""
+        waited = self.requests.acquire() if self.requests is not None else 0.0
+        if self.tokens is not None and request is not None:
+            size = len(request.content or b"") if hasattr(request, "content") else 0
+            waited += self.tokens.acquire(max(1.0, size / BYTES_PER_TOKEN))
+        if waited:
+            with self._lock:
+                self.waited += waited
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller for `seconds`."""
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.pause(seconds)
+
+    def observe(self, response: Any) -> None:
+        """Back off every caller after a 429, for as long as the server asked."""
+        if response.status_code == 429:
+            with self._lock:
+                self.rate_limited += 1
+            self.pause(retry_after(response) or 1.0)
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """Return True for HTTP 429 errors from the OpenAI SDK or httpx."""
+    return getattr(exc, "status_code", None) == 429 or getattr(getattr(exc, "response", None), "status_code", None) == 429
+
+
+def retry_after(error: Any) -> Optional[float]:
+    """Seconds the server asked us to wait, from Retry-After-Ms or Retry-After of an error or response, if any."""
+    response = getattr(error, "response", error)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def call_with_retry(
+    fn: Callable[[], Any],
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    on_retry: Optional[Callable[[BaseException], None]] = None
+) -> Any:
+    """
+    Call `fn`, retrying on 429 with exponential backoff and jitter, waiting
+    at least as long as the server's Retry-After. This sits on top of the
+    OpenAI SDK's own short retries, for 429s that outlast them.
+
+    Args:
+        fn (Callable): Zero-argument callable to run.
+        max_attempts (int): Attempts before the last error is raised.
+        on_retry (Callable, optional): Called with the error before each retry.
+
+    Returns:
+        The return value of `fn`.
+    """
+    backoff = wait_exponential_jitter(initial=1, max=60)
+
+    def wait(state: RetryCallState) -> float:
+        return max(retry_after(state.outcome.exception()) or 0.0, backoff(state))
+
+    def before_sleep(state: RetryCallState) -> None:
+        if on_retry is not None:
+            on_retry(state.outcome.exception())
+
+    retrying = Retrying(
+        stop=stop_after_attempt(max_attempts),
+        wait=wait,
+        retry=retry_if_exception(is_rate_limited),
+        before_sleep=before_sleep,
+        reraise=True
+    )
+    return retrying(fn)
+
+
+def latency_histogram(latencies_ms: List[float]) -> List[Dict[str, Any]]:
+    """
+    Bucket latencies into power-of-two millisecond bins.
+
+    Args:
+        latencies_ms (list[float]): Latencies in milliseconds.
+
+    Returns:
+        list[dict]: {"le_ms", "count"} per bin up to the slowest latency; the
+            last bin has le_ms None for anything above the largest edge.
+    """
+    counts = [0] * (len(HISTOGRAM_EDGES_MS) + 1)
+    for value in latencies_ms:
+        index = next((i for i, edge in enumerate(HISTOGRAM_EDGES_MS) if value <= edge), len(HISTOGRAM_EDGES_MS))
+        counts[index] += 1
+    last = max((i for i, count in enumerate(counts) if count), default=-1)
+    first = min((i for i, count in enumerate(counts) if count), default=0)
+    edges = HISTOGRAM_EDGES_MS + [None]
+    return [{"le_ms": edges[i], "count": counts[i]} for i in range(first, last + 1)]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of `values` (q in [0, 1]); NaN when empty."""
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
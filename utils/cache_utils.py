@@ -0,0 +1,549 @@
+# utils/cache_utils.py
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from utils.trace_utils import record, record_tokens
+
+DEFAULT_CACHE_DIR = os.environ.get("AGENT_CACHE_DIR", ".cache")
+DEFAULT_INDEX_CACHE_BYTES = 2 * 1024 ** 3
+DEFAULT_CHUNK_CACHE_BYTES = 1024 ** 3
+DEFAULT_ANSWER_TTL = float(os.environ.get("AGENT_ANSWER_TTL", 3600))
+DEFAULT_ANSWER_ENTRIES = 1024
+# Cosine similarity above which a differently worded query reuses an answer
+DEFAULT_NEAR_DUPLICATE_THRESHOLD = 0.9
+# Written next to each saved index: the embedding model string that built it
+EMBEDDING_MODEL_FILE = "embedding_model.txt"
+
+# Process-wide hit/miss counters, shared by every cache instance
+CACHE_STATS: Dict[str, int] = {
+    "index_hits": 0,
+    "index_misses": 0,
+    "chunk_hits": 0,
+    "chunk_misses": 0,
+    "evictions": 0,
+    "answer_hits": 0,
+    "answer_near_hits": 0,
+    "answer_misses": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _bump(name: str, amount: int = 1) -> None:
+    with _stats_lock:
+        CACHE_STATS[name] += amount
+
+
+def get_cache_stats() -> Dict[str, int]:
+    """
+    Return a snapshot of the cache hit/miss counters.
+
+    Returns:
+        dict: Counter name -> value.
+    """
+    with _stats_lock:
+        return dict(CACHE_STATS)
+
+
+def read_upload_bytes(uploaded_file) -> bytes:
+    """
+    Read the full content of an uploaded file without consuming its stream position.
+
+    Args:
+        uploaded_file: Streamlit UploadedFile, BytesIO or any binary file object.
+
+    Returns:
+        bytes: The file content.
+    """
+    if isinstance(uploaded_file, (bytes, bytearray, memoryview)):
+        return bytes(uploaded_file)
+    if hasattr(uploaded_file, "getvalue"):
+        return uploaded_file.getvalue()
+    uploaded_file.seek(0)
+    content = uploaded_file.read()
+    uploaded_file.seek(0)
+    return content
+
+
+def fingerprint_bytes(data: bytes) -> str:
+    """
+    Compute a content hash used as the identity of an uploaded document.
+
+    Args:
+        data (bytes): Raw file content.
+
+    Returns:
+        str: Hex-encoded SHA-256 digest.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def index_cache_key(
+    content_hash: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    embedding_model: str,
+    index_type: str = "flat"
+) -> str:
+    """
+    Build the cache key of a FAISS index from everything that affects its content.
+
+    Args:
+        content_hash (str): Fingerprint of the source PDF.
+        chunk_size (int): Splitter chunk size.
+        chunk_overlap (int): Splitter chunk overlap.
+        embedding_model (str): Name of the embedding model that produced the vectors.
+        index_type (str): FAISS index type setting ("auto" or a concrete type).
+
+    Returns:
+        str: Hex-encoded key, safe to use as a directory name.
+    """
+    raw = f"{content_hash}:{chunk_size}:{chunk_overlap}:{embedding_model}:{index_type}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ChunkEmbeddingCache:
+    """
+    SQLite-backed store of chunk vectors keyed by the hash of (model, chunk text).
+    Least recently used rows are evicted once the store exceeds its byte budget.
+    """
+    def __init__(self, path: str, max_bytes: int = DEFAULT_CHUNK_CACHE_BYTES):
+        """
+        Initialize the chunk cache.
+
+        Args:
+            path (str): Path of the SQLite database file.
+            max_bytes (int): Upper bound on the total size of stored vectors.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON vectors(last_used)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up vectors for the given keys and refresh their recency.
+
+        Args:
+            keys (List[str]): Chunk keys from `make_key`.
+
+        Returns:
+            dict: Key -> vector for every key found in the store.
+        """
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+        now = time.time()
+        with self._connect() as conn:
+            # SQLite limits the number of bound parameters, so query in slices
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({marks})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                conn.executemany(
+                    "UPDATE vectors SET last_used = ? WHERE key = ?",
+                    [(now, key) for key, _ in rows],
+                )
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """
+        Store vectors and evict old rows if the byte budget is exceeded.
+
+        Args:
+            items (dict): Key -> vector.
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, vector, size, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete least recently used rows until the store fits in `max_bytes`."""
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM vectors").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            evicted = 0
+            cursor = conn.execute("SELECT key, size FROM vectors ORDER BY last_used ASC")
+            stale = []
+            for key, size in cursor:
+                if total <= self.max_bytes:
+                    break
+                stale.append((key,))
+                total -= size
+                evicted += 1
+            conn.executemany("DELETE FROM vectors WHERE key = ?", stale)
+        _bump("evictions", evicted)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves document vectors from a ChunkEmbeddingCache
+    and only sends new or changed chunks to the underlying embedding model.
+    """
+    def __init__(self, underlying: Embeddings, model_name: str, store: ChunkEmbeddingCache):
+        """
+        Initialize the wrapper.
+
+        Args:
+            underlying (Embeddings): The embedding model used on cache misses.
+            model_name (str): Model identifier, part of every chunk key.
+            store (ChunkEmbeddingCache): Persistent chunk vector store.
+        """
+        self.underlying = underlying
+        self.model_name = model_name
+        self.store = store
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [ChunkEmbeddingCache.make_key(self.model_name, text) for text in texts]
+        cached = self.store.get_many(list(set(keys)))
+
+        # Embed each missing text once, even if it appears several times
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        _bump("chunk_hits", len(texts) - len(missing))
+        _bump("chunk_misses", len(missing))
+        record(chunk_cache_hits=len(texts) - len(missing), embedded_chunks=len(missing))
+
+        if missing:
+            record_tokens("embedding_tokens", list(missing.values()))
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.store.put_many(fresh)
+            cached.update(fresh)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        record_tokens("embedding_tokens", [text])
+        return self.underlying.embed_query(text)
+
+
+class IndexCache:
+    """
+    On-disk cache of saved FAISS indexes, one directory per cache key.
+    Directory mtimes track recency; the least recently used indexes are
+    evicted once the cache exceeds its byte budget.
+    """
+    def __init__(self, root: str, max_bytes: int = DEFAULT_INDEX_CACHE_BYTES):
+        """
+        Initialize the index cache.
+
+        Args:
+            root (str): Directory holding one sub-directory per cached index.
+            max_bytes (int): Upper bound on the total size of cached indexes.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def load(self, key: str, embeddings: Embeddings, embedding_model: Optional[str] = None) -> Optional[FAISS]:
+        """
+        Load a cached index.
+
+        Args:
+            key (str): Key from `index_cache_key`.
+            embeddings (Embeddings): Embedding function attached to the loaded store.
+            embedding_model (str, optional): Model string the index must have
+                been built with; an index recorded as built by another model
+                is a miss.
+
+        Returns:
+            FAISS or None: The cached vector store, or None on a miss.
+        """
+        path = self._path(key)
+        if not os.path.isfile(os.path.join(path, "index.faiss")):
+            _bump("index_misses")
+            return None
+        built_with = self.embedding_model(key)
+        if embedding_model is not None and built_with is not None and built_with != embedding_model:
+            _bump("index_misses")
+            return None
+        try:
+            # The pickled docstore was written by this process family, not by users
+            faiss_db = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            _bump("index_misses")
+            return None
+        os.utime(path)
+        _bump("index_hits")
+        return faiss_db
+
+    def embedding_model(self, key: str) -> Optional[str]:
+        """Return the model string recorded with a cached index, or None if it has none."""
+        try:
+            with open(os.path.join(self._path(key), EMBEDDING_MODEL_FILE), encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def save(self, key: str, faiss_db: FAISS, embedding_model: Optional[str] = None) -> None:
+        """
+        Persist an index and evict old entries if needed.
+
+        Args:
+            key (str): Key from `index_cache_key`.
+            faiss_db (FAISS): The vector store to save.
+            embedding_model (str, optional): Model string that built the
+                vectors, recorded next to the index.
+        """
+        path = self._path(key)
+        # Write to a private directory first so readers never see a partial index
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        faiss_db.save_local(tmp_path)
+        if embedding_model is not None:
+            with open(os.path.join(tmp_path, EMBEDDING_MODEL_FILE), "w", encoding="utf-8") as f:
+                f.write(embedding_model)
+        with self._lock:
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete least recently used indexes until the cache fits in `max_bytes`."""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.root):
+                path = self._path(name)
+                if os.path.isdir(path) and not name.endswith(".tmp"):
+                    entries.append((os.path.getmtime(path), _dir_size(path), path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                _bump("evictions")
+
+
+_caches: Dict[str, object] = {}
+_caches_lock = threading.Lock()
+
+
+def get_index_cache(cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_INDEX_CACHE_BYTES) -> IndexCache:
+    """Return the shared IndexCache for `cache_dir`."""
+    with _caches_lock:
+        key = f"index:{cache_dir}"
+        if key not in _caches:
+            _caches[key] = IndexCache(os.path.join(cache_dir, "faiss"), max_bytes=max_bytes)
+        return _caches[key]
+
+
+def get_chunk_cache(cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CHUNK_CACHE_BYTES) -> ChunkEmbeddingCache:
+    """Return the shared ChunkEmbeddingCache for `cache_dir`."""
+    with _caches_lock:
+        key = f"chunks:{cache_dir}"
+        if key not in _caches:
+            _caches[key] = ChunkEmbeddingCache(os.path.join(cache_dir, "chunks.sqlite3"), max_bytes=max_bytes)
+        return _caches[key]
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a user query for exact-match answer lookups: lowercase,
+    collapse whitespace and drop surrounding punctuation.
+
+    Args:
+        query (str): Raw user query.
+
+    Returns:
+        str: Normalized query.
+    """
+    return re.sub(r"\s+", " ", (query or "").lower()).strip(" \t?!.,;:")
+
+
+# Numbers, codes, capitalized names and quoted phrases: terms whose change
+# changes the question ("revenue in 2021" vs "revenue in 2023")
+_SALIENT = re.compile(r"\"[^\"]+\"|'[^']+'|\b\w*\d[\w.\-/]*|\b[A-Z][\w\-]*")
+# "Does it support X" and "does it not support X" are worded almost alike
+_NEGATION = re.compile(r"\b(?:not|no|never|none|nor|without|except)\b|n['’]t\b", re.IGNORECASE)
+
+
+def salient_terms(query: str) -> frozenset:
+    """
+    Return the terms of a query that near-duplicate matching must not ignore:
+    numbers and codes, capitalized words other than the first, quoted
+    phrases and negations ("n't" counts as "not"), lowercased.
+
+    Args:
+        query (str): Raw user query.
+
+    Returns:
+        frozenset[str]: The salient terms.
+    """
+    terms = set()
+    for match in _SALIENT.finditer((query or "").strip()):
+        term = match.group(0)
+        if term == "I" or match.start() == 0 and term[0].isupper() and not any(c.isdigit() for c in term):
+            # Sentence case or the pronoun, not a name
+            continue
+        terms.add(term.strip("\"'").lower())
+    for match in _NEGATION.finditer(query or ""):
+        word = match.group(0).lower()
+        terms.add("not" if word in ("n't", "n’t") else word)
+    return frozenset(terms)
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(feature, 0.0) for feature, weight in a.items())
+
+
+class AnswerCache:
+    """
+    In-memory cache of final answers keyed by (tool, resource fingerprint,
+    normalized query). Besides exact matches, a query whose feature vector is
+    within `threshold` cosine similarity of a cached query under the same
+    tool and resource reuses that answer, provided both have the same
+    `salient_terms`: queries differing in a number, code or name are never
+    near-duplicates. Entries expire after `ttl` seconds and the least
+    recently used entries are evicted beyond `max_entries`.
+    """
+    def __init__(
+        self,
+        ttl: float = DEFAULT_ANSWER_TTL,
+        max_entries: int = DEFAULT_ANSWER_ENTRIES,
+        threshold: float = DEFAULT_NEAR_DUPLICATE_THRESHOLD
+    ):
+        """
+        Initialize the answer cache.
+
+        Args:
+            ttl (float): Seconds an answer stays valid.
+            max_entries (int): Maximum number of cached answers.
+            threshold (float): Minimum cosine similarity for a near-duplicate hit.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        # (tool, resource, normalized query) -> (answer, vector, salient terms, stored_at)
+        self._entries: "OrderedDict[Tuple[str, str, str], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tool: str, resource: str, query: str, vector: Optional[Dict[str, float]] = None):
+        """
+        Look up a cached answer.
+
+        Args:
+            tool (str): Tool that would answer the query.
+            resource (str): Fingerprint of the document or dataset the tool uses.
+            query (str): User query.
+            vector (dict, optional): Sparse, L2-normalized feature vector of the
+                query; enables near-duplicate matching.
+
+        Returns:
+            The cached answer, or None on a miss.
+        """
+        key = (tool, resource, normalize_query(query))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[3] <= self.ttl:
+                self._entries.move_to_end(key)
+                _bump("answer_hits")
+                return entry[0]
+
+            best_key, best_similarity = None, self.threshold
+            if vector:
+                terms = salient_terms(query)
+                for other_key, (_, other_vector, other_terms, stored_at) in self._entries.items():
+                    if other_key[:2] != key[:2] or not other_vector or now - stored_at > self.ttl:
+                        continue
+                    if other_terms != terms:
+                        continue
+                    similarity = _cosine(vector, other_vector)
+                    if similarity >= best_similarity:
+                        best_key, best_similarity = other_key, similarity
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                _bump("answer_near_hits")
+                return self._entries[best_key][0]
+        _bump("answer_misses")
+        return None
+
+    def put(self, tool: str, resource: str, query: str, answer: Any, vector: Optional[Dict[str, float]] = None) -> None:
+        """Store `answer` for the query, evicting expired and least recently used entries."""
+        key = (tool, resource, normalize_query(query))
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (answer, vector, salient_terms(query), now)
+            self._entries.move_to_end(key)
+            expired = [k for k, (_, _, _, stored_at) in self._entries.items() if now - stored_at > self.ttl]
+            for k in expired:
+                del self._entries[k]
+            evicted = len(expired)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            _bump("evictions", evicted)
+
+    def invalidate(self, resource: str) -> None:
+        """Drop every answer computed from the resource with fingerprint `resource`."""
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == resource]:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+# Shared by every Streamlit session: identical documents answer identical questions
+ANSWER_CACHE = AnswerCache()
@@ -0,0 +1,273 @@
+# utils/chart_utils.py
+import json
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Points sent to the browser per series; longer series are downsampled
+DEFAULT_MAX_POINTS = int(os.environ.get("AGENT_CHART_MAX_POINTS", "1000"))
+# Grid cells per axis when a scatter is binned, fewer when the grid would
+# exceed the point budget
+DEFAULT_SCATTER_BINS = 80
+# Categories shown by a bar chart, largest first
+DEFAULT_BAR_LIMIT = 50
+
+CHART_TYPES = ("bar", "line", "scatter")
+AGGREGATIONS = ("sum", "mean", "count", "min", "max", "median")
+# Line chart periods, as pandas period codes
+FREQUENCIES = {"day": "D", "week": "W", "month": "M", "quarter": "Q", "year": "Y"}
+_OPERATORS = {"==": "eq", "!=": "ne", ">": "gt", ">=": "ge", "<": "lt", "<=": "le"}
+
+
+def _as_list(value) -> List[str]:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def validate_chart_spec(df, spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Check a chart spec against a DataFrame and fill in defaults.
+
+    Args:
+        df (pandas.DataFrame): The dataset the chart is drawn from.
+        spec (dict): {"type", "x", "y", "agg", "filters", "bins", "freq",
+            "color", "limit"}, see PROMPT_TEMPLATE in `utils.csv_utils`.
+
+    Returns:
+        dict: The spec with `y` as a list and defaults for the optional keys.
+
+    Raises:
+        ValueError: Unknown chart type, aggregation or column.
+    """
+    chart_type = spec.get("type")
+    if chart_type not in CHART_TYPES:
+        raise ValueError(f"Unknown chart type {chart_type!r}; expected one of {CHART_TYPES}.")
+    y = _as_list(spec.get("y"))
+    agg = spec.get("agg") or ("count" if not y else "sum" if chart_type == "bar" else "mean")
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation {agg!r}; expected one of {AGGREGATIONS}.")
+    filters = spec.get("filters") or []
+    columns = [spec.get("x"), *y, spec.get("color"), *(f.get("column") for f in filters)]
+    missing = [c for c in columns if c is not None and c not in df.columns]
+    if spec.get("x") is None or missing:
+        raise ValueError(f"Unknown chart column(s): {missing or ['x']}.")
+    if chart_type == "scatter" and len(y) != 1:
+        raise ValueError("A scatter chart needs exactly one y column.")
+    if spec.get("freq") is not None and spec["freq"] not in FREQUENCIES:
+        raise ValueError(f"Unknown frequency {spec['freq']!r}; expected one of {tuple(FREQUENCIES)}.")
+    return {**spec, "type": chart_type, "y": y, "agg": agg, "filters": filters}
+
+
+def apply_filters(df, filters: List[Dict[str, Any]]):
+    """
+    Keep the rows matching every filter.
+
+    Args:
+        df (pandas.DataFrame): The dataset.
+        filters (list[dict]): {"column", "op", "value"} with op one of ==, !=,
+            >, >=, <, <=, in, contains.
+
+    Returns:
+        pandas.DataFrame: The matching rows.
+    """
+    mask = pd.Series(True, index=df.index)
+    for item in filters:
+        series, op, value = df[item["column"]], item.get("op", "=="), item.get("value")
+        if pd.api.types.is_datetime64_any_dtype(series) and op != "in":
+            value = pd.Timestamp(value)
+        if op == "in":
+            mask &= series.isin(_as_list(value))
+        elif op == "contains":
+            mask &= series.astype(str).str.contains(str(value), case=False, regex=False)
+        elif op in _OPERATORS:
+            mask &= getattr(series, _OPERATORS[op])(value)
+        else:
+            raise ValueError(f"Unknown filter operator {op!r}.")
+    return df[mask]
+
+
+def _as_datetime(series):
+    # CSV dates often arrive as strings; use them as dates when nearly all parse
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        parsed = pd.to_datetime(series, errors="coerce")
+        if parsed.notna().mean() > 0.9:
+            return parsed
+    return series
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling of a line.
+
+    Keeps the first and last point and, from each of `threshold - 2` equal
+    buckets in between, the point forming the largest triangle with the point
+    kept from the previous bucket and the mean of the next bucket, which
+    preserves peaks and the visual shape far better than striding.
+
+    Args:
+        x (numpy.ndarray): Sorted x values, as floats.
+        y (numpy.ndarray): y values.
+        threshold (int): Number of points to keep.
+
+    Returns:
+        numpy.ndarray: Indices of the kept points, ascending.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        # Twice the triangle areas, vectorized over the bucket
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas)) if end > start else start
+        kept[bucket + 1] = previous
+    # Very short buckets can pick the same point twice
+    return np.unique(kept)
+
+
+def bin_scatter(frame, x: str, y: str, bins: int = DEFAULT_SCATTER_BINS, color: Optional[str] = None):
+    """
+    Replace a large scatter by one point per occupied grid cell.
+
+    Args:
+        frame (pandas.DataFrame): Points to bin, numeric `x` and `y`.
+        x (str): x column.
+        y (str): y column.
+        bins (int): Grid cells per axis.
+        color (str, optional): Column whose groups are binned separately.
+
+    Returns:
+        pandas.DataFrame: Mean `x` and `y` of each cell with a `count` column,
+            plus `color` when given.
+    """
+    frame = frame.dropna(subset=[x, y])
+    keys = [
+        pd.cut(frame[x], bins, labels=False, include_lowest=True).rename("__x_bin__"),
+        pd.cut(frame[y], bins, labels=False, include_lowest=True).rename("__y_bin__"),
+    ]
+    if color is not None:
+        keys.append(frame[color])
+    grouped = frame.groupby(keys, observed=True)
+    cells = grouped[[x, y]].mean()
+    cells["count"] = grouped.size()
+    cells = cells.reset_index(level=["__x_bin__", "__y_bin__"], drop=True)
+    return cells.reset_index() if color is not None else cells.reset_index(drop=True)
+
+
+def _downsample_line(frame, max_points: int):
+    if len(frame) <= max_points:
+        return frame
+    index = frame.index
+    if isinstance(index, pd.DatetimeIndex):
+        x = index.asi8.astype(float)
+    elif pd.api.types.is_numeric_dtype(index):
+        x = np.asarray(index, dtype=float)
+    else:
+        # Text categories are evenly spaced, in their sorted order
+        x = np.arange(len(index), dtype=float)
+    # Union of each series' LTTB selection keeps one shared x axis
+    kept = set()
+    for column in frame.columns:
+        values = frame[column].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        chosen = lttb(x[valid], values[valid], max(3, max_points // len(frame.columns)))
+        kept.update(np.flatnonzero(valid)[chosen].tolist())
+    return frame.iloc[sorted(kept)]
+
+
+def compute_chart(df, spec: Dict[str, Any], max_points: int = DEFAULT_MAX_POINTS) -> Dict[str, Any]:
+    """
+    Compute the data of a chart spec from the DataFrame with vectorized pandas.
+
+    Bars aggregate `y` per `x` category (or per bin of a numeric `x` when
+    `bins` is set) and keep the `limit` largest. Lines aggregate per `x`
+    value, or per `freq` period of a date `x`, and are downsampled with LTTB
+    to `max_points`. Scatters larger than `max_points` are binned on a grid
+    coarse enough to stay within `max_points` (unless there are more colour
+    groups than that).
+
+    Args:
+        df (pandas.DataFrame): The dataset.
+        spec (dict): Chart spec, see `validate_chart_spec`.
+        max_points (int): Points per series sent to the browser.
+
+    Returns:
+        dict: {"type", "data" (DataFrame to plot), "x", "y", "color", "size",
+            "rows" (rows after filtering), "downsampled" (bool)}.
+    """
+    spec = validate_chart_spec(df, spec)
+    chart_type, x, y, agg, color = spec["type"], spec["x"], spec["y"], spec["agg"], spec.get("color")
+    frame = apply_filters(df, spec["filters"]) if spec["filters"] else df
+    rows = len(frame)
+
+    if chart_type == "scatter":
+        data = frame[[c for c in (x, y[0], color) if c is not None]]
+        size = None
+        if len(data) > max_points:
+            # Every occupied cell is a point, up to bins² per colour group
+            groups = data[color].nunique() if color is not None else 1
+            bins = min(int(spec.get("bins") or DEFAULT_SCATTER_BINS), max(1, math.isqrt(max_points // max(groups, 1))))
+            data, size = bin_scatter(data, x, y[0], bins, color), "count"
+        return {"type": chart_type, "data": data, "x": x, "y": y[0], "color": color, "size": size,
+                "rows": rows, "downsampled": size is not None}
+
+    key = frame[x]
+    if chart_type == "line":
+        key = _as_datetime(key)
+        if spec.get("freq") and pd.api.types.is_datetime64_any_dtype(key):
+            key = key.dt.to_period(FREQUENCIES[spec["freq"]]).dt.start_time
+    elif spec.get("bins") and pd.api.types.is_numeric_dtype(key):
+        key = pd.cut(key, int(spec["bins"]))
+    grouped = frame.groupby(key.rename(x), observed=True, sort=True)
+    data = grouped.size().to_frame("count") if agg == "count" and not y else grouped[y].agg(agg)
+
+    downsampled = False
+    if chart_type == "bar":
+        if not (spec.get("bins") and pd.api.types.is_numeric_dtype(frame[x])):
+            data = data.sort_values(data.columns[0], ascending=False)
+        limit = int(spec.get("limit") or DEFAULT_BAR_LIMIT)
+        downsampled = len(data) > limit
+        data = data.head(limit)
+        data.index = data.index.astype(str)
+    else:
+        downsampled = len(data) > max_points
+        data = _downsample_line(data, max_points)
+    return {"type": chart_type, "data": data, "x": x, "y": list(data.columns), "color": None, "size": None,
+            "rows": rows, "downsampled": downsampled}
+
+
+def chart_payload(df, spec: Dict[str, Any], max_points: int = DEFAULT_MAX_POINTS) -> Dict[str, Any]:
+    """
+    Compute a chart spec into JSON-safe data, for clients that draw it themselves.
+
+    Args:
+        df (pandas.DataFrame): The dataset.
+        spec (dict): Chart spec, see `validate_chart_spec`.
+        max_points (int): Points per series.
+
+    Returns:
+        dict: {"type", "x", "y", "columns", "data" (rows), "downsampled"}.
+    """
+    chart = compute_chart(df, spec, max_points)
+    frame = chart["data"] if chart["type"] == "scatter" else chart["data"].reset_index()
+    payload = json.loads(frame.to_json(orient="split", date_format="iso", index=False))
+    return {
+        "type": chart["type"],
+        "x": chart["x"],
+        "y": chart["y"],
+        "columns": [str(c) for c in payload["columns"]],
+        "data": payload["data"],
+        "downsampled": chart["downsampled"],
+    }
@@ -1,36 +1,69 @@
 # utils/chat_utils.py
 from langchain.chains import ConversationChain
-from langchain_openai import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
+from langchain.memory.chat_memory import BaseChatMemory
+from typing import Iterator
+from utils.client_utils import get_chat_model
+from utils.memory_utils import DEFAULT_MAX_TOKENS, TokenBudgetMemory
+from utils.stream_utils import ResponseTiming, stream_chain
+from utils.trace_utils import span
 
-def init_memory() -> ConversationBufferMemory:
+def init_memory(max_token_limit: int = DEFAULT_MAX_TOKENS, **kwargs) -> TokenBudgetMemory:
     """
     Initialize a conversation memory instance.
 
+    Args:
+        max_token_limit (int): Token budget of the history sent with each prompt.
+        **kwargs: Extra memory settings, e.g. `memory_key` and `output_key` for
+            a ConversationalRetrievalChain.
+
     Returns:
-        ConversationBufferMemory: A memory object that stores conversation history as messages.
+        TokenBudgetMemory: A memory object that stores conversation history as messages,
+            summarizing older turns once the budget is exceeded.
     """
-    return ConversationBufferMemory(return_messages=True)
+    return TokenBudgetMemory(return_messages=True, max_token_limit=max_token_limit, **kwargs)
 
 
-def get_chat_response(prompt: str, memory: ConversationBufferMemory, api_key: str) -> str:
+def get_chat_response(prompt: str, memory: BaseChatMemory, api_key: str) -> str:
     """
     Generate a response using OpenAI's chat model with conversational memory.
 
     Args:
         prompt (str): The user's input prompt.
-        memory (ConversationBufferMemory): Memory to store and retrieve conversation context.
+        memory (BaseChatMemory): Memory to store and retrieve conversation context.
         api_key (str): OpenAI API key.
 
     Returns:
         str: The generated response from the model.
     """
-    # Initialize the OpenAI chat model
-    model = ChatOpenAI(
-        model="gpt-4-turbo",
-        openai_api_key=api_key
-    )
+    # Reuse the shared OpenAI chat model client
+    model = get_chat_model(api_key, "gpt-4-turbo")
     # Create a conversation chain and invoke the model
     chain = ConversationChain(llm=model, memory=memory)
-    result = chain.invoke({"input": prompt})
+    with span("chat.generate"):
+        result = chain.invoke({"input": prompt})
     return result["response"]
+
+
+def stream_chat_response(
+    prompt: str,
+    memory: BaseChatMemory,
+    api_key: str,
+    timing: ResponseTiming
+) -> Iterator[str]:
+    """
+    Stream a response token by token using OpenAI's chat model with conversational memory.
+
+    Args:
+        prompt (str): The user's input prompt.
+        memory (BaseChatMemory): Memory to store and retrieve conversation context.
+            It is updated with the full response once generation completes.
+        api_key (str): OpenAI API key.
+        timing (ResponseTiming): Filled in with time-to-first-token and total time.
+
+    Yields:
+        str: Response tokens as they are generated.
+    """
+    # Use a streaming chat model so tokens reach the callback as they arrive
+    model = get_chat_model(api_key, "gpt-4-turbo", streaming=True)
+    chain = ConversationChain(llm=model, memory=memory)
+    yield from stream_chain(chain, {"input": prompt}, "response", timing)
@@ -0,0 +1,121 @@
+# utils/client_utils.py
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from utils.trace_utils import count_upstream_request
+
+# Connection pool limits for the shared transport used by every OpenAI client
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+DEFAULT_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+_lock = threading.Lock()
+_http_client: Optional[httpx.Client] = None
+_chat_models: Dict[Tuple, ChatOpenAI] = {}
+_embeddings: Dict[Tuple, OpenAIEmbeddings] = {}
+# Optional limiter every upstream request passes through, e.g. in batch runs
+_request_limiter = None
+
+
+def set_request_limiter(limiter) -> None:
+    """
+    Make every request through the shared HTTP client wait on `limiter`.
+
+    Args:
+        limiter: Object with an `acquire(request)` method that blocks until the
+            request may be sent and an `observe(response)` method that sees
+            every response, e.g. to back off on 429 (see
+            `utils.batch_utils.RateLimiter`), or None to stop limiting.
+    """
+    global _request_limiter
+    _request_limiter = limiter
+
+
+def _throttle_request(request) -> None:
+    limiter = _request_limiter
+    if limiter is not None:
+        limiter.acquire(request)
+
+
+def _observe_response(response) -> None:
+    limiter = _request_limiter
+    if limiter is not None:
+        limiter.observe(response)
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Return the process-wide pooled HTTP client. Connections are kept alive and
+    reused across calls, so only the first request to a host pays for TCP and
+    TLS setup. Requests are counted on the current trace span, if any.
+
+    Returns:
+        httpx.Client: Shared client with keep-alive connection pooling.
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None or _http_client.is_closed:
+            _http_client = httpx.Client(
+                limits=POOL_LIMITS,
+                timeout=DEFAULT_TIMEOUT,
+                event_hooks={"request": [_throttle_request, count_upstream_request], "response": [_observe_response]}
+            )
+        return _http_client
+
+
+def get_chat_model(
+    api_key: str,
+    model: str,
+    temperature: Optional[float] = None,
+    streaming: bool = False
+) -> ChatOpenAI:
+    """
+    Return a long-lived chat model client for (api key, model, temperature, streaming).
+
+    Args:
+        api_key (str): OpenAI API key.
+        model (str): Chat model name.
+        temperature (float, optional): Sampling temperature; the model default if None.
+        streaming (bool): Whether the client streams tokens to callbacks.
+
+    Returns:
+        ChatOpenAI: Shared client backed by the pooled HTTP transport.
+    """
+    key = (api_key, model, temperature, streaming)
+    http_client = get_http_client()
+    with _lock:
+        client = _chat_models.get(key)
+        if client is None:
+            kwargs = {"temperature": temperature} if temperature is not None else {}
+            client = ChatOpenAI(
+                model=model,
+                openai_api_key=api_key,
+                streaming=streaming,
+                http_client=http_client,
+                **kwargs
+            )
+            _chat_models[key] = client
+        return client
+
+
+def get_embeddings(api_key: str, model: str) -> OpenAIEmbeddings:
+    """
+    Return a long-lived embeddings client for (api key, model).
+
+    Args:
+        api_key (str): OpenAI API key.
+        model (str): Embedding model name.
+
+    Returns:
+        OpenAIEmbeddings: Shared client backed by the pooled HTTP transport.
+    """
+    key = (api_key, model)
+    http_client = get_http_client()
+    with _lock:
+        client = _embeddings.get(key)
+        if client is None:
+            client = OpenAIEmbeddings(model=model, openai_api_key=api_key, http_client=http_client)
+            _embeddings[key] = client
+        return client
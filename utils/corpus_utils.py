@@ -0,0 +1,255 @@
+# utils/corpus_utils.py
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from utils.cache_utils import DEFAULT_CACHE_DIR, fingerprint_bytes, read_upload_bytes
+from utils.embedding_utils import get_embedding_backend
+from utils.index_utils import DEFAULT_INDEX_TYPE, build_index, choose_index_type
+from utils.ingest_utils import IngestionStats
+from utils.pdf_utils import DEFAULT_EMBEDDING_MODEL, DEFAULT_SOURCE_NAME, get_shared_document_index
+from utils.retrieval_utils import DEFAULT_CONTEXT_TOKENS, DEFAULT_TOP_K, CorpusKeywordIndex, DocumentIndex, HybridRetriever
+from utils.trace_utils import record, span
+
+
+@dataclass
+class CorpusDocument:
+    """A PDF in a corpus: its id (content hash), display name and chunk ids."""
+    doc_id: str
+    source: str
+    chunk_ids: List[str]
+
+
+class PdfCorpus:
+    """
+    Many PDFs in one FAISS index and one BM25 index.
+
+    Each document is embedded (or served from the caches and the shared
+    registry) on its own; adding it appends only its vectors and keyword
+    segment, and removing it deletes its chunks by id without re-embedding
+    or rebuilding the rest. Chunks carry `doc_id`, `source` and `page`
+    metadata for filtering and citations.
+
+    The corpus index stays exact ("flat") until the chunk count makes
+    `choose_index_type` pick something smaller, and is then converted once to
+    float16 ("fp16"). Trained or graph indexes (IVF, HNSW) are not used here:
+    they cannot take appends and deletions in place.
+    """
+    def __init__(
+        self,
+        api_key: str,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 50,
+        embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        index_type: str = DEFAULT_INDEX_TYPE
+    ):
+        """
+        Initialize an empty corpus.
+
+        Args:
+            api_key (str): OpenAI API key used for document and query embeddings.
+            chunk_size (int): Size of each text chunk for splitting documents.
+            chunk_overlap (int): Overlap size between consecutive text chunks.
+            embedding_model (str): OpenAI embedding model name or local backend, see
+                `utils.embedding_utils.get_embedding_backend`.
+            cache_dir (str): Directory holding the index and chunk caches.
+            index_type (str): FAISS index type setting, see `utils.index_utils`.
+        """
+        self.api_key = api_key
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embedding_model = embedding_model
+        self.cache_dir = cache_dir
+        self.index_type = index_type
+        self.vectorstore: Optional[FAISS] = None
+        self.keyword_index = CorpusKeywordIndex()
+        self.documents: "OrderedDict[str, CorpusDocument]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.documents
+
+    @property
+    def chunks(self) -> int:
+        return self.vectorstore.index.ntotal if self.vectorstore is not None else 0
+
+    def _empty_store(self, template: FAISS) -> FAISS:
+        return FAISS(
+            embedding_function=get_embedding_backend(self.api_key, self.embedding_model),
+            index=faiss.IndexFlat(template.index.d, template.index.metric_type),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+            normalize_L2=template._normalize_L2,
+            distance_strategy=template.distance_strategy
+        )
+
+    def _fit_index(self) -> None:
+        # Switch to float16 storage once the corpus is large enough; both
+        # index types support append and remove_ids
+        index = self.vectorstore.index
+        wanted = "flat" if choose_index_type(index.ntotal, self.index_type) == "flat" else "fp16"
+        if wanted == "fp16" and isinstance(faiss.downcast_index(index), faiss.IndexFlat):
+            with span("corpus.compress_index"):
+                self.vectorstore.index = build_index(index.reconstruct_n(0, index.ntotal), "fp16", index.metric_type)
+
+    def prepare(self, uploaded_file, progress: Optional[Callable[[IngestionStats], None]] = None) -> DocumentIndex:
+        """
+        Build, or fetch from the registry and caches, the shared index of a PDF
+        with this corpus' settings without adding it to the corpus. A later
+        `add` of the same file then only copies its vectors; safe to run in a
+        background thread.
+
+        Args:
+            uploaded_file: File object uploaded via Streamlit or similar file uploader.
+            progress (Callable, optional): Receives IngestionStats updates while
+                a large PDF is ingested through the pipelined path.
+
+        Returns:
+            DocumentIndex: Shared vector store and keyword index of the document.
+        """
+        return get_shared_document_index(
+            uploaded_file,
+            self.api_key,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            embedding_model=self.embedding_model,
+            cache_dir=self.cache_dir,
+            progress=progress,
+            index_type=self.index_type
+        )
+
+    def add(self, uploaded_file, progress: Optional[Callable[[IngestionStats], None]] = None) -> str:
+        """
+        Add a PDF to the corpus. Adding a document that is already present is a no-op.
+
+        Args:
+            uploaded_file: File object uploaded via Streamlit or similar file uploader.
+            progress (Callable, optional): Receives IngestionStats updates while
+                a large PDF is ingested through the pipelined path.
+
+        Returns:
+            str: Id of the document (its content hash).
+        """
+        doc_id = fingerprint_bytes(read_upload_bytes(uploaded_file))
+        if doc_id in self.documents:
+            return doc_id
+        source = getattr(uploaded_file, "name", DEFAULT_SOURCE_NAME)
+        with span("corpus.add", source=source):
+            shared = self.prepare(uploaded_file, progress=progress)
+            store = shared.vectorstore
+            count = store.index.ntotal
+            # Vectors come back from the shared index, so nothing is re-embedded
+            vectors = store.index.reconstruct_n(0, count)
+            docs = [store.docstore.search(store.index_to_docstore_id[i]) for i in range(count)]
+            chunk_ids = [f"{doc_id}:{i}" for i in range(count)]
+            with self._lock:
+                if doc_id in self.documents:
+                    return doc_id
+                if self.vectorstore is None:
+                    self.vectorstore = self._empty_store(store)
+                self.vectorstore.add_embeddings(
+                    zip([doc.page_content for doc in docs], vectors),
+                    metadatas=[{**doc.metadata, "source": source, "doc_id": doc_id} for doc in docs],
+                    ids=chunk_ids
+                )
+                # Chunk order matches the shared BM25 index, so its postings are reused as is
+                self.keyword_index.add(doc_id, shared.keyword_index)
+                self.documents[doc_id] = CorpusDocument(doc_id, source, chunk_ids)
+                self._fit_index()
+            record(chunks=count)
+        return doc_id
+
+    def remove(self, doc_id: str) -> None:
+        """
+        Delete a document's chunks from the corpus.
+
+        Args:
+            doc_id (str): Id returned by `add`.
+        """
+        with self._lock:
+            document = self.documents.pop(doc_id, None)
+            if document is None:
+                raise ValueError(f"Document {doc_id!r} is not in the corpus.")
+            with span("corpus.remove", source=document.source):
+                if document.chunk_ids:
+                    self.vectorstore.delete(document.chunk_ids)
+                self.keyword_index.remove(doc_id)
+
+    def fingerprint(self, doc_ids: Optional[Iterable[str]] = None) -> Optional[str]:
+        """
+        Return a hash identifying the searched documents, for answer caching.
+
+        Args:
+            doc_ids (Iterable[str], optional): Restrict to these documents; defaults to all.
+
+        Returns:
+            str | None: Hash of the embedding model and document ids, or None
+                for an empty selection.
+        """
+        ids = sorted(self.documents if doc_ids is None else set(doc_ids) & set(self.documents))
+        # Backends retrieve different chunks, so their answers are cached apart
+        return fingerprint_bytes("\n".join([self.embedding_model, *ids]).encode("utf-8")) if ids else None
+
+    def retriever(self, k: int = DEFAULT_TOP_K, max_context_tokens: int = DEFAULT_CONTEXT_TOKENS) -> HybridRetriever:
+        """
+        Return a hybrid retriever over the corpus. It follows later additions
+        and removals; set its `doc_ids` to search only some documents.
+
+        Args:
+            k (int): Maximum number of chunks returned per query.
+            max_context_tokens (int): Token budget of the returned chunks.
+
+        Returns:
+            HybridRetriever: Retriever over the corpus.
+        """
+        if self.vectorstore is None:
+            raise ValueError("Add a document before creating a retriever.")
+        return HybridRetriever(
+            vectorstore=self.vectorstore,
+            keyword_index=self.keyword_index,
+            k=k,
+            max_context_tokens=max_context_tokens
+        )
+
+
+def cite(docs: Iterable[Document]) -> List[Dict[str, Any]]:
+    """
+    Return one citation per (document, page) of the retrieved chunks, in rank order.
+
+    Args:
+        docs (Iterable[Document]): Retrieved chunks.
+
+    Returns:
+        list[dict]: {"doc_id", "source", "page"} with one-based page numbers.
+    """
+    citations: Dict[tuple, Dict[str, Any]] = {}
+    for doc in docs:
+        page = doc.metadata.get("page")
+        key = (doc.metadata.get("doc_id"), page)
+        if key not in citations:
+            citations[key] = {
+                "doc_id": key[0],
+                "source": doc.metadata.get("source", DEFAULT_SOURCE_NAME),
+                "page": page + 1 if isinstance(page, int) else None,
+            }
+    return list(citations.values())
+
+
+def format_citations(citations: List[Dict[str, Any]]) -> str:
+    """Render citations as "a.pdf p. 2, 5; b.pdf p. 1"."""
+    pages: Dict[str, List[str]] = {}
+    for citation in citations:
+        entry = pages.setdefault(citation["source"], [])
+        if citation["page"] is not None:
+            entry.append(str(citation["page"]))
+    return "; ".join(f"{source} p. {', '.join(numbers)}" if numbers else source for source, numbers in pages.items())
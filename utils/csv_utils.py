@@ -1,7 +1,226 @@
 # utils/csv_utils.py
+import io
 import json
-from langchain_openai import ChatOpenAI
-from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
+import os
+import re
+import threading
+import time
+import weakref
+from typing import Callable
+import pandas as pd
+from pyarrow import feather
+from langchain.agents import AgentExecutor, create_react_agent
+from langchain.agents.agent import RunnableAgent
+from langchain.agents.mrkl.prompt import FORMAT_INSTRUCTIONS
+from langchain.agents.output_parsers import ReActSingleInputOutputParser
+from langchain_core.agents import AgentFinish
+from langchain_core.exceptions import OutputParserException
+from langchain_core.prompts import PromptTemplate
+from langchain_experimental.agents.agent_toolkits.pandas.prompt import PREFIX, SUFFIX_WITH_DF
+from langchain_experimental.tools.python.tool import PythonAstREPLTool
+from utils.cache_utils import DEFAULT_CACHE_DIR, fingerprint_bytes, read_upload_bytes
+from utils.client_utils import get_chat_model
+from utils.registry_utils import RetrieverRegistry
+from utils.trace_utils import record, span
+
+# String columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+PREVIEW_ROWS = 1000
+
+# Copy-on-write: a shallow copy of a shared frame shares its data until one
+# side writes to it, and then copies only the columns written (see CsvExecutor)
+pd.options.mode.copy_on_write = True
+
+
+def frame_bytes(df) -> int:
+    """Return the in-memory size of a DataFrame, including object contents."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+# One frame per distinct CSV, shared by every mode and session in the process
+FRAME_REGISTRY = RetrieverRegistry(sizer=frame_bytes)
+
+
+def optimize_dtypes(df):
+    """
+    Shrink a freshly parsed DataFrame in place of the default dtypes.
+
+    Integers are downcast to the smallest type that holds their values,
+    floats only when no precision is lost, and low-cardinality string columns become categoricals.
+
+    Args:
+        df (pandas.DataFrame): Parsed frame.
+
+    Returns:
+        pandas.DataFrame: The optimized frame.
+    """
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            df[column] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            downcast = pd.to_numeric(series, downcast="float")
+            # Only keep float32 when it round-trips exactly
+            if downcast.dtype == series.dtype or downcast.astype(series.dtype).equals(series):
+                df[column] = downcast
+        elif series.dtype == object or pd.api.types.is_string_dtype(series):
+            if len(series) and series.nunique(dropna=True) / len(series) <= CATEGORY_MAX_UNIQUE_RATIO:
+                df[column] = series.astype("category")
+    return df
+
+
+def _parse_csv(content: bytes):
+    try:
+        return pd.read_csv(io.BytesIO(content), engine="pyarrow")
+    except Exception:
+        # The pyarrow engine rejects some dialects the C parser accepts
+        return pd.read_csv(io.BytesIO(content))
+
+
+def load_csv(uploaded_file, fingerprint: str = None, cache_dir: str = DEFAULT_CACHE_DIR):
+    """
+    Load an uploaded CSV once per process, with compact dtypes and an on-disk Arrow copy.
+
+    The first load parses with the pyarrow engine, optimizes dtypes and writes
+    an uncompressed Feather file keyed by the content hash. Later loads in
+    other processes memory-map that file instead of re-parsing, and loads in
+    this process return the frame already held in FRAME_REGISTRY.
+
+    Args:
+        uploaded_file: File object uploaded via Streamlit or similar file uploader.
+        fingerprint (str, optional): Precomputed content hash of the file.
+        cache_dir (str): Directory holding the Feather cache.
+
+    Returns:
+        pandas.DataFrame: The shared frame for this file. It is shared across
+            sessions, so callers must not modify it in place.
+    """
+    content = None
+    if fingerprint is None:
+        content = read_upload_bytes(uploaded_file)
+        fingerprint = fingerprint_bytes(content)
+
+    def build():
+        path = os.path.join(cache_dir, "frames", f"{fingerprint}.feather")
+        if os.path.exists(path):
+            return feather.read_table(path, memory_map=True).to_pandas()
+        data = content if content is not None else read_upload_bytes(uploaded_file)
+        df = optimize_dtypes(_parse_csv(data))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        # Feather needs string column names and a default index
+        feather.write_feather(df.reset_index(drop=True), tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+        return df
+
+    with span("csv.load"):
+        return FRAME_REGISTRY.get_or_build(fingerprint, build)
+
+
+PROFILE_SAMPLE_ROWS = 100_000
+PROFILE_MAX_COLUMNS = 100
+PROFILE_TOP_VALUES = 3
+
+# Profiles keyed by id() of the frame; entries are dropped when the frame is collected
+_profiles = {}
+_profiles_lock = threading.Lock()
+
+
+def profile_dataframe(df) -> dict:
+    """
+    Compute a compact per-column profile of a DataFrame.
+
+    Quantiles are estimated from a sample of at most PROFILE_SAMPLE_ROWS rows;
+    counts, null fractions and min/max use the full frame.
+
+    Args:
+        df (pandas.DataFrame): The dataset to profile.
+
+    Returns:
+        dict: {"rows", "columns", "profile": {column: {...}}}.
+    """
+    sample = df.sample(PROFILE_SAMPLE_ROWS, random_state=0) if len(df) > PROFILE_SAMPLE_ROWS else df
+    columns = {}
+    for column in list(df.columns)[:PROFILE_MAX_COLUMNS]:
+        series = df[column]
+        info = {
+            "dtype": str(series.dtype),
+            "null_fraction": float(series.isna().mean()) if len(series) else 0.0,
+            "unique": int(series.nunique(dropna=True)),
+        }
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            quantiles = sample[column].quantile([0.25, 0.5, 0.75])
+            info.update({
+                "min": series.min(),
+                "max": series.max(),
+                "quantiles": {f"p{int(q * 100)}": value for q, value in quantiles.items()},
+            })
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            info.update({"min": str(series.min()), "max": str(series.max())})
+        else:
+            top = series.value_counts(dropna=True).head(PROFILE_TOP_VALUES)
+            info["top_values"] = {str(value): int(count) for value, count in top.items()}
+        columns[str(column)] = info
+    return {"rows": len(df), "columns": len(df.columns), "profile": columns}
+
+
+def format_profile(profile: dict) -> str:
+    """
+    Render a profile from `profile_dataframe` as one short line per column.
+
+    Args:
+        profile (dict): Output of `profile_dataframe`.
+
+    Returns:
+        str: Text block suitable for the agent prompt.
+    """
+    lines = [f"The DataFrame `df` has {profile['rows']:,} rows and {profile['columns']} columns."]
+    for name, info in profile["profile"].items():
+        parts = [info["dtype"], f"nulls {info['null_fraction']:.1%}", f"{info['unique']:,} unique"]
+        if "quantiles" in info:
+            q = info["quantiles"]
+            parts.append(
+                f"min {_format_number(info['min'])}, p25 {_format_number(q['p25'])}, "
+                f"p50 {_format_number(q['p50'])}, p75 {_format_number(q['p75'])}, max {_format_number(info['max'])}"
+            )
+        elif "min" in info:
+            parts.append(f"from {info['min']} to {info['max']}")
+        if info.get("top_values"):
+            parts.append("top: " + ", ".join(f"{value!r} ({count})" for value, count in info["top_values"].items()))
+        lines.append(f"- {name}: " + "; ".join(parts))
+    if profile["columns"] > len(profile["profile"]):
+        lines.append(f"- ... {profile['columns'] - len(profile['profile'])} more columns")
+    return "\n".join(lines)
+
+
+def get_dataset_profile(df) -> str:
+    """
+    Return the formatted profile of `df`, computing it only on first use.
+
+    Args:
+        df (pandas.DataFrame): The dataset to profile.
+
+    Returns:
+        str: Formatted profile text.
+    """
+    key = id(df)
+    with _profiles_lock:
+        cached = _profiles.get(key)
+    if cached is not None:
+        return cached
+    with span("csv.profile"):
+        text = format_profile(profile_dataframe(df))
+    with _profiles_lock:
+        if key not in _profiles:
+            _profiles[key] = text
+            weakref.finalize(df, _profiles.pop, key, None)
+    return text
+
+
+PROFILE_TEMPLATE = """
+Dataset profile (precomputed; rely on it instead of inspecting df.head(), df.columns or df.dtypes):
+{profile}
+"""
 
 PROMPT_TEMPLATE = """
 You are a data analysis assistant. Your response format depends on the type of user request:
@@ -12,21 +231,203 @@ You are a data analysis assistant. Your response format depends on the type of u
 2. If the user requests a table, respond in the following format:
    {"table": {"columns": ["column1", "column2", ...], "data": [[value1, value2, ...], [...] ]}}
 
-3. If the user’s request is best represented as a bar chart:
-   {"bar": {"columns": ["A", "B", ...], "data": [v1, v2, ...]}}
-
-4. If the request is suitable for a line chart:
-   {"line": {"columns": ["A", "B", ...], "data": [v1, v2, ...]}}
-
-5. If the request is suitable for a scatter plot:
-   {"scatter": {"columns": ["A", "B", ...], "data": [[x1, y1], [x2, y2], ...]}}
+3. If the request is best answered with a chart (bar, line or scatter), do NOT compute or list the data
+   points: describe the chart and the app computes it from the full dataset:
+   {"chart": {"type": "bar" | "line" | "scatter", "x": "<column>", "y": "<column>" or ["<column>", ...],
+              "agg": "sum" | "mean" | "count" | "min" | "max" | "median",
+              "filters": [{"column": "<column>", "op": "==" | "!=" | ">" | ">=" | "<" | "<=" | "in" | "contains", "value": ...}],
+              "freq": "day" | "week" | "month" | "quarter" | "year", "bins": <int>, "color": "<column>", "limit": <int>},
+    "answer": "<optional one-sentence takeaway>"}
+   Only "type" and "x" are required. Bars aggregate y per x category (per bin of a numeric x with "bins");
+   lines aggregate y per x value, or per "freq" period of a date x; scatters plot raw y against x,
+   optionally coloured by "color". Without "y", bars and lines count rows.
 
 Return **all outputs** strictly as a JSON string with double quotes.
 
 User request:
 """
 
-def run_csv_agent(api_key: str, df, query: str) -> dict:
+# Bounds of one agent run: tool steps per query, and seconds
+CSV_AGENT_MAX_ITERATIONS = int(os.environ.get("AGENT_CSV_MAX_ITERATIONS", "6"))
+CSV_AGENT_MAX_SECONDS = float(os.environ.get("AGENT_CSV_MAX_SECONDS", "60"))
+# Frames and series the agent derived that stay in its namespace between queries
+MAX_DERIVED_OBJECTS = 8
+RESULT_KEYS = ("answer", "table", "chart", "bar", "line", "scatter")
+
+DERIVED_TEMPLATE = """
+Variables computed for earlier questions are still defined in the Python tool; reuse them instead of recomputing
+(`df` itself is always the original dataset):
+{variables}
+"""
+
+
+def parse_result(output):
+    """
+    Return `output` as a result dict if it is one, else None.
+
+    Args:
+        output: A dict, or text holding a JSON object, e.g. an agent's final
+            answer or the output of its Python tool.
+
+    Returns:
+        dict | None: The result if it has one of the `answer`/`table`/`bar`/
+            `line`/`scatter`/`chart` keys.
+    """
+    if isinstance(output, str):
+        text = output.strip()
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end < start:
+            return None
+        try:
+            output = json.loads(text[start:end + 1])
+        except ValueError:
+            return None
+    if isinstance(output, dict) and any(key in output for key in RESULT_KEYS):
+        return output
+    return None
+
+
+class _JsonFinishParser(ReActSingleInputOutputParser):
+    # A reply that skips the "Final Answer:" marker but holds a valid result
+    # ends the run instead of costing a parsing-error round trip
+    def parse(self, text: str):
+        try:
+            return super().parse(text)
+        except OutputParserException:
+            result = parse_result(text)
+            if result is None:
+                raise
+            return AgentFinish({"output": json.dumps(result, default=str)}, text)
+
+
+class _JsonStopExecutor(AgentExecutor):
+    # Stop as soon as the Python tool prints or returns a valid result,
+    # without another LLM step to restate it
+    def _get_tool_return(self, next_step_output):
+        result = parse_result(next_step_output[1])
+        if result is not None:
+            return AgentFinish({"output": json.dumps(result, default=str)}, "")
+        return super()._get_tool_return(next_step_output)
+
+
+class CsvExecutor:
+    """
+    Long-lived DataFrame agent for one dataset.
+
+    The prompt (with its `df.head()` rendering), the tool set and the Python
+    REPL are built once and reused, so variables the agent defines for one
+    query (a cleaned or grouped frame, say) are still there for the next and
+    are listed in its prompt. Runs are capped at `max_iterations` tool steps
+    and end as soon as a valid JSON result is produced.
+    """
+    def __init__(
+        self,
+        api_key: str,
+        df,
+        include_profile: bool = True,
+        max_iterations: int = CSV_AGENT_MAX_ITERATIONS,
+        max_execution_time: float = CSV_AGENT_MAX_SECONDS
+    ):
+        """
+        Build the agent.
+
+        Args:
+            api_key (str): OpenAI API key.
+            df (pandas.DataFrame): The DataFrame to analyze.
+            include_profile (bool): Prepend the cached dataset profile so the agent
+                can skip schema exploration steps.
+            max_iterations (int): Tool steps allowed per query.
+            max_execution_time (float): Seconds allowed per query.
+        """
+        self.df = df
+        self.include_profile = include_profile
+        # Reuse the shared OpenAI chat model client
+        model = get_chat_model(api_key, "gpt-4-turbo", temperature=0)
+        with span("csv.agent_build"):
+            # `df` is bound per run, see `run`
+            self.repl = PythonAstREPLTool(locals={})
+            template = "\n\n".join([PREFIX, "{tools}", FORMAT_INSTRUCTIONS, SUFFIX_WITH_DF])
+            prompt = PromptTemplate.from_template(template).partial(df_head=str(df.head().to_markdown()))
+            agent = RunnableAgent(
+                runnable=create_react_agent(model, [self.repl], prompt, output_parser=_JsonFinishParser()),
+                input_keys_arg=["input"],
+                return_keys_arg=["output"]
+            )
+            self.executor = _JsonStopExecutor(
+                agent=agent,
+                tools=[self.repl],
+                max_iterations=max_iterations,
+                max_execution_time=max_execution_time,
+                return_intermediate_steps=True,
+                handle_parsing_errors=True,
+                verbose=True
+            )
+        self.queries = 0
+        self.steps = 0
+        # The REPL namespace is shared state: one query at a time
+        self._lock = threading.Lock()
+
+    def derived_objects(self) -> dict:
+        """Return the frames and series the agent defined, by name, with their shapes."""
+        return {
+            name: f"{type(value).__name__} {'x'.join(map(str, value.shape))}"
+            for name, value in self.repl.locals.items()
+            if name != "df" and isinstance(value, (pd.DataFrame, pd.Series))
+        }
+
+    def _forget_oldest(self) -> None:
+        names = list(self.derived_objects())
+        for name in names[:-MAX_DERIVED_OBJECTS]:
+            del self.repl.locals[name]
+
+    def run(self, query: str, callbacks: list = None) -> dict:
+        """
+        Answer a query with the agent.
+
+        Args:
+            query (str): User's natural language query or visualization request.
+            callbacks (list, optional): LangChain callback handlers for this run.
+
+        Returns:
+            dict: Result with one of the keys `answer`, `table` or `chart` (or
+                the older `bar`, `line`, `scatter`); text that is not a result
+                becomes the answer.
+        """
+        with self._lock:
+            # Derived frames persist, but `df` is rebound to the dataset on
+            # every run: the frame itself is shared by every session (and
+            # keyed by id in the profile cache), and agent code such as
+            # `df.drop(..., inplace=True)` must not change it. Under
+            # copy-on-write the shallow copy costs no data copy up front
+            self.repl.locals["df"] = self.df.copy(deep=False)
+            prompt = PROMPT_TEMPLATE + query
+            derived = self.derived_objects()
+            if derived:
+                variables = "\n".join(f"- {name}: {shape}" for name, shape in derived.items())
+                prompt = DERIVED_TEMPLATE.format(variables=variables) + prompt
+            if self.include_profile:
+                prompt = PROFILE_TEMPLATE.format(profile=get_dataset_profile(self.df)) + prompt
+            with span("csv.agent"):
+                response = self.executor.invoke({"input": prompt}, config={"callbacks": callbacks})
+            steps = len(response["intermediate_steps"])
+            self.queries += 1
+            self.steps += steps
+            record(csv_agent_steps=steps)
+            self._forget_oldest()
+        # Parse and return JSON output
+        with span("csv.json_parse"):
+            output = response["output"]
+            return parse_result(output) or {"answer": str(output)}
+
+
+def run_csv_agent(
+    api_key: str,
+    df,
+    query: str,
+    include_profile: bool = True,
+    callbacks: list = None,
+    executor: CsvExecutor = None
+) -> dict:
     """
     Execute a user query on a CSV dataset using LangChain's DataFrame Agent 
     and return the result in JSON format.
@@ -35,26 +436,430 @@ def run_csv_agent(api_key: str, df, query: str) -> dict:
         api_key (str): OpenAI API key.
         df (pandas.DataFrame): The DataFrame to analyze.
         query (str): User's natural language query or visualization request.
+        include_profile (bool): Prepend the cached dataset profile so the agent
+            can skip schema exploration steps.
+        callbacks (list, optional): LangChain callback handlers for this run.
+        executor (CsvExecutor, optional): Long-lived agent for `df` to reuse;
+            a one-off agent is built when omitted.
 
     Returns:
         dict: Parsed JSON result that may include one of the keys: 
-              `answer`, `table`, `bar`, `line`, or `scatter`.
-    """
-    # Initialize the OpenAI chat model
-    model = ChatOpenAI(
-        model="gpt-4-turbo",
-        openai_api_key=api_key,
-        temperature=0
-    )
-    # Create the DataFrame Agent
-    agent = create_pandas_dataframe_agent(
-        llm=model,
-        df=df,
-        agent_executor_kwargs={"handle_parsing_errors": True},
-        verbose=True
-    )
-    # Build the prompt and invoke the agent
-    prompt = PROMPT_TEMPLATE + query
-    response = agent.invoke({"input": prompt})
-    # Parse and return JSON output
-    return json.loads(response["output"])
+              `answer`, `table`, `chart`, `bar`, `line`, or `scatter`.
+    """
+    if executor is None:
+        executor = CsvExecutor(api_key, df, include_profile=include_profile)
+    return executor.run(query, callbacks=callbacks)
+
+
+# ---------------------------------------------------------------------------
+# Local fast path: answer common questions with vectorized pandas operations
+# ---------------------------------------------------------------------------
+
+MAX_TABLE_ROWS = 100
+
+# Per-path counters: how many queries each path answered and the time spent
+CSV_PATH_STATS = {
+    "local": {"queries": 0, "seconds": 0.0},
+    "agent": {"queries": 0, "seconds": 0.0},
+}
+_stats_lock = threading.Lock()
+
+_AGGREGATIONS = {
+    "average": "mean", "avg": "mean", "mean": "mean",
+    "sum": "sum", "total": "sum",
+    "maximum": "max", "max": "max", "highest": "max", "largest": "max",
+    "minimum": "min", "min": "min", "lowest": "min", "smallest": "min",
+    "median": "median",
+    "count": "count", "number": "count",
+}
+_AGG_PATTERN = re.compile(r"\b(" + "|".join(sorted(_AGGREGATIONS, key=len, reverse=True)) + r")\b")
+_ROW_COUNT = re.compile(r"\b(how many (rows|records|entries)|row count|number of (rows|records|entries))\b")
+_COLUMNS = re.compile(r"\b(what|which|list|show)( are| the| all)* (columns|fields)\b|\bcolumn names\b")
+_DESCRIBE = re.compile(r"\b(describe|summary statistics|summary stats|descriptive statistics|summarize the (data|dataset))\b")
+_TOP_K = re.compile(r"\b(top|bottom|first|last|highest|lowest)\s+(\d+)\b")
+_GROUP_BY = re.compile(r"\b(by|per|for each|grouped by|group by|across)\b")
+_TREND = re.compile(r"\b(over time|trend|per (day|week|month|quarter|year)|by (day|week|month|quarter|year)|monthly|yearly|daily|weekly|quarterly)\b")
+_FREQUENCIES = {
+    "day": "D", "daily": "D", "week": "W", "weekly": "W", "month": "MS", "monthly": "MS",
+    "quarter": "QS", "quarterly": "QS", "year": "YS", "yearly": "YS",
+}
+_COMPARISON = re.compile(
+    r"(>=|<=|!=|>|<|=|==|greater than or equal to|less than or equal to|greater than|more than|"
+    r"above|over|less than|below|under|equals|equal to|is not|is)\s+['\"]?([\w.\-/ ]+?)['\"]?(?:$|[?.,]| and\b)"
+)
+_OPERATORS = {
+    ">": "gt", "greater than": "gt", "more than": "gt", "above": "gt", "over": "gt",
+    "<": "lt", "less than": "lt", "below": "lt", "under": "lt",
+    ">=": "ge", "greater than or equal to": "ge",
+    "<=": "le", "less than or equal to": "le",
+    "=": "eq", "==": "eq", "equals": "eq", "equal to": "eq", "is": "eq",
+    "!=": "ne", "is not": "ne",
+}
+# Bare words that are only read as operators against numeric columns, or
+# against a value the text column holds; in "which region is the best
+# performer" they are just part of the sentence
+_BARE_OPERATORS = {"is", "over", "under"}
+# Between a column name and its value in "region West", "region is West"
+_NAME_THEN_VALUE = re.compile(r"\s+(?:(?:is|=|==|equals|equal to)\s+)?(?:the\s+)?")
+# Before a value whose column is not named: "for West", "in the East region"
+_VALUE_PREFIX = re.compile(r"\b(?:for|in|where|with)\s+(?:the\s+)?$")
+_VALUE_WORD = re.compile(r"\w+(?:[./']\w+)*")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_NEGATION = re.compile(r"\b(?:not|no|never|without|except|excluding|exclude|other than|besides)\b|n['’]t\b")
+_DISJUNCTION = re.compile(r"\bor\b")
+# Longest multi-word value looked up in text columns
+MAX_VALUE_WORDS = 3
+# Words too common to count as values unless they follow their column's name
+_FUNCTION_WORDS = {"a", "an", "the", "i", "in", "is", "of", "for", "and", "or", "by", "to", "on", "at", "all", "any"}
+# Distinct values of text columns by (id of the frame, column)
+_value_sets = {}
+_value_sets_lock = threading.Lock()
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[\s_\-]+", " ", str(text).lower()).strip()
+
+
+def _column_spans(df, text: str) -> list:
+    """Return (column, start, end) for the columns named in normalized `text`, in order."""
+    found = []
+    # Longest names first so "order date" wins over "date"
+    for column in sorted(df.columns, key=lambda c: len(str(c)), reverse=True):
+        match = re.search(r"\b" + re.escape(_normalize(column)) + r"\b", text)
+        if match and not any(start <= match.start() < end for _, start, end in found):
+            found.append((column, match.start(), match.end()))
+    return sorted(found, key=lambda item: item[1])
+
+
+def _mentioned_columns(df, query: str) -> list:
+    """Return the columns named in the query, in the order they appear."""
+    return [column for column, _, _ in _column_spans(df, _normalize(query))]
+
+
+def _is_text(series) -> bool:
+    return not (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series))
+
+
+def _text_values(df, column) -> set:
+    """Return the lowercased distinct values of a text column, computing them only on first use."""
+    key = (id(df), column)
+    with _value_sets_lock:
+        cached = _value_sets.get(key)
+    if cached is not None:
+        return cached
+    series = df[column]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        values = {str(value).lower() for value in series.cat.categories}
+    else:
+        values = {str(value).lower() for value in pd.unique(series.dropna())}
+    with _value_sets_lock:
+        if key not in _value_sets:
+            _value_sets[key] = values
+            weakref.finalize(df, _value_sets.pop, key, None)
+    return values
+
+
+def _overlaps(start: int, end: int, spans: list) -> bool:
+    return any(start < other_end and other_start < end for other_start, other_end in spans)
+
+
+def _value_mentions(df, text: str, taken: list) -> list:
+    """
+    Return (start, end, columns) for the n-grams of `text` outside `taken`
+    that are values of text columns, longest first and not overlapping.
+    """
+    words = [(m.start(), m.end()) for m in _VALUE_WORD.finditer(text)]
+    candidates = {}
+    for i in range(len(words)):
+        for n in range(1, MAX_VALUE_WORDS + 1):
+            if i + n <= len(words):
+                start, end = words[i][0], words[i + n - 1][1]
+                candidates.setdefault(text[start:end], []).append((start, end))
+    hits = {}
+    for column in df.columns:
+        if _is_text(df[column]):
+            for value in _text_values(df, column) & candidates.keys():
+                for span in candidates[value]:
+                    hits.setdefault(span, []).append(column)
+    mentions = []
+    for (start, end), columns in sorted(hits.items(), key=lambda item: item[0][0] - item[0][1]):
+        if not _overlaps(start, end, taken + [(s, e) for s, e, _ in mentions]):
+            mentions.append((start, end, columns))
+    return sorted(mentions)
+
+
+def _plan_filters(df, text: str, spans: list):
+    """
+    Read the filters of a normalized query: `<column> <operator> <value>`
+    comparisons joined by "and", and equality on text values the column
+    holds ("region West", "region is West", "for product B", "in the East
+    region").
+
+    Returns:
+        tuple or None: ([(column, operator, value)], [(start, end)] of the
+            numbers no filter used), or None when the query has a qualifier
+            that cannot be applied exactly (negation, "or", a text value next
+            to no column, an unknown value after an explicit operator).
+    """
+    conditions = []
+    consumed = []
+
+    for column, start, end in spans:
+        rest = text[end:]
+        offset = end + len(rest) - len(rest.lstrip())
+        match = _COMPARISON.match(text, offset)
+        if not match:
+            continue
+        word, raw = match.group(1), match.group(2).strip()
+        op = _OPERATORS[word]
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series):
+            try:
+                value = float(raw)
+            except ValueError:
+                continue
+        elif word in _BARE_OPERATORS and not (_is_text(series) and raw in _text_values(df, column)):
+            continue
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            value = pd.Timestamp(raw)
+        elif op not in ("eq", "ne") or raw not in _text_values(df, column):
+            # An explicit operator on a value the column does not hold
+            return None
+        else:
+            value = raw
+        conditions.append((column, op, value))
+        consumed.append((start, match.start(2) + len(match.group(2).rstrip())))
+
+    for start, end, columns in _value_mentions(df, text, consumed + [(s, e) for _, s, e in spans]):
+        value = text[start:end]
+        named = None
+        for column, col_start, col_end in spans:
+            if column not in columns:
+                continue
+            before = _NAME_THEN_VALUE.fullmatch(text, col_end, start)
+            after = text[end:col_start].isspace() and col_start == end + 1
+            if before or after:
+                named = (column, min(start, col_start), max(end, col_end))
+        if named is not None:
+            column, span_start, span_end = named
+        elif value in _FUNCTION_WORDS:
+            continue
+        elif _VALUE_PREFIX.search(text, 0, start) and len(columns) == 1:
+            column, span_start, span_end = columns[0], start, end
+        else:
+            return None
+        conditions.append((column, "eq", value))
+        consumed.append((span_start, span_end))
+
+    rest = "".join(" " if _overlaps(i, i + 1, consumed) else char for i, char in enumerate(text))
+    if _NEGATION.search(rest) or (conditions and _DISJUNCTION.search(rest)):
+        return None
+    column_spans = [(start, end) for _, start, end in spans]
+    numbers = [m.span() for m in _NUMBER.finditer(text) if not _overlaps(*m.span(), consumed + column_spans)]
+    return conditions, numbers
+
+
+def _apply_conditions(df, conditions: list):
+    """Keep the rows matching every (column, operator, value) condition."""
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in conditions:
+        series = df[column]
+        if _is_text(series):
+            series = series.astype(str).str.lower()
+        mask &= getattr(series, op)(value)
+    return df[mask]
+
+
+def _to_table(frame) -> dict:
+    """Convert a DataFrame to the `table` output format with JSON-safe values."""
+    frame = frame.head(MAX_TABLE_ROWS)
+    payload = json.loads(frame.to_json(orient="split", date_format="iso", index=False))
+    return {"table": {"columns": [str(c) for c in payload["columns"]], "data": payload["data"]}}
+
+
+def _to_series_chart(kind: str, series) -> dict:
+    """Convert a Series to the one-dimensional `bar`/`line` output format."""
+    if isinstance(series.index, pd.DatetimeIndex):
+        series = series.set_axis(series.index.strftime("%Y-%m-%d"))
+    payload = json.loads(series.to_json(orient="split", date_format="iso"))
+    return {kind: {"columns": [str(i) for i in payload["index"]], "data": payload["data"]}}
+
+
+def _format_number(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.4g}" if abs(value) < 1e4 else f"{value:,.2f}"
+    return f"{value:,}" if isinstance(value, int) else str(value)
+
+
+def _datetime_column(df, columns: list):
+    """Pick a datetime column, preferring ones mentioned in the query."""
+    candidates = list(columns) + [c for c in df.columns if c not in columns]
+    for column in candidates:
+        series = df[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return column, series
+        name = _normalize(column)
+        if series.dtype == object and any(word in name for word in ("date", "time", "month", "year", "day")):
+            parsed = pd.to_datetime(series, errors="coerce")
+            if parsed.notna().mean() > 0.9:
+                return column, parsed
+    return None, None
+
+
+def answer_locally(df, query: str):
+    """
+    Answer common questions about a DataFrame without calling the LLM.
+
+    Recognises row counts, column listings, describe, aggregations with an
+    optional group-by, top/bottom-k, comparison and value filters joined by
+    "and", and time trends, using the DataFrame's actual column names. A
+    plan must use every column name and every value the query mentions; a
+    qualifier it cannot apply would silently answer a broader question, so
+    such queries are left to the agent.
+
+    Args:
+        df (pandas.DataFrame): The dataset to analyze.
+        query (str): User's natural language query.
+
+    Returns:
+        dict or None: Output in the same `answer`/`table`/`bar`/`line` format as
+            `run_csv_agent`, or None if the question is not recognised.
+    """
+    text = _normalize(query)
+    spans = _column_spans(df, text)
+
+    if _COLUMNS.search(text):
+        return {"answer": f"The dataset has {len(df.columns)} columns: {', '.join(map(str, df.columns))}."}
+
+    plan = _plan_filters(df, text, spans)
+    if plan is None:
+        return None
+    conditions, numbers = plan
+    filter_columns = {column for column, _, _ in conditions}
+    filtered = _apply_conditions(df, conditions) if conditions else df
+    if conditions and filtered.empty:
+        # An empty result more likely means a misread filter than an answer
+        return None
+    columns = [column for column, _, _ in spans if column not in filter_columns]
+    matched = f"{len(filtered):,} rows match the filter on {', '.join(map(str, sorted(filter_columns, key=str)))}."
+
+    top = _TOP_K.search(text)
+    if top:
+        numbers = [number for number in numbers if number != top.span(2)]
+    if numbers:
+        # A number no filter or top-k uses ("the 10 most expensive") changes the question
+        return None
+
+    if _ROW_COUNT.search(text) and not columns:
+        return {"answer": matched if conditions else f"The dataset has {len(df):,} rows."}
+    if _DESCRIBE.search(text) and not conditions:
+        described = df[columns].describe() if columns else df.describe()
+        return _to_table(described.reset_index().rename(columns={"index": "statistic"}))
+
+    if top:
+        if len(columns) != 1 or not pd.api.types.is_numeric_dtype(df[columns[0]]):
+            return None
+        k = int(top.group(2))
+        ascending = top.group(1) in ("bottom", "lowest")
+        ranked = filtered.nsmallest(k, columns[0]) if ascending else filtered.nlargest(k, columns[0])
+        return _to_table(ranked)
+
+    agg_match = _AGG_PATTERN.search(text)
+    trend = _TREND.search(text)
+    if trend:
+        date_column, dates = _datetime_column(filtered, columns)
+        value_columns = [c for c in columns if c != date_column and pd.api.types.is_numeric_dtype(filtered[c])]
+        if date_column is None or set(columns) - {date_column, *value_columns[:1]}:
+            return None
+        freq_word = next((w for w in text.split() if w in _FREQUENCIES), "month")
+        how = _AGGREGATIONS[agg_match.group(1)] if agg_match else ("sum" if value_columns else "count")
+        grouper = pd.Grouper(key="__date__", freq=_FREQUENCIES[freq_word])
+        frame = filtered.assign(__date__=dates).dropna(subset=["__date__"])
+        if value_columns:
+            series = frame.groupby(grouper)[value_columns[0]].agg(how)
+        else:
+            series = frame.groupby(grouper).size()
+        return _to_series_chart("line", series)
+
+    if agg_match:
+        how = _AGGREGATIONS[agg_match.group(1)]
+        group_match = _GROUP_BY.search(text)
+        group_column = None
+        if group_match:
+            after = [column for column, start, _ in spans if column in columns and start > group_match.start()]
+            group_column = after[0] if after else None
+        value_columns = [c for c in columns if c != group_column]
+        if len(value_columns) > 1:
+            return None
+
+        if how == "count" and not value_columns:
+            if group_column is None:
+                return {"answer": matched} if conditions else None
+            return _to_series_chart("bar", filtered.groupby(group_column, observed=True).size().sort_values(ascending=False))
+        if not value_columns:
+            return None
+        value_column = value_columns[0]
+        if how != "count" and not pd.api.types.is_numeric_dtype(filtered[value_column]):
+            return None
+        if group_column is not None:
+            series = filtered.groupby(group_column, observed=True)[value_column].agg(how).sort_values(ascending=False)
+            return _to_series_chart("bar", series)
+        value = filtered[value_column].agg(how)
+        value = value.item() if hasattr(value, "item") else value
+        return {"answer": f"The {agg_match.group(1)} of {value_column} is {_format_number(value)}."}
+
+    if conditions and not columns:
+        return {"answer": matched, **_to_table(filtered)}
+    return None
+
+
+def answer_csv_query(api_key: str, df, query: str, get_executor: Callable[[], CsvExecutor] = None) -> dict:
+    """
+    Answer a CSV query with the local fast path, falling back to the DataFrame Agent.
+
+    Args:
+        api_key (str): OpenAI API key.
+        df (pandas.DataFrame): The DataFrame to analyze.
+        query (str): User's natural language query or visualization request.
+        get_executor (Callable, optional): Returns the long-lived agent for `df`
+            (see `run_csv_agent`); only called when the agent is needed.
+
+    Returns:
+        dict: Result in the `answer`/`table`/`chart`/`bar`/`line`/`scatter` format.
+    """
+    start = time.perf_counter()
+    try:
+        with span("csv.local_plan"):
+            result = answer_locally(df, query)
+    except Exception:
+        # Any surprise in the planner just means the agent handles the query
+        result = None
+    path = "local"
+    if result is None:
+        path = "agent"
+        executor = get_executor() if get_executor is not None else None
+        result = run_csv_agent(api_key, df, query, executor=executor)
+    record(**{f"csv_{path}_answers": 1})
+    with _stats_lock:
+        CSV_PATH_STATS[path]["queries"] += 1
+        CSV_PATH_STATS[path]["seconds"] += time.perf_counter() - start
+    return result
+
+
+def get_csv_path_stats() -> dict:
+    """
+    Return hit rate and mean latency of the local and agent paths.
+
+    Returns:
+        dict: Path name -> {"queries", "hit_rate", "mean_seconds"}.
+    """
+    with _stats_lock:
+        total = sum(entry["queries"] for entry in CSV_PATH_STATS.values())
+        return {
+            path: {
+                "queries": entry["queries"],
+                "hit_rate": entry["queries"] / total if total else 0.0,
+                "mean_seconds": entry["seconds"] / entry["queries"] if entry["queries"] else 0.0,
+            }
+            for path, entry in CSV_PATH_STATS.items()
+        }
@@ -0,0 +1,171 @@
+# utils/embedding_utils.py
+import re
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.client_utils import get_embeddings
+from utils.trace_utils import record
+
+# Buckets per vector; a 1000-character chunk holds about 3000 n-grams, and
+# recall drops quickly below this size as they collide
+DEFAULT_HASHED_DIM = 2048
+DEFAULT_NGRAM_RANGE = (3, 5)
+# Texts hashed per NumPy pass; bounds the scratch arrays to a few MB
+HASHED_BATCH_SIZE = 256
+# Model string of the local backend at its default size
+LOCAL_EMBEDDING_MODEL = f"hashed:{DEFAULT_HASHED_DIM}"
+
+_NON_WORD = re.compile(r"[\W_]+")
+# FNV-1a style byte mixing, then a 64-bit multiplicative finalizer
+_FNV_PRIME = np.uint64(1099511628211)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+class HashedNgramEmbeddings(Embeddings):
+    """
+    Local, dependency-free embeddings: character n-grams of the lowercased
+    text are hashed into `dim` signed buckets (the hashing trick), counts are
+    damped with log1p and every vector is L2-normalized.
+
+    Similar wording gives similar vectors, so lexical questions (names, codes,
+    phrases from the document) retrieve well; paraphrases that share no
+    wording do not, which is what remote models are for. Every batch of texts
+    is hashed in one vectorized NumPy pass, with no network round trip.
+    """
+    def __init__(self, dim: int = DEFAULT_HASHED_DIM, ngram_range: Tuple[int, int] = DEFAULT_NGRAM_RANGE):
+        """
+        Initialize the embeddings.
+
+        Args:
+            dim (int): Vector size, a power of two.
+            ngram_range (tuple[int, int]): Smallest and largest n-gram length, in bytes.
+        """
+        if dim < 2 or dim & (dim - 1):
+            raise ValueError(f"Hashed embedding size must be a power of two, got {dim}.")
+        low, high = ngram_range
+        if not 1 <= low <= high:
+            raise ValueError(f"Invalid n-gram range {ngram_range}.")
+        self.dim = dim
+        self.ngram_range = (low, high)
+        # The top bits of the mixed hash pick the bucket
+        self._shift = np.uint64(64 - (dim.bit_length() - 1))
+
+    def _embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        # Word characters only, single-spaced and padded so n-grams mark word edges
+        encoded = [f" {_NON_WORD.sub(' ', text.lower()).strip()} ".encode("utf-8") for text in texts]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        owner = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        counts = np.zeros(len(texts) * self.dim, dtype=np.float64)
+
+        low, high = self.ngram_range
+        hashes = np.zeros(len(data), dtype=np.uint64)
+        for n in range(1, high + 1):
+            starts = len(data) - n + 1
+            if starts <= 0:
+                break
+            # hashes[i] becomes the hash of the n bytes starting at i
+            hashes = (hashes[:starts] ^ data[n - 1:]) * _FNV_PRIME
+            if n < low:
+                continue
+            # Drop n-grams that run across two texts of the batch
+            inside = owner[:starts] == owner[n - 1:]
+            mixed = (hashes[inside] + np.uint64(n)) * _MIX
+            buckets = (mixed >> self._shift).astype(np.int64)
+            signs = 1.0 - 2.0 * ((mixed >> np.uint64(31)) & np.uint64(1)).astype(np.float64)
+            counts += np.bincount(owner[:starts][inside] * self.dim + buckets, weights=signs, minlength=counts.size)
+
+        vectors = counts.reshape(len(texts), self.dim)
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+
+    def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed texts into a float32 matrix, one unit-length row per text.
+
+        Args:
+            texts (Sequence[str]): Texts to embed.
+
+        Returns:
+            numpy.ndarray: Array of shape (len(texts), dim); empty texts give zero rows.
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        record(embedded_chunks=len(texts))
+        return np.vstack([
+            self._embed_batch(texts[start:start + HASHED_BATCH_SIZE])
+            for start in range(0, len(texts), HASHED_BATCH_SIZE)
+        ])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+# Local backends by the prefix of "<backend>:<options>" model strings; the
+# factory receives the options, e.g. "4096" for "hashed:4096"
+EMBEDDING_BACKENDS: Dict[str, Callable[[str], Embeddings]] = {
+    "hashed": lambda options: HashedNgramEmbeddings(dim=int(options or DEFAULT_HASHED_DIM)),
+}
+_local_embeddings: Dict[str, Embeddings] = {}
+_lock = threading.Lock()
+
+
+def register_embedding_backend(name: str, factory: Callable[[str], Embeddings]) -> None:
+    """
+    Make "<name>:<options>" model strings build embeddings with `factory(options)`.
+
+    Args:
+        name (str): Backend prefix, without a colon.
+        factory (Callable[[str], Embeddings]): Builds the embeddings from the
+            text after the colon; called once per model string.
+    """
+    if ":" in name:
+        raise ValueError(f"Embedding backend names cannot contain ':', got {name!r}.")
+    with _lock:
+        EMBEDDING_BACKENDS[name] = factory
+
+
+def is_local_model(model: str) -> bool:
+    """Return whether `model` names a registered local backend rather than an OpenAI model."""
+    backend, sep, _ = model.partition(":")
+    return bool(sep) and backend in EMBEDDING_BACKENDS
+
+
+def get_embedding_backend(api_key: str, model: str) -> Embeddings:
+    """
+    Return the embeddings for a model string.
+
+    "<backend>:<options>" strings (e.g. "hashed:2048") select a registered
+    local backend, shared process-wide and independent of the API key; any
+    other string is an OpenAI embedding model served by the pooled client.
+    The model string is part of every index and chunk cache key, so vectors
+    of different backends are never mixed.
+
+    Args:
+        api_key (str): OpenAI API key, unused by local backends.
+        model (str): Model string.
+
+    Returns:
+        Embeddings: The embedding function.
+
+    Raises:
+        ValueError: `model` has a colon but names no registered backend.
+    """
+    backend, sep, options = model.partition(":")
+    if not sep:
+        return get_embeddings(api_key, model)
+    with _lock:
+        embeddings = _local_embeddings.get(model)
+        if embeddings is None:
+            factory = EMBEDDING_BACKENDS.get(backend)
+            if factory is None:
+                raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {tuple(EMBEDDING_BACKENDS)}.")
+            embeddings = _local_embeddings[model] = factory(options)
+        return embeddings
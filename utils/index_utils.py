@@ -0,0 +1,169 @@
+# utils/index_utils.py
+import math
+import os
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+INDEX_TYPES = ("flat", "fp16", "hnsw", "ivf", "ivfsq8", "ivfpq")
+# "auto" picks an index type from the chunk count; any of INDEX_TYPES forces it
+DEFAULT_INDEX_TYPE = os.environ.get("AGENT_FAISS_INDEX", "auto")
+
+# Chunk counts at which "auto" trades exactness for memory
+FP16_MIN_CHUNKS = 5_000
+IVF_MIN_CHUNKS = 50_000
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+# Dimensions per product-quantizer sub-vector (one byte of code each)
+PQ_SUBVECTOR_DIMS = 16
+# k-means needs ~39 points per centroid; more than this only slows training
+MAX_TRAINING_POINTS = 100_000
+_POINTS_PER_CENTROID = 39
+
+
+def choose_index_type(n_chunks: int, index_type: str = DEFAULT_INDEX_TYPE) -> str:
+    """
+    Resolve the index type for a store of `n_chunks` vectors.
+
+    With "auto", small stores stay exact ("flat"), mid-sized ones store
+    float16 vectors ("fp16", half the memory at near-identical recall) and
+    large ones use an inverted file over 8-bit scalar-quantized vectors
+    ("ivfsq8", a quarter of the memory and sublinear search). Product
+    quantization ("ivfpq", ~1/16 of the memory) costs noticeably more
+    recall, so it is only used when asked for. Types that need k-means
+    training fall back to "fp16" or "flat" when there are too few vectors.
+
+    Args:
+        n_chunks (int): Number of vectors in the store.
+        index_type (str): "auto" or one of INDEX_TYPES.
+
+    Returns:
+        str: One of INDEX_TYPES.
+    """
+    if index_type == "auto":
+        if n_chunks >= IVF_MIN_CHUNKS:
+            return "ivfsq8"
+        return "fp16" if n_chunks >= FP16_MIN_CHUNKS else "flat"
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type {index_type!r}; expected 'auto' or one of {INDEX_TYPES}.")
+    if index_type == "ivfpq" and n_chunks < 256 * _POINTS_PER_CENTROID:
+        # 8-bit PQ codebooks cannot be trained on fewer points
+        return "fp16"
+    if index_type in ("ivf", "ivfsq8") and n_chunks < 2 * _POINTS_PER_CENTROID:
+        return "flat"
+    return index_type
+
+
+def ivf_lists(n_chunks: int) -> int:
+    """Number of inverted lists for `n_chunks` vectors (~4 sqrt(n), enough points per list)."""
+    return max(1, min(int(4 * math.sqrt(n_chunks)), n_chunks // _POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dim: int) -> int:
+    m = max(1, dim // PQ_SUBVECTOR_DIMS)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_index(vectors: np.ndarray, index_type: str, metric: int = faiss.METRIC_L2) -> faiss.Index:
+    """
+    Build and fill a FAISS index of the given type.
+
+    Args:
+        vectors (np.ndarray): float32 array of shape (n, dim).
+        index_type (str): One of INDEX_TYPES.
+        metric (int): faiss.METRIC_L2 or faiss.METRIC_INNER_PRODUCT.
+
+    Returns:
+        faiss.Index: Index holding `vectors` in order, so positions keep matching
+            the vector store's docstore ids.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+    if index_type == "flat":
+        index = faiss.IndexFlat(dim, metric)
+    elif index_type == "fp16":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, metric)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, metric)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif index_type in ("ivf", "ivfsq8", "ivfpq"):
+        nlist = ivf_lists(n)
+        quantizer = faiss.IndexFlat(dim, metric)
+        if index_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        elif index_type == "ivfsq8":
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, faiss.ScalarQuantizer.QT_8bit, metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), 8, metric)
+        # The index must own its quantizer once this function returns
+        index.own_fields = True
+        quantizer.this.disown()
+        index.nprobe = min(nlist, max(8, nlist // 16))
+    else:
+        raise ValueError(f"Unknown FAISS index type {index_type!r}.")
+
+    if not index.is_trained:
+        sample = vectors
+        if n > MAX_TRAINING_POINTS:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(n, MAX_TRAINING_POINTS, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    if isinstance(index, faiss.IndexIVF):
+        # Needed by reconstruct(), which LangChain uses for MMR search
+        index.make_direct_map()
+    return index
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """
+    Estimate the resident size of a FAISS index.
+
+    Args:
+        index (faiss.Index): Any index built by `build_index` or LangChain.
+
+    Returns:
+        int: Approximate size in bytes of the stored codes and search structures.
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        storage = faiss.downcast_index(index.storage)
+        # Each neighbor link is a 4-byte id
+        return index_bytes(storage) + index.hnsw.neighbors.size() * 4
+    if isinstance(index, faiss.IndexIVF):
+        # Codes plus 8-byte ids per vector, the coarse centroids and the direct map
+        size = index.ntotal * (index.code_size + 8) + index.nlist * index.d * 4
+        if isinstance(index, faiss.IndexIVFPQ):
+            size += index.pq.M * (1 << index.pq.nbits) * index.pq.dsub * 4
+        return size + index.ntotal * 8
+    code_size = getattr(index, "code_size", None)
+    if code_size is not None:
+        return index.ntotal * code_size
+    return index.ntotal * index.d * 4
+
+
+def compress_vectorstore(faiss_db: FAISS, index_type: str = DEFAULT_INDEX_TYPE) -> FAISS:
+    """
+    Rebuild the index of a vector store as the type chosen for its size.
+    Documents and ids are untouched; only `faiss_db.index` is replaced.
+
+    Args:
+        faiss_db (FAISS): Vector store built with a flat index.
+        index_type (str): "auto" or one of INDEX_TYPES.
+
+    Returns:
+        FAISS: The same vector store.
+    """
+    index = faiss_db.index
+    chosen = choose_index_type(index.ntotal, index_type)
+    if chosen == "flat" and isinstance(faiss.downcast_index(index), faiss.IndexFlat):
+        return faiss_db
+    vectors = index.reconstruct_n(0, index.ntotal)
+    faiss_db.index = build_index(vectors, chosen, index.metric_type)
+    return faiss_db
@@ -0,0 +1,209 @@
+# utils/ingest_utils.py
+import contextvars
+import io
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+from utils.trace_utils import record, span
+
+# Above this many pages `load_pdf_to_vectorstore` switches to the pipelined path
+PIPELINE_MIN_PAGES = 50
+
+
+@dataclass
+class IngestionStats:
+    """
+    Progress and throughput of a pipelined ingestion run.
+    """
+    total_pages: int = 0
+    pages: int = 0
+    chunks: int = 0
+    embedded_chunks: int = 0
+    batches: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return max(end - self.started_at, 1e-9)
+
+    @property
+    def pages_per_sec(self) -> float:
+        return self.pages / self.elapsed
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.embedded_chunks / self.elapsed
+
+    @property
+    def progress(self) -> float:
+        """Fraction of the work done, counting parsing and embedding as equal halves."""
+        if not self.total_pages:
+            return 0.0
+        parsed = self.pages / self.total_pages
+        embedded = self.embedded_chunks / self.chunks if self.chunks else 0.0
+        return 0.5 * parsed + 0.5 * embedded * parsed
+
+    def as_dict(self) -> dict:
+        return {
+            "total_pages": self.total_pages,
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "embedded_chunks": self.embedded_chunks,
+            "batches": self.batches,
+            "elapsed": round(self.elapsed, 3),
+            "pages_per_sec": round(self.pages_per_sec, 2),
+            "chunks_per_sec": round(self.chunks_per_sec, 2),
+        }
+
+
+# Each parser process opens the PDF once in its initializer instead of
+# receiving the whole file with every task
+_worker_reader: Optional[PdfReader] = None
+
+
+def open_pdf(content: bytes) -> PdfReader:
+    """
+    Open a PDF held in memory. BytesIO shares the buffer of an immutable
+    bytes object until it is written to, so the content is not copied.
+    """
+    return PdfReader(io.BytesIO(content))
+
+
+def _init_parser(content: bytes) -> None:
+    global _worker_reader
+    _worker_reader = open_pdf(content)
+
+
+def _extract_pages(start: int, stop: int) -> List[Tuple[int, str]]:
+    return [(i, _worker_reader.pages[i].extract_text()) for i in range(start, stop)]
+
+
+def count_pdf_pages(content: bytes) -> int:
+    """Return the number of pages in a PDF without extracting any text."""
+    return len(open_pdf(content).pages)
+
+
+def ingest_pdf_pipelined(
+    content: bytes,
+    embeddings: Embeddings,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 50,
+    source: str = "",
+    pages_per_task: int = 8,
+    parse_workers: Optional[int] = None,
+    batch_size: int = 64,
+    max_batch_chars: int = 200_000,
+    max_concurrent_requests: int = 4,
+    progress: Optional[Callable[[IngestionStats], None]] = None
+) -> Tuple[FAISS, IngestionStats]:
+    """
+    Parse, split, embed and index a PDF as overlapping pipeline stages.
+
+    Pages are extracted in a process pool and split as soon as each page range
+    arrives. Chunks are grouped into batches capped by count and characters,
+    embedded with at most `max_concurrent_requests` requests in flight, and
+    added to the index as each batch returns.
+
+    Args:
+        content (bytes): Raw PDF content.
+        embeddings (Embeddings): Embedding model used for the chunks.
+        chunk_size (int): Size of each text chunk for splitting the document.
+        chunk_overlap (int): Overlap size between consecutive text chunks.
+        source (str): Value stored in each chunk's `source` metadata.
+        pages_per_task (int): Number of pages extracted per parser task.
+        parse_workers (int, optional): Parser process count; defaults to the CPU count.
+        batch_size (int): Maximum number of chunks per embedding request.
+        max_batch_chars (int): Maximum total characters per embedding request.
+        max_concurrent_requests (int): Maximum embedding requests in flight.
+        progress (Callable, optional): Called with the running IngestionStats after every stage update.
+
+    Returns:
+        tuple: (FAISS vector store, final IngestionStats)
+    """
+    stats = IngestionStats(total_pages=count_pdf_pages(content))
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    faiss_db: Optional[FAISS] = None
+    in_flight = set()
+    batch: List[Document] = []
+    batch_chars = 0
+
+    def report() -> None:
+        if progress is not None:
+            progress(stats)
+
+    def add_to_index(future) -> None:
+        nonlocal faiss_db
+        docs, vectors = future.result()
+        pairs = [(doc.page_content, vector) for doc, vector in zip(docs, vectors)]
+        metadatas = [doc.metadata for doc in docs]
+        # Only this thread touches the index, so no locking is needed
+        if faiss_db is None:
+            faiss_db = FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas)
+        else:
+            faiss_db.add_embeddings(pairs, metadatas=metadatas)
+        stats.embedded_chunks += len(docs)
+        report()
+
+    def embed(docs: List[Document]):
+        with span("pdf.embed_batch", chunks=len(docs)):
+            return docs, embeddings.embed_documents([doc.page_content for doc in docs])
+
+    def flush(embed_pool: ThreadPoolExecutor) -> None:
+        nonlocal batch, batch_chars
+        if not batch:
+            return
+        # Bound the number of outstanding requests; index whatever finishes first
+        while len(in_flight) >= max_concurrent_requests:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.discard(future)
+                add_to_index(future)
+        in_flight.add(embed_pool.submit(contextvars.copy_context().run, embed, batch))
+        stats.batches += 1
+        batch, batch_chars = [], 0
+
+    ranges = [
+        (start, min(start + pages_per_task, stats.total_pages))
+        for start in range(0, stats.total_pages, pages_per_task)
+    ]
+    with ProcessPoolExecutor(max_workers=parse_workers, initializer=_init_parser, initargs=(content,)) as parse_pool, \
+            ThreadPoolExecutor(max_workers=max_concurrent_requests) as embed_pool:
+        parse_futures = [parse_pool.submit(_extract_pages, start, stop) for start, stop in ranges]
+        for future in as_completed(parse_futures):
+            pages = future.result()
+            page_docs = [
+                Document(page_content=text, metadata={"source": source, "page": page})
+                for page, text in pages
+            ]
+            for chunk in text_splitter.split_documents(page_docs):
+                batch.append(chunk)
+                batch_chars += len(chunk.page_content)
+                stats.chunks += 1
+                if len(batch) >= batch_size or batch_chars >= max_batch_chars:
+                    flush(embed_pool)
+            stats.pages += len(pages)
+            report()
+        flush(embed_pool)
+        for future in as_completed(list(in_flight)):
+            add_to_index(future)
+        in_flight.clear()
+
+    if faiss_db is None:
+        raise ValueError("No text could be extracted from the PDF.")
+    stats.finished_at = time.perf_counter()
+    record(pages=stats.pages, chunks=stats.chunks)
+    report()
+    return faiss_db, stats
@@ -0,0 +1,144 @@
+# utils/job_utils.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Uploads parsed and indexed at once, across every session of the process
+DEFAULT_INGEST_WORKERS = int(os.environ.get("AGENT_INGEST_WORKERS", "2"))
+# Finished jobs remembered so reruns and other sessions see them as done
+MAX_FINISHED_JOBS = 64
+
+
+@dataclass
+class IngestionJob:
+    """
+    A background ingestion of one uploaded file, shared by every session that
+    uploads the same content. `stats` holds the latest IngestionStats reported
+    by the pipelined PDF path, if any.
+    """
+    key: Hashable
+    kind: str
+    source: str
+    future: Optional[Future] = None
+    stats: Any = None
+    submitted_at: float = field(default_factory=time.perf_counter)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        """The exception the job failed with, or None while running or after success."""
+        return self.future.exception() if self.done else None
+
+    @property
+    def state(self) -> str:
+        """One of "queued", "running", "done" or "failed"."""
+        if self.done:
+            return "failed" if self.error is not None else "done"
+        return "running" if self.started_at is not None else "queued"
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - (self.started_at if self.started_at is not None else self.submitted_at)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait up to `timeout` seconds for the job; return whether it is done."""
+        if self.future is None:
+            return False
+        try:
+            self.future.exception(timeout=timeout)
+        except TimeoutError:
+            return False
+        return True
+
+
+class IngestionJobManager:
+    """
+    Run ingestion work (PDF indexing, CSV parsing) in a background thread pool,
+    keyed by file fingerprint, so the Streamlit script thread never blocks on it.
+
+    Submitting a key that already has a queued, running or finished job
+    returns that job instead of starting another one, whichever session
+    submitted it first; failed jobs are replaced so a new upload retries.
+    Jobs only warm the shared caches (RETRIEVER_REGISTRY, FRAME_REGISTRY and
+    the on-disk caches): their return values are dropped, so a finished job
+    never keeps an index or frame alive past the registry's eviction.
+    """
+    def __init__(self, max_workers: int = DEFAULT_INGEST_WORKERS, max_finished: int = MAX_FINISHED_JOBS):
+        """
+        Initialize the manager.
+
+        Args:
+            max_workers (int): Jobs running at once.
+            max_finished (int): Finished jobs kept for lookups before the oldest are forgotten.
+        """
+        self.max_finished = max_finished
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-ingest-job")
+        self._jobs: "OrderedDict[Hashable, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.submitted = 0
+
+    def submit(self, key: Hashable, fn: Callable[[Callable[[Any], None]], Any], kind: str, source: str) -> IngestionJob:
+        """
+        Start `fn` in the background unless a job for `key` exists.
+
+        Args:
+            key (Hashable): Identity of the work, e.g. ("pdf", fingerprint).
+            fn (Callable): Called with a progress callback that stores the
+                IngestionStats it receives on the job.
+            kind (str): "pdf" or "csv", for display.
+            source (str): File name, for display.
+
+        Returns:
+            IngestionJob: The new or existing job.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.state != "failed":
+                return job
+            job = IngestionJob(key, kind, source)
+            self._jobs[key] = job
+            self._jobs.move_to_end(key)
+            job.future = self._pool.submit(self._run, job, fn)
+            self.submitted += 1
+            self._forget_finished()
+        return job
+
+    def _run(self, job: IngestionJob, fn: Callable) -> None:
+        job.started_at = time.perf_counter()
+        try:
+            fn(lambda stats: setattr(job, "stats", stats))
+        finally:
+            job.finished_at = time.perf_counter()
+
+    def _forget_finished(self) -> None:
+        finished = [key for key, job in self._jobs.items() if job.done]
+        for key in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[key]
+
+    def get(self, key: Hashable) -> Optional[IngestionJob]:
+        """Return the job for `key`, or None."""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def stats(self) -> Dict[str, int]:
+        """Return job counts per state and the number of jobs started."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {state: 0 for state in ("queued", "running", "done", "failed")}
+        for job in jobs:
+            counts[job.state] += 1
+        return {**counts, "submitted": self.submitted}
+
+
+# Shared by every Streamlit session served by this process
+INGESTION_JOBS = IngestionJobManager()
@@ -0,0 +1,159 @@
+# utils/memory_utils.py
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+from langchain_core.pydantic_v1 import Field
+
+from utils.trace_utils import span
+
+DEFAULT_MAX_TOKENS = 2000
+# Cheap model used to fold old turns into the running summary
+SUMMARY_MODEL = "gpt-4.1-nano-2025-04-14"
+# Chat formatting adds a few tokens around every message
+_TOKENS_PER_MESSAGE = 4
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(encoding_name: str):
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        # Encodings are downloaded on first use; without them fall back to a
+        # ~4 characters per token estimate rather than failing the chat
+        return None
+
+
+def count_tokens(text: str, encoding_name: str = "cl100k_base") -> int:
+    """
+    Count the tokens of a string with tiktoken.
+
+    Args:
+        text (str): Text to count.
+        encoding_name (str): tiktoken encoding name.
+
+    Returns:
+        int: Number of tokens.
+    """
+    encoding = _get_encoding(encoding_name)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class TokenBudgetMemory(BaseChatMemory):
+    """
+    Conversation memory bounded by a token budget.
+
+    Recent turns are kept verbatim. Whenever the history exceeds
+    `max_token_limit`, the oldest turns are folded into a running summary by
+    `llm` (or dropped if no summarizer is bound), so the summary is extended
+    incrementally instead of re-condensing the whole conversation each turn.
+    Drop-in replacement for ConversationBufferMemory in ChatAgent and PdfAgent.
+    """
+    max_token_limit: int = DEFAULT_MAX_TOKENS
+    memory_key: str = "history"
+    human_prefix: str = "Human"
+    ai_prefix: str = "AI"
+    encoding_name: str = "cl100k_base"
+    llm: Optional[BaseLanguageModel] = None
+    summary: str = ""
+    # History + input tokens loaded into the prompt on each turn
+    prompt_tokens_per_turn: List[int] = Field(default_factory=list)
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def _message_tokens(self, message: BaseMessage) -> int:
+        return count_tokens(str(message.content), self.encoding_name) + _TOKENS_PER_MESSAGE
+
+    def history_messages(self) -> List[BaseMessage]:
+        """Return the summary (as a system message) followed by the verbatim turns."""
+        messages = list(self.chat_memory.messages)
+        if self.summary:
+            messages.insert(0, SystemMessage(content=self.summary))
+        return messages
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages = self.history_messages()
+        tokens = sum(self._message_tokens(message) for message in messages)
+        tokens += sum(
+            count_tokens(str(value), self.encoding_name)
+            for key, value in inputs.items()
+            if key != self.memory_key and isinstance(value, str)
+        )
+        self.prompt_tokens_per_turn.append(tokens)
+
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {
+            self.memory_key: get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        }
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        self.prune()
+
+    def prune(self) -> None:
+        """Fold the oldest turns into the summary until the history fits the budget."""
+        messages = self.chat_memory.messages
+        sizes = [self._message_tokens(message) for message in messages]
+        summary_tokens = count_tokens(self.summary, self.encoding_name) if self.summary else 0
+        total = sum(sizes) + summary_tokens
+
+        pruned: List[BaseMessage] = []
+        # Drop whole human/AI exchanges and always keep the latest one verbatim
+        while total > self.max_token_limit and len(messages) > 2:
+            for _ in range(2):
+                pruned.append(messages.pop(0))
+                total -= sizes.pop(0)
+        if pruned:
+            with span("memory.summarize", messages=len(pruned)):
+                self.summary = self._summarize(pruned)
+
+    def _summarize(self, pruned: List[BaseMessage]) -> str:
+        if self.llm is None:
+            return self.summary
+        new_lines = get_buffer_string(pruned, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        result = self.llm.invoke(SUMMARY_PROMPT.format(summary=self.summary, new_lines=new_lines))
+        return getattr(result, "content", result)
+
+    def clear(self) -> None:
+        super().clear()
+        self.summary = ""
+        self.prompt_tokens_per_turn = []
+
+
+def bind_summarizer(memory: Any, llm: BaseLanguageModel) -> None:
+    """
+    Give a TokenBudgetMemory created before an API key was known a model to
+    summarize with. Other memory types are left untouched.
+
+    Args:
+        memory: Conversation memory used by an agent.
+        llm (BaseLanguageModel): Model used to fold old turns into the summary.
+    """
+    if isinstance(memory, TokenBudgetMemory) and memory.llm is None:
+        memory.llm = llm
+
+
+def memory_messages(memory: Any) -> List[BaseMessage]:
+    """
+    Return a memory's history as messages without loading it as prompt
+    input, so TokenBudgetMemory's per-turn token metric is not recorded
+    again.
+
+    Args:
+        memory: Conversation memory used by an agent.
+
+    Returns:
+        list[BaseMessage]: The summary, if any, then the verbatim turns.
+    """
+    if isinstance(memory, TokenBudgetMemory):
+        return memory.history_messages()
+    return list(memory.chat_memory.messages)
@@ -1,56 +1,321 @@
 # utils/pdf_utils.py
 import os
-from langchain_community.document_loaders import PyPDFLoader
+from typing import Callable, Iterable, Iterator, Optional
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
+from utils.cache_utils import (
+    DEFAULT_CACHE_DIR,
+    CachedEmbeddings,
+    fingerprint_bytes,
+    get_chunk_cache,
+    get_index_cache,
+    index_cache_key,
+    read_upload_bytes,
+)
+from utils.embedding_utils import get_embedding_backend, is_local_model
+from utils.index_utils import DEFAULT_INDEX_TYPE, compress_vectorstore
+from utils.ingest_utils import PIPELINE_MIN_PAGES, IngestionStats, count_pdf_pages, ingest_pdf_pipelined, open_pdf
+from utils.registry_utils import RETRIEVER_REGISTRY
+from utils.retrieval_utils import (
+    DEFAULT_CONTEXT_TOKENS,
+    DEFAULT_TOP_K,
+    DocumentIndex,
+    HybridRetriever,
+    build_document_index,
+)
+from utils.trace_utils import record, span
 
+# An OpenAI model name, or "<backend>:<options>" for a local backend such as
+# "hashed:2048" (see utils.embedding_utils)
+DEFAULT_EMBEDDING_MODEL = os.environ.get("AGENT_EMBEDDING_MODEL", "text-embedding-ada-002")
+DEFAULT_SOURCE_NAME = "document.pdf"
 
-def load_pdf_to_retriever(
+
+def lazy_load_pdf_pages(
+    content: bytes,
+    source: str = DEFAULT_SOURCE_NAME,
+    pages: Optional[Iterable[int]] = None
+) -> Iterator[Document]:
+    """
+    Parse a PDF straight from memory and yield one Document per page.
+
+    Text is extracted only when a page is consumed, so callers that stop early
+    or select a subset of `pages` never pay for the rest of the document.
+
+    Args:
+        content (bytes): Raw PDF content.
+        source (str): Value stored in each page's `source` metadata.
+        pages (Iterable[int], optional): Zero-based page numbers to load; defaults to all pages.
+
+    Yields:
+        Document: Page text with `source` and `page` metadata, matching PyPDFLoader.
+    """
+    reader = open_pdf(content)
+    page_numbers = range(len(reader.pages)) if pages is None else pages
+    for page in page_numbers:
+        yield Document(
+            page_content=reader.pages[page].extract_text(),
+            metadata={"source": source, "page": page}
+        )
+
+
+def load_pdf_to_vectorstore(
     uploaded_file,
     api_key: str,
-    temp_path: str = "temp.pdf",
     chunk_size: int = 1000,
-    chunk_overlap: int = 50
+    chunk_overlap: int = 50,
+    embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    source: Optional[str] = None,
+    pipelined: Optional[bool] = None,
+    progress: Optional[Callable[[IngestionStats], None]] = None,
+    index_type: str = DEFAULT_INDEX_TYPE
 ) -> FAISS:
     """
-    Load an uploaded PDF file and build a FAISS-based retriever for document search.
+    Load an uploaded PDF file and build a FAISS vector store for document search.
+
+    Indexes are cached on disk under `cache_dir`, keyed by the PDF content hash,
+    the splitter settings, the embedding model and the index type, so
+    re-uploading an identical file loads the saved index instead of re-embedding
+    it. Chunk vectors are cached separately, so a changed PDF only embeds its
+    new or edited chunks. Large stores are rebuilt as a compressed or
+    approximate FAISS index (see `utils.index_utils.choose_index_type`).
 
     Args:
         uploaded_file: File object uploaded via Streamlit or similar file uploader.
         api_key (str): OpenAI API key.
-        temp_path (str): Temporary file path for storing the uploaded PDF.
         chunk_size (int): Size of each text chunk for splitting the document.
         chunk_overlap (int): Overlap size between consecutive text chunks.
+        embedding_model (str): OpenAI embedding model name or local backend, see
+            `utils.embedding_utils.get_embedding_backend`.
+        cache_dir (str): Directory holding the index and chunk caches.
+        source (str, optional): Document name stored in chunk metadata; defaults
+            to the upload's file name.
+        pipelined (bool, optional): Use the parallel streaming pipeline from
+            `utils.ingest_utils`. Defaults to on for PDFs of at least
+            `PIPELINE_MIN_PAGES` pages.
+        progress (Callable, optional): Receives IngestionStats updates in pipelined mode.
+        index_type (str): "auto" to pick the FAISS index type from the chunk
+            count, or one of `utils.index_utils.INDEX_TYPES`.
 
     Returns:
-        FAISS retriever instance ready for semantic search.
+        FAISS: Vector store holding the embedded chunks.
     """
-    # Save the uploaded PDF to a temporary path
-    content = uploaded_file.read()
-    with open(temp_path, "wb") as f:
-        f.write(content)
+    if source is None:
+        source = getattr(uploaded_file, "name", DEFAULT_SOURCE_NAME)
+    content = read_upload_bytes(uploaded_file)
+
+    embeddings = get_embedding_backend(api_key, embedding_model)
+    if not is_local_model(embedding_model):
+        # Remote embeddings go through the chunk cache so only unseen chunks hit the API
+        embeddings = CachedEmbeddings(embeddings, model_name=embedding_model, store=get_chunk_cache(cache_dir))
+
+    # Serve byte-identical uploads straight from the saved index
+    index_cache = get_index_cache(cache_dir)
+    key = index_cache_key(fingerprint_bytes(content), chunk_size, chunk_overlap, embedding_model, index_type)
+    with span("pdf.index_cache_load"):
+        faiss_db = index_cache.load(key, embeddings, embedding_model)
+    if faiss_db is not None:
+        return faiss_db
+
+    if pipelined is None:
+        pipelined = count_pdf_pages(content) >= PIPELINE_MIN_PAGES
+    if pipelined:
+        with span("pdf.ingest_pipelined"):
+            faiss_db, _ = ingest_pdf_pipelined(
+                content,
+                embeddings,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                source=source,
+                progress=progress
+            )
+        with span("pdf.build_index"):
+            compress_vectorstore(faiss_db, index_type)
+        with span("pdf.index_cache_save"):
+            index_cache.save(key, faiss_db, embedding_model)
+        return faiss_db
 
-    # Load the document using PyPDFLoader
-    loader = PyPDFLoader(temp_path)
-    docs = loader.load()
+    # Parse pages from the in-memory bytes; nothing touches the disk
+    with span("pdf.parse"):
+        docs = list(lazy_load_pdf_pages(content, source=source))
+        record(pages=len(docs))
 
     # Split document into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
-    )
-    texts = text_splitter.split_documents(docs)
+    with span("pdf.split"):
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+        texts = text_splitter.split_documents(docs)
+        record(chunks=len(texts))
 
     # Create embeddings and build a FAISS index
-    embeddings = OpenAIEmbeddings(openai_api_key=api_key)
-    faiss_db = FAISS.from_documents(texts, embeddings)
+    with span("pdf.embed_index"):
+        faiss_db = FAISS.from_documents(texts, embeddings)
+    with span("pdf.build_index"):
+        compress_vectorstore(faiss_db, index_type)
+    with span("pdf.index_cache_save"):
+        index_cache.save(key, faiss_db, embedding_model)
+
+    return faiss_db
+
 
-    # Remove the temporary file
-    try:
-        os.remove(temp_path)
-    except OSError:
-        pass
+def load_pdf_to_retriever(uploaded_file, api_key: str, **kwargs):
+    """
+    Load an uploaded PDF file and build a FAISS-based retriever for document search.
+
+    Args:
+        uploaded_file: File object uploaded via Streamlit or similar file uploader.
+        api_key (str): OpenAI API key.
+        **kwargs: Forwarded to `load_pdf_to_vectorstore`.
+
+    Returns:
+        FAISS retriever instance ready for semantic search.
+    """
+    return load_pdf_to_vectorstore(uploaded_file, api_key, **kwargs).as_retriever()
+
+
+def get_shared_document_index(
+    uploaded_file,
+    api_key: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 50,
+    embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    progress: Optional[Callable[[IngestionStats], None]] = None,
+    index_type: str = DEFAULT_INDEX_TYPE
+) -> DocumentIndex:
+    """
+    Return the registered vector store and BM25 index of the PDF, building
+    both only if no session has indexed the same document with the same
+    settings yet. The vector store embeds queries with the building
+    session's key, so callers query it through their own view.
+
+    Args:
+        uploaded_file: File object uploaded via Streamlit or similar file uploader.
+        api_key (str): OpenAI API key used if the document has to be embedded.
+        chunk_size (int): Size of each text chunk for splitting the document.
+        chunk_overlap (int): Overlap size between consecutive text chunks.
+        embedding_model (str): OpenAI embedding model name or local backend, see
+            `utils.embedding_utils.get_embedding_backend`.
+        cache_dir (str): Directory holding the index and chunk caches.
+        progress (Callable, optional): Receives IngestionStats updates in pipelined mode.
+        index_type (str): FAISS index type setting, see `load_pdf_to_vectorstore`.
 
-    # Return the retriever
-    return faiss_db.as_retriever()
+    Returns:
+        DocumentIndex: Shared vector store and keyword index of the document.
+    """
+    source = getattr(uploaded_file, "name", DEFAULT_SOURCE_NAME)
+    content = read_upload_bytes(uploaded_file)
+    key = index_cache_key(fingerprint_bytes(content), chunk_size, chunk_overlap, embedding_model, index_type)
+    with span("pdf.load", source=source):
+        return RETRIEVER_REGISTRY.get_or_build(
+            key,
+            lambda: build_document_index(
+                load_pdf_to_vectorstore(
+                    content,
+                    api_key,
+                    source=source,
+                    chunk_size=chunk_size,
+                    chunk_overlap=chunk_overlap,
+                    embedding_model=embedding_model,
+                    cache_dir=cache_dir,
+                    progress=progress,
+                    index_type=index_type
+                )
+            )
+        )
+
+
+def get_shared_vectorstore(
+    uploaded_file,
+    api_key: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 50,
+    embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    progress: Optional[Callable[[IngestionStats], None]] = None,
+    index_type: str = DEFAULT_INDEX_TYPE
+) -> FAISS:
+    """
+    Return a vector store for the PDF from the process-wide registry, building it
+    only if no session has indexed the same document with the same settings yet.
+
+    The returned store shares the registered index and docstore but embeds
+    queries with the caller's own API key.
+
+    Args:
+        uploaded_file: File object uploaded via Streamlit or similar file uploader.
+        api_key (str): OpenAI API key used for query embeddings.
+        chunk_size (int): Size of each text chunk for splitting the document.
+        chunk_overlap (int): Overlap size between consecutive text chunks.
+        embedding_model (str): OpenAI embedding model name or local backend, see
+            `utils.embedding_utils.get_embedding_backend`.
+        cache_dir (str): Directory holding the index and chunk caches.
+        progress (Callable, optional): Receives IngestionStats updates in pipelined mode.
+        index_type (str): FAISS index type setting, see `load_pdf_to_vectorstore`.
+
+    Returns:
+        FAISS: Vector store bound to the caller's embeddings.
+    """
+    shared = get_shared_document_index(
+        uploaded_file, api_key, chunk_size, chunk_overlap, embedding_model, cache_dir, progress, index_type
+    )
+    return query_view(shared.vectorstore, api_key, embedding_model)
+
+
+def query_view(shared: FAISS, api_key: str, embedding_model: str = DEFAULT_EMBEDDING_MODEL) -> FAISS:
+    """Return a store sharing `shared`'s index and docstore that embeds queries with `api_key`."""
+    return FAISS(
+        embedding_function=get_embedding_backend(api_key, embedding_model),
+        index=shared.index,
+        docstore=shared.docstore,
+        index_to_docstore_id=shared.index_to_docstore_id,
+        normalize_L2=shared._normalize_L2,
+        distance_strategy=shared.distance_strategy
+    )
+
+
+def get_shared_retriever(
+    uploaded_file,
+    api_key: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 50,
+    embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    progress: Optional[Callable[[IngestionStats], None]] = None,
+    index_type: str = DEFAULT_INDEX_TYPE,
+    k: int = DEFAULT_TOP_K,
+    max_context_tokens: int = DEFAULT_CONTEXT_TOKENS
+) -> HybridRetriever:
+    """
+    Return a hybrid BM25 + vector retriever for the PDF, sharing the registered
+    vector store and keyword index with every other session.
+
+    Args:
+        uploaded_file: File object uploaded via Streamlit or similar file uploader.
+        api_key (str): OpenAI API key used for query embeddings.
+        chunk_size (int): Size of each text chunk for splitting the document.
+        chunk_overlap (int): Overlap size between consecutive text chunks.
+        embedding_model (str): OpenAI embedding model name or local backend, see
+            `utils.embedding_utils.get_embedding_backend`.
+        cache_dir (str): Directory holding the index and chunk caches.
+        progress (Callable, optional): Receives IngestionStats updates in pipelined mode.
+        index_type (str): FAISS index type setting, see `load_pdf_to_vectorstore`.
+        k (int): Maximum number of chunks returned per query.
+        max_context_tokens (int): Token budget of the returned chunks.
+
+    Returns:
+        HybridRetriever: Retriever bound to the caller's embeddings.
+    """
+    shared = get_shared_document_index(
+        uploaded_file, api_key, chunk_size, chunk_overlap, embedding_model, cache_dir, progress, index_type
+    )
+    return HybridRetriever(
+        vectorstore=query_view(shared.vectorstore, api_key, embedding_model),
+        keyword_index=shared.keyword_index,
+        k=k,
+        max_context_tokens=max_context_tokens
+    )
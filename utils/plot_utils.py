@@ -1,6 +1,7 @@
 # utils/plot_utils.py
 import pandas as pd
 import streamlit as st
+from utils.chart_utils import compute_chart
 
 def plot_bar(bar: dict) -> None:
     """
@@ -53,3 +54,29 @@ def plot_scatter(scatter: dict) -> None:
     data = scatter["data"]
     df = pd.DataFrame(data, columns=cols)
     st.scatter_chart(df)
+
+
+def plot_chart(df: pd.DataFrame, spec: dict) -> None:
+    """
+    Plot a chart spec from the agent (chart type, columns, aggregation,
+    filters, bins), computing the series from the DataFrame locally and
+    downsampling long lines and large scatters before they reach the browser.
+
+    Args:
+        df (pandas.DataFrame): The dataset the spec refers to.
+        spec (dict): Chart spec, see `utils.chart_utils.validate_chart_spec`.
+    """
+    try:
+        chart = compute_chart(df, spec)
+    except (KeyError, TypeError, ValueError) as exc:
+        st.warning(f"Could not draw the chart: {exc}")
+        return
+    if chart["type"] == "scatter":
+        st.scatter_chart(chart["data"], x=chart["x"], y=chart["y"], color=chart["color"], size=chart["size"])
+    elif chart["type"] == "line":
+        st.line_chart(chart["data"])
+    else:
+        st.bar_chart(chart["data"])
+    if chart["downsampled"]:
+        shown = "binned into grid cells" if chart["type"] == "scatter" else f"{len(chart['data']):,} points shown"
+        st.caption(f"{chart['rows']:,} rows, {shown}.")
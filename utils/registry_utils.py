@@ -0,0 +1,142 @@
+# utils/registry_utils.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+from utils.index_utils import index_bytes
+
+DEFAULT_REGISTRY_BYTES = int(os.environ.get("AGENT_REGISTRY_BYTES", 1024 ** 3))
+
+# Rough per-document bookkeeping cost (Document object, metadata dict, docstore ids)
+_DOC_OVERHEAD_BYTES = 512
+
+
+def estimate_vectorstore_bytes(faiss_db) -> int:
+    """
+    Estimate the resident size of a FAISS vector store, or of a DocumentIndex
+    pairing one with its BM25 keyword index.
+
+    Args:
+        faiss_db (FAISS | DocumentIndex): LangChain FAISS vector store.
+
+    Returns:
+        int: Approximate size in bytes of the indexes plus the stored chunk text.
+    """
+    keyword_index = getattr(faiss_db, "keyword_index", None)
+    if keyword_index is not None:
+        return estimate_vectorstore_bytes(faiss_db.vectorstore) + keyword_index.nbytes
+    size = index_bytes(faiss_db.index)
+    for doc in getattr(faiss_db.docstore, "_dict", {}).values():
+        size += len(doc.page_content.encode("utf-8")) + _DOC_OVERHEAD_BYTES
+    return size
+
+
+class RetrieverRegistry:
+    """
+    Process-wide LRU registry of built objects (vector stores, DataFrames)
+    keyed by document fingerprint.
+    Entries are evicted least recently used first once the total estimated
+    size exceeds the memory budget. Concurrent requests for the same key
+    wait for a single build instead of each building their own copy.
+    """
+    def __init__(self, max_bytes: int = DEFAULT_REGISTRY_BYTES, sizer: Callable[[Any], int] = estimate_vectorstore_bytes):
+        """
+        Initialize the registry.
+
+        Args:
+            max_bytes (int): Memory budget for all registered entries.
+            sizer (Callable): Function returning the size in bytes of an entry;
+                defaults to the vector store estimate.
+        """
+        self.max_bytes = max_bytes
+        self.sizer = sizer
+        self._entries: "OrderedDict[str, tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._building: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(size for _, size in self._entries.values())
+
+    def get(self, key: str):
+        """Return the entry for `key` and mark it most recently used, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, value: Any) -> None:
+        """Register `value` under `key` and evict old entries beyond the budget."""
+        size = self.sizer(value)
+        with self._lock:
+            self._entries[key] = (value, size)
+            self._entries.move_to_end(key)
+            total = sum(s for _, s in self._entries.values())
+            # Never evict the entry that was just added, even if it alone exceeds the budget
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                total -= evicted_size
+                self.evictions += 1
+
+    def discard(self, key: str) -> None:
+        """Remove `key` from the registry if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_or_build(self, key: str, build: Callable[[], Any]):
+        """
+        Return the entry for `key`, building and registering it on a miss.
+
+        Args:
+            key (str): Document fingerprint.
+            build (Callable): Zero-argument function producing the entry.
+
+        Returns:
+            The registered entry.
+        """
+        value = self.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            # Another session may have finished the same build while we waited
+            value = self.get(key)
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                return value
+            with self._lock:
+                self.misses += 1
+            try:
+                value = build()
+                self.put(key, value)
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        """Return entry count, resident bytes and hit/miss/eviction counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(size for _, size in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Shared by every Streamlit session served by this process
+RETRIEVER_REGISTRY = RetrieverRegistry()
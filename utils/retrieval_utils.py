@@ -0,0 +1,409 @@
+# utils/retrieval_utils.py
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from utils.memory_utils import count_tokens
+from utils.trace_utils import record, record_tokens, span
+
+DEFAULT_TOP_K = 4
+DEFAULT_FETCH_K = 20
+# Reciprocal-rank fusion constant; 60 is the value from the original RRF paper
+RRF_K = 60
+DEFAULT_CONTEXT_TOKENS = 1500
+# Overlaps shorter than this are coincidences, not splitter overlap
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+
+_TERM = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an the of to in on for and or is are was were be been by with as at from that this these those "
+    "it its what which who whom how when where why do does did can could should would will about into "
+    "than then there their they them we you your i me my our not no".split()
+)
+# Identifiers such as part numbers, SKUs and error codes: letters mixed with digits
+_IDENTIFIER = re.compile(r"^(?=.*\d)(?=.*[a-z])[a-z0-9][a-z0-9\-_./]*$|^\d{4,}$")
+_QUOTED = re.compile(r"\"([^\"]+)\"|'([^']+)'")
+
+# Process-wide counters: how many retrievals used both rankers vs. keywords only
+RETRIEVAL_STATS = {"hybrid": 0, "keyword_only": 0}
+_stats_lock = threading.Lock()
+
+
+def _idf(n: int, df: int) -> float:
+    return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+
+def _top_k(scores: np.ndarray, k: int, allowed: Optional[np.ndarray]) -> List[Tuple[int, float]]:
+    if allowed is not None:
+        masked = np.zeros_like(scores)
+        masked[allowed] = scores[allowed]
+        scores = masked
+    candidates = np.flatnonzero(scores)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    ranked = sorted(candidates, key=lambda position: -scores[position])
+    return [(int(position), float(scores[position])) for position in ranked]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase BM25 terms, keeping identifiers like "AX-200" or
+    "v2.1" whole and dropping stopwords.
+
+    Args:
+        text (str): Text to tokenize.
+
+    Returns:
+        list[str]: Terms in order of appearance.
+    """
+    return [term for term in _TERM.findall(text.lower()) if term not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over the chunks of a vector store. Postings
+    refer to chunk positions, which are the same positions FAISS uses, so
+    lexical and vector hits can be fused by position.
+    """
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        """
+        Build the index.
+
+        Args:
+            texts (list[str]): Chunk texts in FAISS position order.
+            k1 (float): Term-frequency saturation.
+            b (float): Document-length normalization.
+        """
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = np.zeros(len(texts), dtype=np.int32)
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for position, text in enumerate(texts):
+            terms = Counter(tokenize(text))
+            self.doc_lengths[position] = sum(terms.values())
+            for term, tf in terms.items():
+                postings.setdefault(term, []).append((position, tf))
+        self.avg_length = float(self.doc_lengths.mean()) if len(texts) else 0.0
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            term: (np.array([p for p, _ in entries], dtype=np.int32), np.array([tf for _, tf in entries], dtype=np.float32))
+            for term, entries in postings.items()
+        }
+        n = len(texts)
+        self.idf = {term: _idf(n, len(positions)) for term, (positions, _) in self.postings.items()}
+
+    @classmethod
+    def from_vectorstore(cls, faiss_db: FAISS) -> "BM25Index":
+        """Build the index over a FAISS store's chunks in index position order."""
+        ids = [faiss_db.index_to_docstore_id[i] for i in range(len(faiss_db.index_to_docstore_id))]
+        return cls([faiss_db.docstore.search(doc_id).page_content for doc_id in ids])
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate resident size of the postings and vocabulary."""
+        size = self.doc_lengths.nbytes
+        for term, (positions, tfs) in self.postings.items():
+            # Array headers, the key string and the idf entry
+            size += positions.nbytes + tfs.nbytes + len(term) + 250
+        return size
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def accumulate(self, scores: np.ndarray, terms: Iterable[str], idf: Dict[str, float], avg_length: float) -> None:
+        """
+        Add the BM25 scores of `terms` to `scores` (one slot per chunk), using
+        the given collection statistics instead of this index's own.
+        """
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / (avg_length or 1.0))
+        for term in terms:
+            entry = self.postings.get(term)
+            if entry is None or term not in idf:
+                continue
+            positions, tfs = entry
+            scores[positions] += idf[term] * tfs * (self.k1 + 1) / (tfs + norm[positions])
+
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Return the `k` best chunk positions for `query` by BM25 score.
+
+        Args:
+            query (str): Query text.
+            k (int): Number of results.
+            allowed (np.ndarray, optional): Positions to restrict the search to.
+
+        Returns:
+            list[tuple[int, float]]: (position, score) pairs, best first.
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        self.accumulate(scores, set(tokenize(query)), self.idf, self.avg_length)
+        return _top_k(scores, k, allowed)
+
+
+class CorpusKeywordIndex:
+    """
+    BM25 over a corpus of documents, stored as one BM25Index segment per
+    document in the same order as the documents' chunks in the corpus FAISS
+    index. Adding or removing a document touches only its own segment, and
+    segments can be shared with the per-document indexes in the registry.
+    Scores use corpus-wide document frequencies and lengths.
+    """
+    def __init__(self):
+        self.segments: "OrderedDict[str, BM25Index]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self.segments.values())
+
+    def add(self, doc_id: str, segment: BM25Index) -> None:
+        """Append the segment of `doc_id`; its chunks follow every existing one."""
+        self.segments[doc_id] = segment
+
+    def remove(self, doc_id: str) -> None:
+        """Drop the segment of `doc_id`; later positions shift down, as in FAISS."""
+        del self.segments[doc_id]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(segment.nbytes for segment in self.segments.values())
+
+    def positions(self, doc_ids: Iterable[str]) -> np.ndarray:
+        """
+        Return the corpus positions of the chunks of `doc_ids`.
+
+        Args:
+            doc_ids (Iterable[str]): Document ids; unknown ids are ignored.
+
+        Returns:
+            np.ndarray: int64 positions in ascending order.
+        """
+        wanted = set(doc_ids)
+        ranges, offset = [], 0
+        for doc_id, segment in self.segments.items():
+            if doc_id in wanted:
+                ranges.append(np.arange(offset, offset + len(segment), dtype=np.int64))
+            offset += len(segment)
+        return np.concatenate(ranges) if ranges else np.zeros(0, dtype=np.int64)
+
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Return the `k` best corpus positions for `query` by BM25 score.
+
+        Args:
+            query (str): Query text.
+            k (int): Number of results.
+            allowed (np.ndarray, optional): Positions to restrict the search to.
+
+        Returns:
+            list[tuple[int, float]]: (position, score) pairs, best first.
+        """
+        segments = list(self.segments.values())
+        n = sum(len(segment) for segment in segments)
+        if not n:
+            return []
+        terms = set(tokenize(query))
+        idf = {}
+        for term in terms:
+            df = sum(len(segment.postings[term][0]) for segment in segments if term in segment.postings)
+            if df:
+                idf[term] = _idf(n, df)
+        avg_length = sum(float(segment.doc_lengths.sum()) for segment in segments) / n
+        scores = np.zeros(n, dtype=np.float32)
+        offset = 0
+        for segment in segments:
+            segment.accumulate(scores[offset:offset + len(segment)], terms, idf, avg_length)
+            offset += len(segment)
+        return _top_k(scores, k, allowed)
+
+
+@dataclass
+class DocumentIndex:
+    """A FAISS vector store and the BM25 index over the same chunks."""
+    vectorstore: FAISS
+    keyword_index: BM25Index
+
+
+def build_document_index(faiss_db: FAISS) -> DocumentIndex:
+    """Pair a vector store with a freshly built BM25 index over its chunks."""
+    with span("pdf.build_bm25"):
+        return DocumentIndex(faiss_db, BM25Index.from_vectorstore(faiss_db))
+
+
+def keyword_terms(query: str) -> List[str]:
+    """
+    Return the exact-match terms of a query: quoted phrases and identifier-like
+    tokens (part numbers, codes, versions).
+
+    Args:
+        query (str): User query.
+
+    Returns:
+        list[str]: Lowercase terms; empty if the query has none.
+    """
+    terms = []
+    for match in _QUOTED.finditer(query):
+        terms.extend(tokenize(match.group(1) or match.group(2)))
+    terms.extend(term for term in tokenize(query) if _IDENTIFIER.match(term))
+    return list(dict.fromkeys(terms))
+
+
+def trim_overlap(selected: List[str], text: str) -> str:
+    """
+    Remove text shared with already selected chunks: whole duplicates and the
+    splitter overlap at either end of neighbouring chunks.
+
+    Args:
+        selected (list[str]): Chunk texts already in the context.
+        text (str): Candidate chunk text.
+
+    Returns:
+        str: The candidate without the overlapping parts (possibly empty).
+    """
+    for other in selected:
+        if text in other:
+            return ""
+        limit = min(len(other), len(text), MAX_OVERLAP_CHARS)
+        # Candidate continues `other`: drop its leading overlap
+        for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+            if other.endswith(text[:size]):
+                text = text[size:]
+                break
+        limit = min(len(other), len(text), MAX_OVERLAP_CHARS)
+        # Candidate precedes `other`: drop its trailing overlap
+        for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+            if other.startswith(text[-size:]):
+                text = text[:-size]
+                break
+    return text.strip()
+
+
+def pack_context(docs: List[Document], max_tokens: int, max_docs: int) -> List[Document]:
+    """
+    Select ranked chunks for the prompt under a token budget, removing text
+    duplicated between chunks.
+
+    Args:
+        docs (list[Document]): Candidate chunks, best first.
+        max_tokens (int): Token budget of the packed context.
+        max_docs (int): Maximum number of chunks.
+
+    Returns:
+        list[Document]: Chunks to stuff into the prompt, in rank order.
+    """
+    packed: List[Document] = []
+    texts: List[str] = []
+    used = 0
+    for doc in docs:
+        text = trim_overlap(texts, doc.page_content)
+        if not text:
+            continue
+        tokens = count_tokens(text)
+        if used + tokens > max_tokens:
+            # A lower-ranked but shorter chunk may still fit
+            continue
+        packed.append(Document(page_content=text, metadata=doc.metadata))
+        texts.append(doc.page_content)
+        used += tokens
+        if len(packed) >= max_docs:
+            break
+    if not packed and docs:
+        # Always return the best chunk, even if it alone exceeds the budget
+        packed.append(docs[0])
+    return packed
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing BM25 and FAISS rankings with reciprocal-rank fusion.
+
+    Queries with an exact-match term (quoted phrase, part number, code) whose
+    terms all occur in the top BM25 hit are answered from BM25 alone, which
+    skips the query-embedding API call. Results are de-duplicated and packed under a
+    token budget. Over a corpus, `doc_ids` restricts both rankers to the
+    chunks of the given documents.
+    """
+    vectorstore: FAISS
+    keyword_index: Union[BM25Index, CorpusKeywordIndex]
+    k: int = DEFAULT_TOP_K
+    fetch_k: int = DEFAULT_FETCH_K
+    max_context_tokens: int = DEFAULT_CONTEXT_TOKENS
+    doc_ids: Optional[Set[str]] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _position_document(self, position: int) -> Optional[Document]:
+        doc_id = self.vectorstore.index_to_docstore_id.get(position)
+        if doc_id is None:
+            return None
+        doc = self.vectorstore.docstore.search(doc_id)
+        return doc if isinstance(doc, Document) else None
+
+    def _allowed_positions(self) -> Optional[np.ndarray]:
+        if self.doc_ids is None:
+            return None
+        if not isinstance(self.keyword_index, CorpusKeywordIndex):
+            raise ValueError("Filtering by document needs a corpus keyword index.")
+        return self.keyword_index.positions(self.doc_ids)
+
+    def _vector_search(self, query: str, allowed: Optional[np.ndarray]) -> List[int]:
+        vector = np.array([self.vectorstore._embed_query(query)], dtype=np.float32)
+        if self.vectorstore._normalize_L2:
+            faiss.normalize_L2(vector)
+        params = None
+        if allowed is not None:
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(allowed))
+        _, positions = self.vectorstore.index.search(vector, self.fetch_k, params=params)
+        return [int(p) for p in positions[0] if p >= 0]
+
+    def _is_keyword_lookup(self, query: str, lexical: List[Tuple[int, float]]) -> bool:
+        # An exact-match term alone is not enough: "how did margins change in
+        # 2023" needs the vector ranking unless the top chunk has every term
+        if not keyword_terms(query) or not lexical:
+            return False
+        top = self._position_document(lexical[0][0])
+        return top is not None and set(tokenize(query)) <= set(tokenize(top.page_content))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        allowed = self._allowed_positions()
+        if allowed is not None and not len(allowed):
+            return []
+        with span("retrieval.bm25"):
+            lexical = self.keyword_index.search(query, self.fetch_k, allowed)
+
+        if self._is_keyword_lookup(query, lexical):
+            ranked = [position for position, _ in lexical]
+            mode = "keyword_only"
+        else:
+            with span("retrieval.vector"):
+                semantic = self._vector_search(query, allowed)
+            fused: Dict[int, float] = {}
+            for ranking in ([position for position, _ in lexical], semantic):
+                for rank, position in enumerate(ranking):
+                    fused[position] = fused.get(position, 0.0) + 1.0 / (RRF_K + rank + 1)
+            ranked = sorted(fused, key=fused.get, reverse=True)
+            mode = "hybrid"
+        with _stats_lock:
+            RETRIEVAL_STATS[mode] += 1
+        record(**{f"retrieval_{mode}": 1})
+
+        candidates = [doc for doc in (self._position_document(p) for p in ranked) if doc is not None]
+        with span("retrieval.pack"):
+            packed = pack_context(candidates, self.max_context_tokens, self.k)
+        record_tokens("context_tokens", [doc.page_content for doc in packed])
+        return packed
+
+
+def get_retrieval_stats() -> Dict[str, int]:
+    """Return a snapshot of the hybrid/keyword-only retrieval counters."""
+    with _stats_lock:
+        return dict(RETRIEVAL_STATS)
@@ -0,0 +1,171 @@
+# utils/server_utils.py
+import asyncio
+import io
+import os
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional
+
+# Concurrent requests per class of work, and how many may wait for a slot
+DEFAULT_MAX_QUERIES = int(os.environ.get("AGENT_API_MAX_QUERIES", "32"))
+DEFAULT_MAX_INGESTS = int(os.environ.get("AGENT_API_MAX_INGESTS", str(os.cpu_count() or 2)))
+DEFAULT_MAX_QUEUE = int(os.environ.get("AGENT_API_MAX_QUEUE", "64"))
+# Seconds a request may wait for a slot before it is turned away
+DEFAULT_QUEUE_TIMEOUT = float(os.environ.get("AGENT_API_QUEUE_TIMEOUT", "10"))
+# Idle sessions (memories, corpora, frames) are dropped after this many seconds
+DEFAULT_SESSION_TTL = float(os.environ.get("AGENT_API_SESSION_TTL", "3600"))
+DEFAULT_MAX_SESSIONS = int(os.environ.get("AGENT_API_MAX_SESSIONS", "1000"))
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; maps to HTTP 503 with Retry-After."""
+    def __init__(self, retry_after: float):
+        super().__init__(f"Server overloaded, retry in {retry_after:.0f}s.")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bound the requests of one class of work that run at once, with a bounded
+    wait queue in front. Requests beyond the queue, or that wait longer than
+    `queue_timeout`, are rejected right away instead of piling up, so latency
+    stays bounded under overload and clients can back off.
+    """
+    def __init__(
+        self,
+        max_inflight: int,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        queue_timeout: float = DEFAULT_QUEUE_TIMEOUT
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            max_inflight (int): Requests allowed to run concurrently.
+            max_queue (int): Requests allowed to wait for a slot.
+            queue_timeout (float): Seconds a request may wait for a slot.
+        """
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_inflight)
+        self.inflight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """
+        Hold a slot for the duration of the block.
+
+        Raises:
+            Overloaded: The queue is full or no slot freed up in time.
+        """
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.queue_timeout)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(self.queue_timeout) from None
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_inflight": self.max_inflight,
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class NamedUpload(io.BytesIO):
+    """Request body standing in for a Streamlit UploadedFile."""
+    def __init__(self, content: bytes, name: str):
+        super().__init__(content)
+        self.name = name
+
+
+@dataclass
+class Session:
+    """
+    Server-side state of one API client: the same memories and agents a
+    Streamlit session keeps in `st.session_state`.
+    """
+    session_id: str
+    api_key: str
+    state: Dict[str, Any] = field(default_factory=dict)
+    last_used: float = field(default_factory=time.monotonic)
+    # Agents and memories are not thread-safe: one request per session at a time
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class SessionStore:
+    """
+    In-memory sessions keyed by id, expired after `ttl` idle seconds. Built
+    indexes and frames live in the process-wide registries, so sessions on
+    the same documents share them.
+    """
+    def __init__(self, ttl: float = DEFAULT_SESSION_TTL, max_sessions: int = DEFAULT_MAX_SESSIONS):
+        """
+        Initialize the store.
+
+        Args:
+            ttl (float): Idle seconds after which a session is dropped.
+            max_sessions (int): Maximum live sessions; the least recently used is dropped first.
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expire(self, now: float) -> None:
+        for session_id in [s.session_id for s in self._sessions.values() if now - s.last_used > self.ttl]:
+            del self._sessions[session_id]
+        while len(self._sessions) >= self.max_sessions:
+            oldest = min(self._sessions.values(), key=lambda s: s.last_used)
+            del self._sessions[oldest.session_id]
+
+    def create(self, api_key: str) -> Session:
+        """Start a new session bound to `api_key`."""
+        with self._lock:
+            self._expire(time.monotonic())
+            session = Session(uuid.uuid4().hex, api_key)
+            self._sessions[session.session_id] = session
+            return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Return the live session with this id and mark it used, or None."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            now = time.monotonic()
+            if now - session.last_used > self.ttl:
+                del self._sessions[session_id]
+                return None
+            session.last_used = now
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        """Drop a session; returns False if it did not exist."""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
@@ -0,0 +1,112 @@
+# utils/stream_utils.py
+import contextvars
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+_DONE = object()
+
+
+@dataclass
+class ResponseTiming:
+    """
+    Time-to-first-token and total generation time of a single response.
+    """
+    started_at: float = field(default_factory=time.perf_counter)
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def total_time(self) -> Optional[float]:
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def as_dict(self) -> Dict[str, Optional[float]]:
+        return {
+            "time_to_first_token": self.time_to_first_token,
+            "total_time": self.total_time,
+        }
+
+
+class _TokenQueueHandler(BaseCallbackHandler):
+    """Forward streamed LLM tokens to a queue read by the consuming thread."""
+    def __init__(self, tokens: "queue.Queue[Any]"):
+        self.tokens = tokens
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self.tokens.put(token)
+
+
+def stream_chain(
+    chain,
+    inputs: Dict[str, Any],
+    output_key: str,
+    timing: ResponseTiming,
+    outputs: Optional[Dict[str, Any]] = None
+) -> Iterator[str]:
+    """
+    Run a chain in a background thread and yield its answer tokens as they arrive.
+
+    Only LLMs constructed with `streaming=True` emit tokens, so chains that make
+    auxiliary calls (e.g. question condensing) should use a non-streaming model
+    for those. The chain still runs normally, so attached memory is updated with
+    the final text once generation completes.
+
+    Args:
+        chain: LangChain chain to invoke.
+        inputs (dict): Chain inputs.
+        output_key (str): Key of the final answer in the chain output.
+        timing (ResponseTiming): Filled in with first-token and completion times.
+        outputs (dict, optional): Updated with the full chain output (e.g. source
+            documents) once the stream is exhausted.
+
+    Yields:
+        str: Answer tokens, or the full answer at once if the model did not stream.
+    """
+    tokens: "queue.Queue[Any]" = queue.Queue()
+    outcome: Dict[str, Any] = {}
+
+    def worker() -> None:
+        try:
+            outcome["result"] = chain.invoke(inputs, config={"callbacks": [_TokenQueueHandler(tokens)]})
+        except BaseException as exc:
+            outcome["error"] = exc
+        finally:
+            tokens.put(_DONE)
+
+    # Run in a copy of the caller's context so an active trace follows the chain
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(worker,), daemon=True)
+    thread.start()
+
+    streamed = False
+    while True:
+        token = tokens.get()
+        if token is _DONE:
+            break
+        if timing.first_token_at is None:
+            timing.first_token_at = time.perf_counter()
+        streamed = True
+        yield token
+    thread.join()
+
+    if "error" in outcome:
+        raise outcome["error"]
+    if outputs is not None:
+        outputs.update(outcome["result"])
+    if not streamed:
+        answer = outcome["result"][output_key]
+        timing.first_token_at = time.perf_counter()
+        yield answer
+    timing.finished_at = time.perf_counter()
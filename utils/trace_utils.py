@@ -0,0 +1,265 @@
+# utils/trace_utils.py
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+# When set, every kept trace is appended to this JSONL file
+DEFAULT_TRACE_FILE = os.environ.get("AGENT_TRACE_FILE")
+
+# Innermost open span of the current context; None whenever tracing is off
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("agent_span", default=None)
+# Callback handler that LangChain attaches to every run while a trace is active
+_trace_handler: "contextvars.ContextVar[Optional[TraceCallbackHandler]]" = contextvars.ContextVar(
+    "agent_trace_handler", default=None
+)
+register_configure_hook(_trace_handler, inheritable=True)
+
+_NOOP = nullcontext()
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """
+    One timed stage of a traced request. Counters (tokens, upstream calls,
+    agent steps, ...) are summed; attributes are free-form metadata.
+    """
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attrs", "counters")
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+        self.counters: Dict[str, float] = {}
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+    def add(self, **counters: float) -> None:
+        """Add to this span's counters; safe to call from several threads."""
+        with self.trace._lock:
+            for name, amount in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "offset_ms": (self.start - self.trace.started_at) * 1000,
+            "duration_ms": None if self.end is None else self.duration * 1000,
+            **self.counters,
+            **({"attrs": self.attrs} if self.attrs else {}),
+        }
+
+
+class Trace:
+    """
+    Spans recorded for one request (e.g. one Smart Agent turn). The trace is
+    itself the root span; spans opened while it is active become its children.
+    """
+    def __init__(self, name: str, **attrs: Any):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.created = time.time()
+        self._lock = threading.Lock()
+        self.root = Span(self, name, None, attrs)
+        self.spans: List[Span] = [self.root]
+
+    def _open(self, name: str, parent: Optional[Span], attrs: Dict[str, Any]) -> Span:
+        span = Span(self, name, parent, attrs)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def totals(self) -> Dict[str, float]:
+        """Sum every counter across all spans of the trace."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                for name, amount in span.counters.items():
+                    totals[name] = totals.get(name, 0) + amount
+        return totals
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Return the spans as flat dicts in start order."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return [span.as_dict() for span in spans]
+
+    def to_jsonl(self) -> str:
+        """Serialize the trace as one JSON object per span."""
+        return "".join(json.dumps({"trace": self.name, **record}, default=str) + "\n" for record in self.records())
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """
+    Turn LangChain LLM, retriever and agent callbacks into spans of the active
+    trace, with prompt and completion token counts on every LLM span.
+    """
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self._runs: Dict[UUID, Span] = {}
+
+    def _start(self, run_id: UUID, name: str, **attrs: Any) -> Span:
+        span = self.trace._open(name, _current_span.get() or self.trace.root, attrs)
+        self._runs[run_id] = span
+        return span
+
+    def _finish(self, run_id: UUID) -> Optional[Span]:
+        span = self._runs.pop(run_id, None)
+        if span is not None:
+            span.end = time.perf_counter()
+        return span
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        from utils.memory_utils import count_tokens
+        params = kwargs.get("invocation_params") or {}
+        span = self._start(run_id, "llm", model=params.get("model_name") or params.get("model"))
+        span.add(llm_calls=1, prompt_tokens=sum(count_tokens(str(m.content)) for batch in messages for m in batch))
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        from utils.memory_utils import count_tokens
+        span = self._start(run_id, "llm")
+        span.add(llm_calls=1, prompt_tokens=sum(count_tokens(p) for p in prompts))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        from utils.memory_utils import count_tokens
+        span = self._finish(run_id)
+        if span is None:
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        completion = usage.get("completion_tokens")
+        if completion is None:
+            # Streamed responses carry no usage; count the generated text
+            completion = sum(count_tokens(g.text) for batch in response.generations for g in batch)
+        span.add(completion_tokens=completion)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._finish(run_id)
+        if span is not None:
+            span.attrs["error"] = repr(error)
+
+    def on_retriever_start(self, serialized, query, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "retrieval")
+
+    def on_retriever_end(self, documents, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._finish(run_id)
+        if span is not None:
+            span.add(documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_agent_action(self, action, **kwargs: Any) -> None:
+        record(agent_steps=1)
+
+
+@contextmanager
+def start_trace(name: str, **attrs: Any) -> Iterator[Trace]:
+    """
+    Trace everything run inside the block: spans, LangChain LLM/retriever calls
+    and upstream HTTP requests made through the shared client.
+
+    Args:
+        name (str): Name of the traced request.
+        **attrs: Metadata stored on the root span.
+
+    Yields:
+        Trace: The trace being recorded.
+    """
+    trace = Trace(name, **attrs)
+    span_token = _current_span.set(trace.root)
+    handler_token = _trace_handler.set(TraceCallbackHandler(trace))
+    try:
+        yield trace
+    finally:
+        trace.root.end = time.perf_counter()
+        _trace_handler.reset(handler_token)
+        _current_span.reset(span_token)
+
+
+@contextmanager
+def _span(parent: Span, name: str, attrs: Dict[str, Any]) -> Iterator[Span]:
+    span = parent.trace._open(name, parent, attrs)
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        span.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def span(name: str, **attrs: Any):
+    """
+    Time a stage of the current request as a child of the innermost open span.
+    Without an active trace this returns a shared no-op context manager, so
+    instrumented code pays one context-variable lookup.
+
+    Args:
+        name (str): Stage name, e.g. "pdf.split".
+        **attrs: Metadata stored on the span.
+
+    Returns:
+        Context manager yielding the Span, or None when tracing is off.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP
+    return _span(parent, name, attrs)
+
+
+def record(**counters: float) -> None:
+    """Add to the counters of the innermost open span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.add(**counters)
+
+
+def record_tokens(counter: str, texts: List[str]) -> None:
+    """Add the token count of `texts` to `counter` on the current span; skipped when tracing is off."""
+    current = _current_span.get()
+    if current is not None:
+        from utils.memory_utils import count_tokens
+        current.add(**{counter: sum(count_tokens(text) for text in texts)})
+
+
+def tracing_active() -> bool:
+    """Return True while a trace is being recorded in this context."""
+    return _current_span.get() is not None
+
+
+def count_upstream_request(request) -> None:
+    """httpx request hook: count an upstream API call on the current span."""
+    current = _current_span.get()
+    if current is not None:
+        current.add(upstream_calls=1)
+
+
+def export_jsonl(traces: List[Trace], path: str) -> None:
+    """
+    Append traces to a JSONL file, one line per span.
+
+    Args:
+        traces (list[Trace]): Traces to export.
+        path (str): Destination file.
+    """
+    with open(path, "a", encoding="utf-8") as f:
+        for trace in traces:
+            f.write(trace.to_jsonl())